@@ -1,14 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import Department, User
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'member_count')
+    readonly_fields = ('member_count',)
+    search_fields = ('name',)
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'is_manager', 'is_staff', 'is_active')
-    list_filter = ('is_manager', 'is_staff', 'is_active')
+    list_display = ('username', 'email', 'department', 'is_manager', 'is_staff', 'is_active')
+    list_filter = ('is_manager', 'is_staff', 'is_active', 'department')
+    list_select_related = ('department',)
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
-        ('个人信息', {'fields': ('email', 'first_name', 'last_name')}),
+        ('个人信息', {'fields': ('email', 'first_name', 'last_name', 'department')}),
         ('权限', {'fields': ('is_manager', 'is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('重要日期', {'fields': ('last_login', 'date_joined')}),
     )
@@ -1,17 +1,62 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import User
+from django.utils.html import format_html, format_html_join
 
-class UserRegistrationForm(UserCreationForm):
+from .models import Department, User
+
+
+class DepartmentInput(forms.TextInput):
+    """部门名称输入框，附带已有部门的 <datalist> 供选择"""
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = {**(attrs or {}), 'list': f'{name}-options'}
+        options = format_html_join(
+            '', '<option value="{}">', ((department,) for department in
+                                        Department.objects.values_list('name', flat=True))
+        )
+        return format_html(
+            '{}<datalist id="{}-options">{}</datalist>',
+            super().render(name, value, attrs, renderer), name, options
+        )
+
+
+class DepartmentFormMixin(forms.Form):
+    """
+    部门以名称输入：已有的部门（不区分大小写）直接使用，没有时在保存用户时创建，
+    空表的新部署也能正常注册
+    """
+    department = forms.CharField(
+        max_length=Department._meta.get_field('name').max_length,
+        required=False,
+        widget=DepartmentInput,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.department_id:
+            self.initial.setdefault('department', self.instance.department.name)
+
+    def save(self, commit=True):
+        user = super().save(commit=False)
+        user.department = Department.objects.get_or_create_by_name(self.cleaned_data['department'])
+        if commit:
+            user.save()
+            self.save_m2m()
+        return user
+
+
+class UserRegistrationForm(DepartmentFormMixin, UserCreationForm):
     email = forms.EmailField()
+    field_order = ('username', 'email', 'department', 'password1', 'password2')
 
     class Meta:
         model = User
-        fields = ('username', 'email', 'department', 'password1', 'password2')
+        fields = ('username', 'email')
+
 
-class UserUpdateForm(forms.ModelForm):
+class UserUpdateForm(DepartmentFormMixin, forms.ModelForm):
     email = forms.EmailField()
 
     class Meta:
         model = User
-        fields = ['username', 'email', 'department']
+        fields = ['username', 'email']
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:06
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+# 与 accounts.search 中的 normalize / trigrams 相同，复制到这里以免迁移依赖之后会修改的模块
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).casefold().strip()
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def build_index(apps, schema_editor):
+    """为已有的用户生成查找索引和三字母组，按 id 分批处理"""
+    User = apps.get_model('accounts', 'User')
+    UserSearchIndex = apps.get_model('accounts', 'UserSearchIndex')
+    UserTrigram = apps.get_model('accounts', 'UserTrigram')
+
+    last_id = 0
+    while True:
+        rows = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('id', 'username', 'email')[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        entries, grams = [], []
+        for user_id, username, email in rows:
+            username_key, email_key = normalize(username), normalize(email)
+            entries.append(UserSearchIndex(
+                user_id=user_id, username_key=username_key, email_key=email_key
+            ))
+            grams.extend(
+                UserTrigram(user_id=user_id, trigram=gram)
+                for gram in trigrams(username_key) | trigrams(email_key)
+            )
+        UserSearchIndex.objects.bulk_create(entries)
+        UserTrigram.objects.bulk_create(grams, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_user_options_alter_user_department_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username_key', models.CharField(db_index=True, max_length=150)),
+                ('email_key', models.CharField(db_index=True, max_length=254)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigram', 'user'), name='user_trigram_unique')],
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def create_departments(apps, schema_editor):
+    """把 users.department 的文本值整理成 Department 行，并回填外键和成员数"""
+    User = apps.get_model('accounts', 'User')
+    Department = apps.get_model('accounts', 'Department')
+
+    counts = {}
+    for name, count in User.objects.exclude(department='').values_list(
+            'department').annotate(count=Count('id')).order_by():
+        key = name.strip()
+        if key:
+            counts[key] = counts.get(key, 0) + count
+    Department.objects.bulk_create([
+        Department(name=name, member_count=count) for name, count in counts.items()
+    ])
+    departments = dict(Department.objects.values_list('name', 'id'))
+    for name in User.objects.exclude(department='').values_list(
+            'department', flat=True).distinct().order_by():
+        if name.strip():
+            User.objects.filter(department=name).update(department_ref=departments[name.strip()])
+
+
+def restore_department_names(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Department = apps.get_model('accounts', 'Department')
+    for department_id, name in Department.objects.values_list('id', 'name'):
+        User.objects.filter(department_ref=department_id).update(department=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('member_count', models.PositiveIntegerField(default=0, verbose_name='Members')),
+            ],
+            options={
+                'verbose_name': 'Department',
+                'verbose_name_plural': 'Departments',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='department_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.department'),
+        ),
+        migrations.RunPython(create_departments, restore_department_names),
+        migrations.RemoveField(
+            model_name='user',
+            name='department',
+        ),
+        migrations.RenameField(
+            model_name='user',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='accounts.department', verbose_name='Department'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['department', 'username', 'id'], name='users_department_username_idx'),
+        ),
+    ]
@@ -1,14 +1,58 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class DepartmentManager(models.Manager):
+    def refresh_member_counts(self, department_ids=None):
+        """按用户表重新计算成员数（批量写入用户后调用），一条 UPDATE"""
+        members = User.objects.filter(department=OuterRef('pk')).order_by().values(
+            'department'
+        ).annotate(count=Count('pk')).values('count')
+        departments = self.all()
+        if department_ids is not None:
+            departments = departments.filter(pk__in=department_ids)
+        return departments.update(member_count=Coalesce(Subquery(members), 0))
+
+    def get_or_create_by_name(self, name):
+        """按名称（不区分大小写）查找部门，没有时创建；名称为空时返回 None"""
+        name = (name or '').strip()
+        if not name:
+            return None
+        department = self.filter(name__iexact=name).first()
+        if department is None:
+            department, _ = self.get_or_create(name=name)
+        return department
+
+
+class Department(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='Name')
+    # 成员数缓存，由 accounts.signals 在用户保存/删除时更新
+    member_count = models.PositiveIntegerField(default=0, verbose_name='Members')
+
+    objects = DepartmentManager()
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Department'
+        verbose_name_plural = 'Departments'
+
+    def __str__(self):
+        return self.name
+
 
 class User(AbstractUser):
     is_manager = models.BooleanField(
         default=False,
         verbose_name='is_manager'
     )
-    department = models.CharField(
-        max_length=100,
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.SET_NULL,
+        null=True,
         blank=True,  # 允许为空
+        related_name='members',
         verbose_name='Department'
     )
     
@@ -16,6 +60,36 @@ class User(AbstractUser):
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # 用户列表按部门筛选后按 (username, id) 翻页
+            models.Index(fields=['department', 'username', 'id'], name='users_department_username_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.username} ({'Manager' if self.is_manager else 'Common user'})"
\ No newline at end of file
+        return f"{self.username} ({'Manager' if self.is_manager else 'Common user'})"
+
+
+class UserSearchIndex(models.Model):
+    """
+    用户查找索引（accounts.search 维护）：
+    规范化（去掉变音符号、转小写）后的用户名和邮箱，用于前缀查找。
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_index'
+    )
+    username_key = models.CharField(max_length=150, db_index=True)
+    email_key = models.CharField(max_length=254, db_index=True)
+
+
+class UserTrigram(models.Model):
+    """用户名和邮箱的三字母组，用于任意位置的子串查找"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'user'], name='user_trigram_unique'),
+        ]
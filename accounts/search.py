@@ -0,0 +1,165 @@
+"""
+用户查找（报名管理的输入联想）。
+
+UserSearchIndex 保存规范化后的用户名和邮箱，前缀查找走 B-tree 索引的范围扫描；
+UserTrigram 保存三字母组，用于用户名/邮箱中间的子串：先取命中数最少的三字母组
+得到候选用户，再在 Python 中核对子串。两张表由 signals 在用户名或邮箱变化时更新，
+批量创建用户后运行 rebuild_user_search_index。
+"""
+import unicodedata
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from courses.models import Enrollment
+from .models import UserSearchIndex, UserTrigram
+
+User = get_user_model()
+
+DEFAULT_LIMIT = 20
+
+# 核对子串时每次读取的候选行数
+CANDIDATE_CHUNK = 500
+
+TRIGRAM_COUNT_CAP = 1000
+
+# 比任何字符都大，用于前缀的范围查询上界
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize(text):
+    """去掉变音符号并转为小写"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).casefold().strip()
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+# 索引维护
+def index_users(rows):
+    """rows 为 (id, username, email)，重建这些用户的索引行"""
+    entries, grams = [], []
+    for user_id, username, email in rows:
+        username_key, email_key = normalize(username), normalize(email)
+        entries.append(UserSearchIndex(
+            user_id=user_id, username_key=username_key, email_key=email_key
+        ))
+        grams.extend(
+            UserTrigram(user_id=user_id, trigram=gram)
+            for gram in trigrams(username_key) | trigrams(email_key)
+        )
+    if not entries:
+        return 0
+
+    user_ids = [entry.user_id for entry in entries]
+    with transaction.atomic():
+        UserSearchIndex.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['username_key', 'email_key'],
+        )
+        UserTrigram.objects.filter(user_id__in=user_ids).delete()
+        UserTrigram.objects.bulk_create(grams, batch_size=2000)
+    return len(entries)
+
+
+def reindex_user(user):
+    """用户名或邮箱与索引不一致时更新"""
+    current = UserSearchIndex.objects.filter(user_id=user.pk).values_list(
+        'username_key', 'email_key'
+    ).first()
+    if current != (normalize(user.username), normalize(user.email)):
+        index_users([(user.pk, user.username, user.email)])
+
+
+def rebuild(batch_size=1000):
+    """按 id 分批重建全部用户的索引，返回索引的用户数"""
+    count = 0
+    last_id = 0
+    while True:
+        rows = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('id', 'username', 'email')[:batch_size]
+        )
+        if not rows:
+            return count
+        count += index_users(rows)
+        last_id = rows[-1][0]
+
+
+# 查询
+def _user_filters(department='', exclude_program=None):
+    """
+    启用的普通用户（不含停用账户和系统评分者），可按部门筛选并排除已报名某个项目的用户
+    （NOT EXISTS，走报名表的唯一索引）
+    """
+    filters = Q(user__is_manager=False, user__is_active=True)
+    if department:
+        filters &= Q(user__department_id=department)
+    if exclude_program:
+        filters &= ~Exists(Enrollment.objects.filter(
+            program_id=exclude_program, user_id=OuterRef('user_id')
+        ))
+    return filters
+
+
+def _substring_matches(key, filters, exclude_ids, limit):
+    """用命中数最少的三字母组取候选用户，再核对子串"""
+    # 常见的三字母组可能出现在所有用户中，计数时最多数到 TRIGRAM_COUNT_CAP
+    counts = {
+        gram: UserTrigram.objects.filter(trigram=gram)[:TRIGRAM_COUNT_CAP].count()
+        for gram in trigrams(key)
+    }
+    if not all(counts.values()):
+        return []
+    rarest = min(counts, key=counts.get)
+
+    # 按 (trigram, user) 索引的顺序读取，不需要排序，凑够 limit 个即可停止
+    candidates = (
+        UserTrigram.objects
+        .filter(filters, trigram=rarest)
+        .exclude(user_id__in=exclude_ids)
+        .order_by('user_id')
+        .values_list('user_id', 'user__search_index__username_key', 'user__search_index__email_key')
+    )
+    matches = []
+    for user_id, username_key, email_key in candidates.iterator(chunk_size=CANDIDATE_CHUNK):
+        if key in username_key or key in email_key:
+            matches.append(user_id)
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def search_users(query='', department='', exclude_program=None, limit=DEFAULT_LIMIT):
+    """
+    返回最多 limit 个普通用户：先是用户名以 query 开头的，其次是邮箱以 query 开头的，
+    不足时补充用户名/邮箱中包含 query 的。query 为空时按用户名返回前 limit 个。
+    """
+    key = normalize(query)
+    filters = _user_filters(department, exclude_program)
+    index = UserSearchIndex.objects.filter(filters)
+
+    if not key:
+        user_ids = list(index.order_by('username_key').values_list('user_id', flat=True)[:limit])
+    else:
+        # 用户名和邮箱分两次查询，各自按索引顺序扫描，避免 OR 之后再排序
+        upper = key + _MAX_CHAR
+        user_ids = list(
+            index.filter(username_key__gte=key, username_key__lt=upper)
+            .order_by('username_key').values_list('user_id', flat=True)[:limit]
+        )
+        if len(user_ids) < limit:
+            user_ids += index.filter(email_key__gte=key, email_key__lt=upper).exclude(
+                user_id__in=user_ids
+            ).order_by('email_key').values_list('user_id', flat=True)[:limit - len(user_ids)]
+
+    if key and len(user_ids) < limit and len(key) >= 3:
+        user_ids += _substring_matches(key, filters, user_ids, limit - len(user_ids))
+
+    users = User.objects.select_related('department').in_bulk(user_ids)
+    return [users[user_id] for user_id in user_ids if user_id in users]
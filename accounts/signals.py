@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search
+from .models import Department
+
+User = get_user_model()
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(set(fields) & set(update_fields))
+
+
+def _adjust_member_count(department_id, delta):
+    if department_id is not None:
+        Department.objects.filter(pk=department_id).update(
+            member_count=F('member_count') + delta
+        )
+
+
+@receiver(pre_save, sender=User)
+def remember_department(sender, instance, update_fields=None, **kwargs):
+    # 记录保存前的部门，post_save 据此更新成员数（progress.signals 也会读取）
+    instance.__dict__.pop('_previous_department_id', None)
+    if instance.pk and not instance._state.adding and _touches(update_fields, ['department']):
+        instance._previous_department_id = User.objects.filter(pk=instance.pk).values_list(
+            'department_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        _adjust_member_count(instance.department_id, 1)
+    elif hasattr(instance, '_previous_department_id'):
+        previous = instance._previous_department_id
+        if previous != instance.department_id:
+            _adjust_member_count(previous, -1)
+            _adjust_member_count(instance.department_id, 1)
+
+    # 登录只更新 last_login，不需要检查索引
+    if not _touches(update_fields, ['username', 'email']):
+        return
+    if created:
+        search.index_users([(instance.pk, instance.username, instance.email)])
+    else:
+        search.reindex_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    _adjust_member_count(instance.department_id, -1)
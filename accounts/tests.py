@@ -1,3 +1,109 @@
+from unittest import mock
+
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from micro_training.pagination import encode_cursor, paginate
+from micro_training.testing import MigrationTestCase
+from . import search
+from .models import Department, User, UserTrigram
+from .views import UserListView
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # 名字有重复，排序键 (first_name, id) 中的 id 决定同名用户的顺序
+        for n, name in enumerate(['ann', 'bea', 'bea', 'bea', 'cal', 'dan', 'dan']):
+            User.objects.create_user(f'user{n}', first_name=name)
+        cls.ordered = list(User.objects.order_by('first_name', 'id').values_list('id', flat=True))
+
+    def page(self, query=''):
+        return paginate(User.objects.all(), ('first_name', 'id'), QueryDict(query, mutable=True), 3)
+
+    def ids(self, page):
+        return [user.pk for user in page]
+
+    def test_walk_forward_and_back(self):
+        page = self.page()
+        pages = [self.ids(page)]
+        self.assertFalse(page.has_previous)
+        while page.has_next:
+            page = self.page(page.next_query)
+            pages.append(self.ids(page))
+        self.assertEqual(pages, [self.ordered[0:3], self.ordered[3:6], self.ordered[6:]])
+        self.assertIsNone(page.next_query)
+
+        backwards = []
+        while page.has_previous:
+            page = self.page(page.previous_query)
+            backwards.append(self.ids(page))
+        self.assertEqual(backwards, [self.ordered[3:6], self.ordered[0:3]])
+
+    def test_keeps_other_parameters(self):
+        page = self.page('department=4&after=bogus')
+
+        self.assertEqual(self.ids(page), self.ordered[0:3])
+        params = QueryDict(page.next_query)
+        self.assertEqual(params['department'], '4')
+        self.assertNotIn('before', params)
+        self.assertEqual(page.first_query, 'department=4')
+
+    def test_invalid_cursor_starts_over(self):
+        for cursor in ('%%%', encode_cursor(['bea']), encode_cursor({'a': 1})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.ids(self.page(f'after={cursor}')), self.ordered[0:3])
+
+    def test_page_runs_one_query(self):
+        first = self.page()
+        with self.assertNumQueries(1):
+            self.ids(self.page(first.next_query))
+
+
+class UserListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Eng')
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        cls.engineers = [
+            User.objects.create_user(f'eng{n}', department=cls.department) for n in range(3)
+        ]
+        User.objects.create_user('eng9', department=cls.department, is_active=False)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def test_requires_manager(self):
+        self.client.force_login(self.engineers[0])
+
+        self.assertEqual(self.client.get(reverse('user_list')).status_code, 403)
+
+    @mock.patch.object(UserListView, 'paginate_by', 2)
+    def test_pages_by_username_within_department(self):
+        url = reverse('user_list')
+        response = self.client.get(url, {'department': self.department.pk})
+        self.assertEqual([user.username for user in response.context['users']], ['eng0', 'eng1'])
+
+        page = response.context['page_obj']
+        response = self.client.get(f'{url}?{page.next_query}')
+        self.assertEqual([user.username for user in response.context['users']], ['eng2'])
+        self.assertFalse(response.context['page_obj'].has_next)
+
+
+class UserSearchIndexMigrationTests(MigrationTestCase):
+    """查找索引建立之前已有的用户在迁移后可以被输入联想找到"""
+
+    migrate_from = [('accounts', '0003_alter_user_options_alter_user_department_and_more')]
+
+    def test_existing_users_are_indexed(self):
+        OldUser = self.old_apps.get_model('accounts', 'User')
+        jose = OldUser.objects.create(username='José', email='jose.perez@example.com')
+        OldUser.objects.create(username='ann', email='ann@example.com')
+
+        self.migrate(self.latest)
 
-# Create your tests here.
+        self.assertEqual([user.pk for user in search.search_users('jose')], [jose.pk])
+        self.assertEqual([user.pk for user in search.search_users('perez')], [jose.pk])
+        self.assertEqual(len(search.search_users('example')), 2)
+        self.assertTrue(UserTrigram.objects.filter(user_id=jose.pk, trigram='jos').exists())
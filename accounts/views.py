@@ -3,8 +3,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView
 from django.contrib import messages
+from micro_training.pagination import KeysetPaginationMixin
 from .forms import UserRegistrationForm, UserUpdateForm
-from .models import User
+from .models import Department, User
 
 def register(request):
     if request.method == 'POST':
@@ -29,10 +30,26 @@ def profile(request):
         form = UserUpdateForm(instance=request.user)
     return render(request, 'accounts/profile.html', {'form': form})
 
-class UserListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class UserListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     model = User
     template_name = 'accounts/user_list.html'
     context_object_name = 'users'
+    keyset = ('username', 'id')
     
     def test_func(self):
-        return self.request.user.is_manager
\ No newline at end of file
+        return self.request.user.is_manager
+
+    def get_queryset(self):
+        # 不列出停用的账户（包括自动评分使用的系统评分者）
+        queryset = User.objects.filter(is_active=True).select_related('department')
+        department = self.request.GET.get('department', '')
+        if department.isdigit():
+            # 由 users_department_username_idx 支持
+            queryset = queryset.filter(department_id=department)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['departments'] = Department.objects.all()
+        context['selected_department'] = self.request.GET.get('department', '')
+        return context
\ No newline at end of file
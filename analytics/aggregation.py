@@ -0,0 +1,313 @@
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+
+from courses.models import Program, Topic, Lesson, Quiz, QuizResponse, Enrollment
+from micro_training.middleware import track_queries
+from progress import activity
+
+# 时间范围为全部时，时间序列图显示最近的天数
+TIMELINE_DAYS = 30
+
+
+def parse_dashboard_filters(params):
+    """把 GET 参数整理成统一的筛选条件"""
+    def _values(key):
+        values = params.getlist(key, [])
+        return [] if 'all' in values else values
+
+    return {
+        'programs': _values('programs[]'),
+        'departments': _values('departments[]'),
+        'users': _values('users[]'),
+        'time_range': params.get('timeRange', 'all') or 'all',
+        'date_from': params.get('dateFrom'),
+        'date_to': params.get('dateTo'),
+    }
+
+
+def validate_dashboard_filters(filters):
+    """
+    返回筛选条件的错误信息，没有错误时返回 None。
+    在查询之前调用：流式导出开始输出后就不能再返回 400
+    """
+    for key in ('programs', 'departments', 'users'):
+        if not all(str(value).isdigit() for value in filters[key]):
+            return f'{key}[] must be a list of ids.'
+    time_range = filters['time_range']
+    if time_range == 'custom':
+        for key, param in (('date_from', 'dateFrom'), ('date_to', 'dateTo')):
+            try:
+                if filters[key]:
+                    date.fromisoformat(filters[key])
+            except ValueError:
+                return f'{param} must be a date (YYYY-MM-DD).'
+    elif time_range != 'all' and not time_range.isdigit():
+        return "timeRange must be 'all', 'custom' or a number of days."
+    return None
+
+
+def filter_programs(manager, filters):
+    """按筛选条件返回该管理员创建的项目"""
+    query = Program.objects.filter(created_by=manager)
+
+    if filters['programs']:
+        query = query.filter(id__in=filters['programs'])
+    if filters['departments']:
+        query = query.filter(enrolled_users__department_id__in=filters['departments'])
+    if filters['users']:
+        query = query.filter(enrolled_users__id__in=filters['users'])
+
+    # 时间范围：只保留范围内有学习活动的项目（读取每日活动汇总）
+    window = activity.date_window(filters)
+    if window:
+        query = query.filter(id__in=activity.active_program_ids(*window, filters['departments']))
+
+    return query.distinct()
+
+
+def _rate(done, total):
+    return (done / total * 100) if total > 0 else 0
+
+
+def load_structure(program_ids):
+    """三次查询取出 program→topic→lesson 结构"""
+    programs = list(
+        Program.objects.filter(id__in=program_ids).order_by('id').values('id', 'title')
+    )
+    topics = list(
+        Topic.objects.filter(program_id__in=program_ids)
+        .order_by('order', 'id').values('id', 'program_id', 'title')
+    )
+    lessons = list(
+        Lesson.objects.filter(topic__program_id__in=program_ids)
+        .order_by('order', 'id').values('id', 'topic_id', 'title')
+    )
+    return programs, topics, lessons
+
+
+def load_quiz_totals(program_ids):
+    """每个课程的测验数量 (GROUP BY lesson_id)"""
+    rows = Quiz.objects.filter(
+        lesson__topic__program_id__in=program_ids
+    ).values('lesson_id').annotate(total=Count('id')).order_by()
+    return {row['lesson_id']: row['total'] for row in rows}
+
+
+def load_graded_stats(program_ids):
+    """每个课程已评分答卷的数量与得分 (GROUP BY lesson_id)"""
+    rows = QuizResponse.objects.filter(
+        quiz__lesson__topic__program_id__in=program_ids,
+        grading_status='GRADED'
+    ).values('quiz__lesson_id').annotate(
+        completed=Count('id'),
+        earned=Sum('points_earned'),
+        possible=Sum('quiz__points'),
+    ).order_by()
+    return {
+        row['quiz__lesson_id']: (row['completed'], row['earned'] or 0, row['possible'] or 0)
+        for row in rows
+    }
+
+
+def load_enrolled_counts(program_ids):
+    """每个项目的报名人数 (GROUP BY program_id)"""
+    rows = Enrollment.objects.filter(
+        program_id__in=program_ids
+    ).values('program_id').annotate(total=Count('id')).order_by()
+    return {row['program_id']: row['total'] for row in rows}
+
+
+def load_pending_count(program_ids):
+    return QuizResponse.objects.filter(
+        quiz__lesson__topic__program_id__in=program_ids,
+        grading_status='PENDING'
+    ).count()
+
+
+def load_timeline(program_ids, filters):
+    """时间范围内按日汇总的活动，没有活动的日期补 0"""
+    start, end = activity.date_window(filters, default_days=TIMELINE_DAYS)
+    if filters['users']:
+        rows = activity.learner_timeline(program_ids, filters['users'], start, end)
+    else:
+        rows = activity.timeline(program_ids, start, end, filters['departments'])
+    by_day = {row['day']: row for row in rows}
+
+    timeline = []
+    day = start
+    while day <= end:
+        row = by_day.get(day, {})
+        timeline.append({
+            'day': day.isoformat(),
+            'completions': row.get('completions') or 0,
+            'quiz_submissions': row.get('quiz_submissions') or 0,
+            'graded_responses': row.get('graded_responses') or 0,
+            'active_learners': row.get('active_learners') or 0,
+        })
+        day += timedelta(days=1)
+    return timeline
+
+
+def build_program_tree(structure, quiz_totals, graded_stats, enrolled_counts):
+    """在 Python 中把课程级别的统计汇总到主题和项目"""
+    programs, topics, lessons = structure
+
+    lessons_by_topic = defaultdict(list)
+    for lesson in lessons:
+        lessons_by_topic[lesson['topic_id']].append(lesson)
+    topics_by_program = defaultdict(list)
+    for topic in topics:
+        topics_by_program[topic['program_id']].append(topic)
+
+    programs_data = []
+    for program in programs:
+        program_total = program_completed = 0
+        program_earned = program_possible = 0
+
+        topics_data = []
+        for topic in topics_by_program[program['id']]:
+            topic_total = topic_completed = 0
+
+            lessons_data = []
+            for lesson in lessons_by_topic[topic['id']]:
+                lesson_total = quiz_totals.get(lesson['id'], 0)
+                lesson_completed, earned, possible = graded_stats.get(lesson['id'], (0, 0, 0))
+                topic_total += lesson_total
+                topic_completed += lesson_completed
+                program_earned += earned
+                program_possible += possible
+
+                lessons_data.append({
+                    'id': lesson['id'],
+                    'title': lesson['title'],
+                    'completion_rate': round(_rate(lesson_completed, lesson_total), 1),
+                    'total_quizzes': lesson_total,
+                    'completed_quizzes': lesson_completed
+                })
+
+            program_total += topic_total
+            program_completed += topic_completed
+            topics_data.append({
+                'id': topic['id'],
+                'title': topic['title'],
+                'completion_rate': round(_rate(topic_completed, topic_total), 1),
+                'total_quizzes': topic_total,
+                'completed_quizzes': topic_completed,
+                'lessons': lessons_data
+            })
+
+        programs_data.append({
+            'id': program['id'],
+            'title': program['title'],
+            'enrolled_count': enrolled_counts.get(program['id'], 0),
+            'completion_rate': _rate(program_completed, program_total),
+            'avg_quiz_score': round(_rate(program_earned, program_possible), 1),
+            'points_earned': program_earned,
+            'points_possible': program_possible,
+            'topics': topics_data
+        })
+
+    return programs_data
+
+
+def build_dashboard(manager, filters):
+    """
+    生成管理员仪表板数据。
+    查询数量固定，与项目、主题、课程的数量无关。
+    """
+    program_ids = list(filter_programs(manager, filters).values_list('id', flat=True))
+
+    enrolled_counts = load_enrolled_counts(program_ids)
+    programs_data = build_program_tree(
+        load_structure(program_ids),
+        load_quiz_totals(program_ids),
+        load_graded_stats(program_ids),
+        enrolled_counts,
+    )
+    return summarize(
+        programs_data, enrolled_counts, load_pending_count(program_ids),
+        load_timeline(program_ids, filters)
+    )
+
+
+_query_executor = None
+_query_executor_lock = threading.Lock()
+
+
+def query_executor():
+    """
+    进程内所有仪表板请求共用的查询线程池：线程数（DASHBOARD_QUERY_CONCURRENCY）就是
+    同时执行的查询组数和这些查询占用的数据库连接数的上限，请求再多也不会超过。
+    """
+    global _query_executor
+    if _query_executor is None:
+        with _query_executor_lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(
+                    settings.DASHBOARD_QUERY_CONCURRENCY, thread_name_prefix='dashboard-query'
+                )
+    return _query_executor
+
+
+def _run_in_worker(func, *args):
+    """
+    在查询线程中执行一组查询。线程是长期存在的，连接像请求之间一样按
+    CONN_MAX_AGE（或连接池）复用，前后只关闭出错或过期的连接。
+    """
+    close_old_connections()
+    try:
+        with track_queries():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def build_dashboard_async(manager, filters):
+    """
+    与 build_dashboard 返回相同的数据，互不依赖的几组查询并发执行。
+    并发数由进程共享的查询线程池限制（DASHBOARD_QUERY_CONCURRENCY）。
+    """
+    async def run(func, *args):
+        return await sync_to_async(
+            _run_in_worker, thread_sensitive=False, executor=query_executor()
+        )(func, *args)
+
+    program_ids = await run(
+        lambda: list(filter_programs(manager, filters).values_list('id', flat=True))
+    )
+
+    (structure, quiz_totals, graded_stats, enrolled_counts, pending_count,
+     timeline) = await asyncio.gather(
+        run(load_structure, program_ids),
+        run(load_quiz_totals, program_ids),
+        run(load_graded_stats, program_ids),
+        run(load_enrolled_counts, program_ids),
+        run(load_pending_count, program_ids),
+        run(load_timeline, program_ids, filters),
+    )
+    programs_data = build_program_tree(structure, quiz_totals, graded_stats, enrolled_counts)
+    return summarize(programs_data, enrolled_counts, pending_count, timeline)
+
+
+def summarize(programs_data, enrolled_counts, pending_count, timeline):
+    """汇总顶部指标，并对项目完成率取整"""
+    rates = [program['completion_rate'] for program in programs_data]
+    for program in programs_data:
+        program['completion_rate'] = round(program['completion_rate'], 1)
+
+    return {
+        'active_programs_count': len(programs_data),
+        'total_enrollments': sum(enrolled_counts.values()),
+        'pending_grading_count': pending_count,
+        'avg_completion_rate': round(sum(rates) / len(rates), 1) if rates else 0,
+        'programs': programs_data,
+        'timeline': timeline
+    }
@@ -0,0 +1,100 @@
+"""
+update_dashboard 的响应缓存。
+
+缓存键由管理员 id、规范化后的筛选条件、当天日期（相对时间范围和时间序列随日期变化）
+和数据版本组成。数据版本保存在 DashboardVersion 表中，signals 在写入的同一事务中递增，
+写入提交后读到的一定是新版本，旧的缓存条目不会再被读取，过期后由缓存淘汰。
+进程内缓存（locmem）也不会读到其他进程写入之前的数据。
+"""
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DashboardVersion
+
+CACHE_ALIAS = 'dashboard'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+# 数据版本
+def get_version(manager_id):
+    version = DashboardVersion.objects.filter(manager_id=manager_id).values_list(
+        'version', flat=True
+    ).first()
+    if version is None:
+        version = DashboardVersion.objects.get_or_create(manager_id=manager_id)[0].version
+    return version
+
+
+async def aget_version(manager_id):
+    version = await DashboardVersion.objects.filter(manager_id=manager_id).values_list(
+        'version', flat=True
+    ).afirst()
+    if version is None:
+        version = (await DashboardVersion.objects.aget_or_create(manager_id=manager_id))[0].version
+    return version
+
+
+def bump(**lookup):
+    """
+    递增匹配的管理员的版本号，lookup 是从管理员出发的查询条件，
+    如 created_programs=program_id。只执行一条 UPDATE。
+    """
+    DashboardVersion.objects.filter(**lookup).update(version=F('version') + 1)
+
+
+def bump_program(program_id):
+    if program_id is not None:
+        bump(manager__created_programs=program_id)
+
+
+def bump_all():
+    DashboardVersion.objects.update(version=F('version') + 1)
+
+
+# 响应缓存
+def normalize_filters(filters):
+    """顺序和重复不影响结果的筛选条件整理成同一个键"""
+    key = {
+        'programs': sorted(set(filters['programs'])),
+        'departments': sorted(set(filters['departments'])),
+        'users': sorted(set(filters['users'])),
+        'time_range': filters['time_range'],
+    }
+    if filters['time_range'] == 'custom':
+        key['date_from'] = filters['date_from']
+        key['date_to'] = filters['date_to']
+    return json.dumps(key, sort_keys=True)
+
+
+def cache_key(manager_id, filters, version):
+    digest = hashlib.sha1(normalize_filters(filters).encode()).hexdigest()
+    return f'dashboard:{manager_id}:{version}:{timezone.localdate():%Y%m%d}:{digest}'
+
+
+def get_dashboard(manager, filters, build):
+    """返回 (data, 是否命中缓存)；build(manager, filters) 生成数据"""
+    # 先读版本再计算：计算期间有写入时结果存在旧版本下，之后的请求读新版本
+    key = cache_key(manager.pk, filters, get_version(manager.pk))
+    data = _cache().get(key)
+    if data is not None:
+        return data, True
+    data = build(manager, filters)
+    _cache().set(key, data)
+    return data, False
+
+
+async def aget_dashboard(manager, filters, build):
+    key = cache_key(manager.pk, filters, await aget_version(manager.pk))
+    data = await _cache().aget(key)
+    if data is not None:
+        return data, True
+    data = await build(manager, filters)
+    await _cache().aset(key, data)
+    return data, False
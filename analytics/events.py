@@ -0,0 +1,161 @@
+"""
+管理员仪表板的实时事件（Server-Sent Events）。
+
+进程内的发布/订阅：signals 在事务提交后把增量事件发布给项目创建者，
+每个打开的仪表板订阅自己的事件流。只在当前进程内传递，
+多进程部署时每个进程只能收到本进程产生的事件，客户端在重连后会整体刷新一次。
+
+WSGI 下每个事件流占用一个 worker，默认不开启（settings.DASHBOARD_EVENTS_WSGI），
+开启时事件流在 DASHBOARD_EVENTS_WSGI_SECONDS 秒后结束，由浏览器重连。
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+
+from courses.models import Program
+
+# 没有事件时发送注释行保持连接，也让服务器能及时发现断开的客户端
+HEARTBEAT_SECONDS = 15
+# 客户端断线后的重连间隔（毫秒）
+RETRY_MILLISECONDS = 5000
+# 每个订阅者最多积压的事件数，超过后丢弃积压并要求客户端整体刷新
+MAX_PENDING_EVENTS = 100
+
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    """
+    一个事件流的队列。
+    在事件循环中创建时使用 asyncio.Queue（ASGI），否则使用线程安全的 queue.Queue（WSGI）。
+    """
+
+    def __init__(self, key, loop=None, maxsize=MAX_PENDING_EVENTS):
+        self.key = key
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+
+    def put(self, event):
+        if self.loop is None:
+            self._put(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # 事件循环已关闭，连接即将结束
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, key, loop=None):
+        subscription = Subscription(key, loop=loop)
+        with self._lock:
+            self._subscriptions[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, key, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(key, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+broker = Broker()
+
+
+def publish_program_event(program_id, event):
+    """
+    事务提交后把事件发送给项目的创建者。
+    没有任何订阅者时直接返回，不产生额外查询。
+    """
+    if program_id is None or not broker.has_subscribers():
+        return
+
+    def send():
+        manager_id = Program.objects.filter(pk=program_id).values_list(
+            'created_by_id', flat=True
+        ).first()
+        if manager_id is not None:
+            broker.publish(manager_id, dict(event, program=program_id))
+
+    transaction.on_commit(send)
+
+
+def events_enabled(request):
+    """ASGI 下总是使用事件流；WSGI 下只在 settings 开启时使用，否则由仪表板轮询"""
+    return isinstance(request, ASGIRequest) or settings.DASHBOARD_EVENTS_WSGI
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream(manager_id):
+    """WSGI 使用的同步事件流，持续 DASHBOARD_EVENTS_WSGI_SECONDS 秒后结束，释放 worker"""
+    subscription = broker.subscribe(manager_id)
+    deadline = time.monotonic() + settings.DASHBOARD_EVENTS_WSGI_SECONDS
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = subscription.get(min(HEARTBEAT_SECONDS, remaining))
+            yield format_event(event) if event else ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def aevent_stream(manager_id):
+    """ASGI 使用的异步事件流，等待事件时不占用线程"""
+    subscription = broker.subscribe(manager_id, loop=asyncio.get_running_loop())
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while True:
+            event = await subscription.aget(HEARTBEAT_SECONDS)
+            yield format_event(event) if event else ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
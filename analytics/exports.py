@@ -0,0 +1,124 @@
+"""
+学员进度与测验结果导出。
+
+行数据用 values_list().iterator(chunk_size) 逐块读取（PostgreSQL 上为服务器端游标），
+再逐行写成 CSV 或 JSON Lines，内存占用与导出的行数无关。
+筛选条件与 update_dashboard 相同（parse_dashboard_filters）。
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Subquery
+
+from courses.models import QuizResponse
+from progress.models import ProgramProgress
+from .aggregation import filter_programs
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def _rate(done, total):
+    return round(done / total * 100, 1) if total else 0
+
+
+def _filter_rows(queryset, manager, filters, program_field):
+    """项目按仪表板的规则筛选，部门和用户直接筛选导出的行"""
+    program_ids = filter_programs(manager, filters).values('id')
+    queryset = queryset.filter(**{f'{program_field}__in': Subquery(program_ids)})
+    if filters['departments']:
+        queryset = queryset.filter(user__department_id__in=filters['departments'])
+    if filters['users']:
+        queryset = queryset.filter(user_id__in=filters['users'])
+    return queryset
+
+
+PROGRESS_COLUMNS = [
+    'user_id', 'username', 'department', 'program_id', 'program', 'enrolled_at',
+    'lessons_completed', 'lessons_total', 'progress_percentage',
+    'quizzes_answered', 'quizzes_total', 'points_earned', 'points_graded',
+    'points_possible', 'quiz_score', 'completed', 'last_activity',
+]
+
+
+def progress_rows(manager, filters, chunk_size=CHUNK_SIZE):
+    """每个 (用户, 项目) 一行，数据来自进度汇总表"""
+    queryset = _filter_rows(ProgramProgress.objects.all(), manager, filters, 'program_id')
+    rows = queryset.order_by('program_id', 'user_id').values_list(
+        'user_id', 'user__username', 'user__department__name', 'program_id', 'program__title',
+        'enrolled_at', 'lessons_completed', 'lessons_total',
+        'quizzes_answered', 'quizzes_total', 'points_earned', 'points_graded',
+        'points_possible', 'last_activity',
+    )
+    for (user_id, username, department, program_id, title, enrolled_at,
+         lessons_completed, lessons_total, quizzes_answered, quizzes_total,
+         points_earned, points_graded, points_possible, last_activity) in rows.iterator(chunk_size):
+        yield [
+            user_id, username, department, program_id, title, enrolled_at,
+            lessons_completed, lessons_total, _rate(lessons_completed, lessons_total),
+            quizzes_answered, quizzes_total, points_earned, points_graded,
+            points_possible, _rate(points_earned, points_graded),
+            lessons_total > 0 and lessons_completed >= lessons_total, last_activity,
+        ]
+
+
+QUIZ_RESULT_COLUMNS = [
+    'response_id', 'user_id', 'username', 'department', 'program_id', 'program',
+    'lesson_id', 'lesson', 'quiz_id', 'quiz', 'quiz_type', 'selected_choice',
+    'is_correct', 'text_response', 'points_earned', 'points_possible',
+    'grading_status', 'submitted_at', 'graded_at', 'graded_by',
+]
+
+
+def quiz_result_rows(manager, filters, chunk_size=CHUNK_SIZE):
+    """每份测验答卷一行"""
+    queryset = _filter_rows(
+        QuizResponse.objects.all(), manager, filters, 'quiz__lesson__topic__program_id'
+    )
+    rows = queryset.order_by('id').values_list(
+        'id', 'user_id', 'user__username', 'user__department__name',
+        'quiz__lesson__topic__program_id', 'quiz__lesson__topic__program__title',
+        'quiz__lesson_id', 'quiz__lesson__title', 'quiz_id', 'quiz__title', 'quiz__quiz_type',
+        'selected_choice__choice_text', 'selected_choice__is_correct', 'text_response',
+        'points_earned', 'quiz__points', 'grading_status', 'submitted_at', 'graded_at',
+        'graded_by__username',
+    )
+    for row in rows.iterator(chunk_size):
+        yield list(row)
+
+
+DATASETS = {
+    'progress': (PROGRESS_COLUMNS, progress_rows),
+    'quiz-results': (QUIZ_RESULT_COLUMNS, quiz_result_rows),
+}
+
+
+class _Echo:
+    """csv.writer 的输出对象，直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream_export(dataset, manager, filters, fmt='csv', chunk_size=CHUNK_SIZE):
+    """返回逐行生成导出内容的迭代器"""
+    columns, rows = DATASETS[dataset]
+    stream = stream_jsonl if fmt == 'jsonl' else stream_csv
+    return stream(columns, rows(manager, filters, chunk_size=chunk_size))
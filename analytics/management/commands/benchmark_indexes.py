@@ -0,0 +1,149 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from analytics.synthetic import DEFAULT_SCALE, generate_dataset
+from courses.models import LessonProgress, QuizResponse
+
+BENCHMARK_MODELS = (QuizResponse, LessonProgress)
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_queries(user_id, program_id, since):
+    """各视图中的高频查询形状"""
+    return {
+        'user pending responses': QuizResponse.objects.filter(
+            user_id=user_id, grading_status='PENDING'),
+        'user graded responses': QuizResponse.objects.filter(
+            user_id=user_id, grading_status='GRADED'),
+        'program pending responses': QuizResponse.objects.filter(
+            quiz__lesson__topic__program_id=program_id, grading_status='PENDING'),
+        'user recent responses': QuizResponse.objects.filter(
+            user_id=user_id).order_by('-submitted_at')[:5],
+        'user completed lessons': LessonProgress.objects.filter(
+            user_id=user_id, completed=True),
+        'user 30-day trend': LessonProgress.objects.filter(
+            user_id=user_id, completed=True, completed_at__gte=since
+        ).annotate(date=TruncDate('completed_at')).values('date').annotate(
+            lessons_completed=Count('id')).order_by('date'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Build a synthetic dataset inside a rolled-back transaction and compare '
+        'query plans and timings of the hot filter paths with and without the indexes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--programs', type=int, default=10)
+        parser.add_argument('--lessons', type=int, default=5, help='Lessons per topic')
+        parser.add_argument('--quizzes', type=int, default=2, help='Quizzes per lesson')
+        parser.add_argument('--enrollments', type=int, default=3, help='Programs per user')
+        parser.add_argument('--samples', type=int, default=20, help='Users/programs queried per run')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs per query')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the generated users')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                samples = self.generate(options)
+                self.analyze()
+                since = timezone.now() - timedelta(days=30)
+                queries = [hot_queries(user_id, program_id, since) for user_id, program_id in samples]
+
+                self.toggle_indexes(drop=True)
+                self.analyze()
+                before = self.measure(queries, options['repeat'])
+
+                self.toggle_indexes(drop=False)
+                self.analyze()
+                after = self.measure(queries, options['repeat'])
+
+                self.report(before, after)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, options):
+        scale = DEFAULT_SCALE._replace(
+            users=options['users'], programs=options['programs'],
+            lessons=options['lessons'], quizzes=options['quizzes'],
+            enrollments=options['enrollments'],
+        )
+        self.stderr.write('Generating synthetic data...')
+        dataset = generate_dataset(scale, seed=options['seed'], prefix=options['prefix'])
+        self.stderr.write(', '.join(f'{count} {name}' for name, count in dataset.counts.items()))
+
+        # 每次计时覆盖多个用户/项目，减少单个样本的偶然性
+        rng = random.Random(options['seed'])
+        return [
+            (rng.choice(dataset.users).pk, rng.choice(dataset.programs).pk)
+            for _ in range(options['samples'])
+        ]
+
+    def analyze(self):
+        # 更新统计信息，让查询计划器看到新数据和索引
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'postgresql':
+                for model in BENCHMARK_MODELS:
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def toggle_indexes(self, drop):
+        # 直接执行 DDL：SQLite 的 schema_editor 不能在事务中使用
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in BENCHMARK_MODELS:
+                for index in model._meta.indexes:
+                    if drop:
+                        sql = editor.sql_delete_index % {
+                            'table': editor.quote_name(model._meta.db_table),
+                            'name': editor.quote_name(index.name),
+                        }
+                    else:
+                        sql = str(index.create_sql(model, editor))
+                    cursor.execute(sql)
+
+    def measure(self, queries, repeat):
+        """只计算数据库执行时间（直接执行 SQL），不包含 ORM 构造对象的开销"""
+        results = {}
+        for name in queries[0]:
+            plan = queries[0][name].explain()
+            statements = [sample[name].query.sql_with_params() for sample in queries]
+            timings = []
+            with connection.cursor() as cursor:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for sql, params in statements:
+                        cursor.execute(sql, params)
+                        cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (plan, statistics.median(timings))
+        return results
+
+    def report(self, before, after):
+        for name in before:
+            plan_before, ms_before = before[name]
+            plan_after, ms_after = after[name]
+            speedup = ms_before / ms_after if ms_after else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'\n{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms ({speedup:.1f}x)'
+            ))
+            self.stdout.write('  without indexes:')
+            self.stdout.write('\n'.join(f'    {line}' for line in plan_before.splitlines()))
+            self.stdout.write('  with indexes:')
+            self.stdout.write('\n'.join(f'    {line}' for line in plan_after.splitlines()))
@@ -0,0 +1,242 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from accounts.models import User
+from courses.models import Enrollment, Lesson, Program, Quiz, QuizResponse, Topic
+
+BENCHMARK_NAMESPACES = ('courses', 'progress', 'analytics')
+
+# 参数名对应的模型；pk 由视图的 model 或下面的 URL 名称决定
+PARAM_MODELS = {
+    'program_id': 'program',
+    'topic_id': 'topic',
+    'lesson_id': 'lesson',
+    'quiz_id': 'quiz',
+}
+PK_MODELS = {
+    'manage_enrollments': 'program',
+    'enroll_course': 'program',
+    'unenroll_course': 'program',
+    'enrollment_progress': 'enrollment',
+    'complete_lesson': 'lesson',
+    'grade_response': 'response',
+}
+EXTRA_KWARGS = {
+    'export_data': {'dataset': 'progress'},
+}
+# 不会结束的事件流
+SKIP_URLS = {'dashboard_events'}
+
+
+class Rollback(Exception):
+    pass
+
+
+def iter_patterns(namespaces=BENCHMARK_NAMESPACES):
+    """(可 reverse 的 URL 名称, URLPattern) —— 只取各 app 自己的 urls"""
+    for resolver in get_resolver().url_patterns:
+        if not isinstance(resolver, URLResolver):
+            continue
+        module = getattr(resolver.urlconf_module, '__name__', '')
+        app = module.split('.')[0]
+        if app not in namespaces:
+            continue
+        seen = set()
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name and pattern.name not in seen:
+                seen.add(pattern.name)
+                name = f'{resolver.namespace}:{pattern.name}' if resolver.namespace else pattern.name
+                yield name, pattern
+
+
+def sample_objects(user):
+    """为 URL 参数挑选该用户能访问的对象"""
+    if user.is_manager:
+        program = Program.objects.filter(created_by=user, topics__lessons__quizzes__isnull=False).first()
+    else:
+        program = Program.objects.filter(enrollment__user=user, topics__lessons__quizzes__isnull=False).first()
+    if program is None:
+        return None
+    topic = Topic.objects.filter(program=program, lessons__quizzes__isnull=False).first()
+    lesson = Lesson.objects.filter(topic=topic, quizzes__isnull=False).first()
+    quiz = Quiz.objects.filter(lesson=lesson).first()
+    responses = QuizResponse.objects.filter(quiz__lesson__topic__program=program)
+    if not user.is_manager:
+        responses = responses.filter(user=user)
+    enrollment = Enrollment.objects.filter(program=program).first()
+    return {
+        'program': program,
+        'topic': topic,
+        'lesson': lesson,
+        'quiz': quiz,
+        'response': responses.first(),
+        'enrollment': enrollment,
+    }
+
+
+def url_kwargs(name, pattern, objects):
+    kwargs = dict(EXTRA_KWARGS.get(name, {}))
+    view_model = getattr(getattr(pattern.callback, 'view_class', None), 'model', None)
+    for param in pattern.pattern.converters:
+        if param in kwargs:
+            continue
+        if param == 'pk':
+            key = PK_MODELS.get(name) or (view_model._meta.model_name if view_model else None)
+            key = {'quizresponse': 'response'}.get(key, key)
+        else:
+            key = PARAM_MODELS.get(param)
+        obj = objects.get(key)
+        if obj is None:
+            return None
+        kwargs[param] = obj.pk
+    return kwargs
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every URL in courses, progress and analytics through the test client '
+        'and record wall time, query count and peak memory to a JSON file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--manager', help='Manager username (default: first manager)')
+        parser.add_argument('--user', help='Learner username (default: first enrolled learner)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per URL')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per URL')
+        parser.add_argument('--only', action='append', default=[], help='Only run these URL names')
+        parser.add_argument('--output', help='Result file (default: benchmark-<timestamp>.json)')
+        parser.add_argument('--compare', help='Previous result file to compare against')
+
+    def get_user(self, username, manager):
+        users = User.objects.filter(is_manager=manager, is_active=True)
+        if username:
+            users = users.filter(username=username)
+        elif not manager:
+            users = users.filter(enrollment__isnull=False)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError(
+                f"No {'manager' if manager else 'learner'} found; run generate_dataset first"
+            )
+        return user
+
+    def handle(self, *args, **options):
+        roles = {
+            'manager': self.get_user(options['manager'], manager=True),
+            'learner': self.get_user(options['user'], manager=False),
+        }
+
+        results = []
+        for role, user in roles.items():
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            objects = sample_objects(user) or {}
+            for name, pattern in iter_patterns():
+                if pattern.name in SKIP_URLS:
+                    continue
+                if options['only'] and name not in options['only'] and pattern.name not in options['only']:
+                    continue
+                kwargs = url_kwargs(pattern.name, pattern, objects)
+                if kwargs is None:
+                    self.stderr.write(f'skip {name} ({role}): no sample object')
+                    continue
+                path = reverse(name, kwargs=kwargs)
+                result = self.measure(client, path, options['repeat'], options['warmup'])
+                result.update(name=name, role=role, path=path)
+                results.append(result)
+                self.stdout.write(
+                    f"{result['status']} {role:<8} {result['name']:<32} "
+                    f"{result['median_ms']:>9.1f} ms {result['queries']:>5} queries "
+                    f"{result['peak_kb']:>9.1f} KiB"
+                )
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        output = options['output'] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def request(self, client, path):
+        """在回滚的事务中请求一次，GET 有副作用的视图也不会修改数据"""
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = (time.perf_counter() - start) * 1000
+                raise Rollback
+        except Rollback:
+            pass
+        return response.status_code, elapsed, len(captured.captured_queries)
+
+    def measure(self, client, path, repeat, warmup):
+        for _ in range(warmup):
+            self.request(client, path)
+        runs = [self.request(client, path) for _ in range(repeat)]
+        timings = [elapsed for _, elapsed, _ in runs]
+
+        # 内存单独测一次，tracemalloc 会拖慢计时
+        tracemalloc.start()
+        try:
+            self.request(client, path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        status, _, queries = runs[-1]
+        return {
+            'status': status,
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, previous_file, results):
+        with open(previous_file, encoding='utf-8') as f:
+            previous = {
+                (row['name'], row['role']): row for row in json.load(f)['results']
+            }
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nCompared with {previous_file}:'))
+        for row in results:
+            old = previous.get((row['name'], row['role']))
+            if not old:
+                continue
+            self.stdout.write(
+                f"{row['role']:<8} {row['name']:<32} "
+                f"{old['median_ms']:>9.1f} -> {row['median_ms']:>9.1f} ms  "
+                f"{old['queries']:>5} -> {row['queries']:>5} queries  "
+                f"{old['peak_kb']:>9.1f} -> {row['peak_kb']:>9.1f} KiB"
+            )
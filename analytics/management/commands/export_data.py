@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from accounts.models import Department, User
+from analytics.aggregation import parse_dashboard_filters, validate_dashboard_filters
+from analytics.exports import CHUNK_SIZE, DATASETS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream learner progress or quiz results as CSV / JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--manager', required=True, help='Username of the manager whose programs are exported')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', help='Output file (default: stdout)')
+        parser.add_argument('--program', action='append', default=[], help='Program id (can be repeated)')
+        parser.add_argument('--department', action='append', default=[], help='Department name or id (can be repeated)')
+        parser.add_argument('--user', action='append', default=[], help='User id (can be repeated)')
+        parser.add_argument('--time-range', default='all', help="Days, 'all' or 'custom'")
+        parser.add_argument('--date-from')
+        parser.add_argument('--date-to')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def department_ids(self, departments):
+        ids = []
+        for department in departments:
+            if department.isdigit():
+                ids.append(department)
+                continue
+            try:
+                ids.append(str(Department.objects.get(name=department).pk))
+            except Department.DoesNotExist:
+                raise CommandError(f"Department '{department}' does not exist")
+        return ids
+
+    def handle(self, *args, **options):
+        try:
+            manager = User.objects.get(username=options['manager'], is_manager=True)
+        except User.DoesNotExist:
+            raise CommandError(f"Manager '{options['manager']}' does not exist")
+
+        # 与 update_dashboard 使用同一套参数解析
+        params = QueryDict(mutable=True)
+        params.setlist('programs[]', options['program'])
+        params.setlist('departments[]', self.department_ids(options['department']))
+        params.setlist('users[]', options['user'])
+        params['timeRange'] = options['time_range']
+        if options['date_from']:
+            params['dateFrom'] = options['date_from']
+        if options['date_to']:
+            params['dateTo'] = options['date_to']
+        filters = parse_dashboard_filters(params)
+        # 在打开输出文件和查询之前校验，与导出视图的 400 相同
+        error = validate_dashboard_filters(filters)
+        if error:
+            raise CommandError(error)
+
+        chunks = stream_export(
+            options['dataset'], manager, filters, options['format'],
+            chunk_size=options['chunk_size']
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
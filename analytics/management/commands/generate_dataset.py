@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from analytics.synthetic import DEFAULT_SCALE, Scale, clear_dataset, dataset_users, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible, seeded synthetic dataset with bulk inserts'
+
+    def add_arguments(self, parser):
+        for field in Scale._fields:
+            default = getattr(DEFAULT_SCALE, field)
+            parser.add_argument(
+                f"--{field.replace('_', '-')}", type=type(default), default=default,
+                help=f'(default: {default})'
+            )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='load', help='Username prefix of the generated users')
+        parser.add_argument('--password', help='Password for every generated user (default: unusable)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true', help='Delete an existing dataset with the same prefix first')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['clear']:
+            removed = clear_dataset(prefix)
+            self.stdout.write(f'Removed {removed} users of the previous dataset.')
+        elif dataset_users(prefix).exists():
+            self.stderr.write(self.style.ERROR(
+                f"A dataset with prefix '{prefix}' already exists; use --clear or another --prefix."
+            ))
+            return
+
+        scale = Scale(**{field: options[field] for field in Scale._fields})
+        dataset = generate_dataset(
+            scale,
+            seed=options['seed'],
+            prefix=prefix,
+            password=options['password'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        for name, count in dataset.counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS('Dataset generated.'))
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('manager', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_version', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
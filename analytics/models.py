@@ -9,4 +9,20 @@ class LearningAnalytics(models.Model):
     last_activity = models.DateTimeField(auto_now=True)  # 最后活动时间
     
     class Meta:
-        unique_together = ['user', 'program']
\ No newline at end of file
+        unique_together = ['user', 'program']
+
+
+class DashboardVersion(models.Model):
+    """
+    管理员仪表板数据的版本号（analytics.cache）。其项目的报名、学习记录、答卷或
+    课程结构变化时在同一事务中递增，响应缓存的键包含版本号。
+    """
+    manager = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='dashboard_version'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.manager_id}: {self.version}"
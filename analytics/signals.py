@@ -0,0 +1,197 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import Department
+from courses.models import Enrollment, Lesson, LessonProgress, Program, Quiz, QuizResponse, Topic
+from courses.signals import enrollments_changed, is_bulk_delete, quiz_responses_changed
+from . import cache
+from .events import broker, publish_program_event
+
+User = get_user_model()
+
+
+def _is_direct_delete(origin, model):
+    """级联删除（删除项目、课程等）时仪表板会整体刷新，批量删除由汇总信号处理，都不逐行发送事件"""
+    if isinstance(origin, QuerySet):
+        return origin.model is model and not is_bulk_delete(origin)
+    return isinstance(origin, model)
+
+
+# 报名
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    if created:
+        publish_program_event(instance.program_id, {'type': 'enrollment', 'delta': 1})
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Enrollment):
+        publish_program_event(instance.program_id, {'type': 'enrollment', 'delta': -1})
+
+
+@receiver(enrollments_changed)
+def enrollments_bulk_changed(sender, program, user_ids, action, **kwargs):
+    delta = len(user_ids) if action == 'enroll' else -len(user_ids)
+    publish_program_event(program.pk, {'type': 'enrollment', 'delta': delta})
+
+
+# 课程完成
+@receiver(post_save, sender=LessonProgress)
+def lesson_progress_saved(sender, instance, **kwargs):
+    # _was_completed 由 progress.signals 的 pre_save 记录
+    if not broker.has_subscribers():
+        return
+    if instance.completed and not getattr(instance, '_was_completed', False):
+        program_id = Lesson.objects.filter(pk=instance.lesson_id).values_list(
+            'topic__program_id', flat=True
+        ).first()
+        publish_program_event(program_id, {
+            'type': 'lesson_completed',
+            'lesson': instance.lesson_id,
+            'user': instance.user_id,
+        })
+
+
+# 测验答卷
+def _publish_response_delta(response, previous, sign=1):
+    """previous 为保存前的 grading_status / points_earned，新建的答卷为空"""
+    quiz = Quiz.objects.filter(pk=response.quiz_id).values(
+        'lesson_id', 'lesson__topic__program_id', 'points'
+    ).first()
+    if quiz is None:
+        return
+
+    def state(status, points_earned):
+        graded = status == 'GRADED'
+        return (
+            int(status == 'PENDING'),
+            int(graded),
+            (points_earned or 0) if graded else 0,
+        )
+
+    pending, graded, earned = state(response.grading_status, response.points_earned)
+    old_pending, old_graded, old_earned = state(
+        previous.get('grading_status'), previous.get('points_earned')
+    )
+    event = {
+        'type': 'response',
+        'lesson': quiz['lesson_id'],
+        'pending_delta': sign * (pending - old_pending),
+        'graded_delta': sign * (graded - old_graded),
+        'points_earned_delta': sign * (earned - old_earned),
+        'points_possible_delta': sign * (graded - old_graded) * quiz['points'],
+    }
+    if any(event[key] for key in event if key.endswith('_delta')):
+        publish_program_event(quiz['lesson__topic__program_id'], event)
+
+
+@receiver(post_save, sender=QuizResponse)
+def quiz_response_saved(sender, instance, created, **kwargs):
+    if broker.has_subscribers():
+        # _previous 由 progress.signals 的 pre_save 记录
+        previous = {} if created else (getattr(instance, '_previous', None) or {})
+        _publish_response_delta(instance, previous)
+
+
+@receiver(post_delete, sender=QuizResponse)
+def quiz_response_deleted(sender, instance, origin=None, **kwargs):
+    if broker.has_subscribers() and _is_direct_delete(origin, QuizResponse):
+        _publish_response_delta(instance, {}, sign=-1)
+
+
+@receiver(quiz_responses_changed)
+def quiz_responses_bulk_changed(sender, responses, **kwargs):
+    # 批量评分不知道每行之前的状态，让仪表板整体刷新
+    if not broker.has_subscribers():
+        return
+    program_ids = set(
+        Quiz.objects.filter(
+            pk__in={response.quiz_id for response in responses}
+        ).values_list('lesson__topic__program_id', flat=True)
+    )
+    for program_id in program_ids:
+        publish_program_event(program_id, {'type': 'resync'})
+
+
+# 仪表板缓存的数据版本（analytics.cache），与写入在同一事务中递增
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def enrollment_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, Enrollment):
+        cache.bump_program(instance.program_id)
+
+
+@receiver(enrollments_changed)
+def enrollments_bulk_version(sender, program, **kwargs):
+    cache.bump_program(program.pk)
+
+
+@receiver(post_save, sender=LessonProgress)
+@receiver(post_delete, sender=LessonProgress)
+def lesson_progress_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, LessonProgress):
+        cache.bump(manager__created_programs__topics__lessons=instance.lesson_id)
+
+
+@receiver(post_save, sender=QuizResponse)
+@receiver(post_delete, sender=QuizResponse)
+def quiz_response_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, QuizResponse):
+        cache.bump(manager__created_programs__topics__lessons__quizzes=instance.quiz_id)
+
+
+@receiver(quiz_responses_changed)
+def quiz_responses_bulk_version(sender, responses, **kwargs):
+    cache.bump(
+        manager__created_programs__topics__lessons__quizzes__in={
+            response.quiz_id for response in responses
+        }
+    )
+
+
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+def program_version(sender, instance, **kwargs):
+    if instance.created_by_id is not None:
+        cache.bump(manager_id=instance.created_by_id)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_version(sender, instance, origin=None, **kwargs):
+    # 随项目级联删除时由 program_version 处理，下同
+    if origin is None or _is_direct_delete(origin, Topic):
+        cache.bump_program(instance.program_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, Lesson):
+        cache.bump(manager__created_programs__topics=instance.topic_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, Quiz):
+        cache.bump(manager__created_programs__topics__lessons=instance.lesson_id)
+
+
+# 用户换部门、删除用户或部门会改变按部门 / 用户筛选的结果，这些操作很少，全部失效
+@receiver(post_save, sender=User)
+def user_version(sender, instance, created, **kwargs):
+    # _previous_department_id 由 accounts.signals 的 pre_save 记录
+    if created or not hasattr(instance, '_previous_department_id'):
+        return
+    if instance._previous_department_id != instance.department_id:
+        cache.bump_all()
+
+
+@receiver(pre_delete, sender=User)
+@receiver(post_delete, sender=Department)
+def membership_version(sender, instance, **kwargs):
+    cache.bump_all()
@@ -0,0 +1,179 @@
+"""
+可复现的合成数据集，用于压测和基准测试。
+
+同一个 seed 和规模参数总是生成相同的数据；所有数据用 bulk_create 批量插入，
+插入后重建进度汇总表、每日活动汇总和搜索索引（批量插入不会触发 signals）。
+生成的用户名都以 prefix 开头，clear_dataset 按前缀删除整套数据。
+"""
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import search as user_search
+from accounts.models import Department
+from courses import search
+from courses.curriculum import get_versions
+from courses.grading import get_system_grader_id
+from courses.models import (
+    Enrollment, Lesson, LessonProgress, Program, Quiz, QuizChoice, QuizResponse, Topic
+)
+from progress import activity, rollup
+
+User = get_user_model()
+
+Scale = namedtuple('Scale', [
+    'users', 'departments', 'managers', 'programs', 'topics', 'lessons', 'quizzes',
+    'choices', 'enrollments', 'completion_rate', 'answer_rate', 'pending_rate', 'days',
+])
+# topics/lessons/quizzes 分别为每个项目/主题/课程的数量，enrollments 为每个用户报名的项目数
+DEFAULT_SCALE = Scale(
+    users=1000, departments=5, managers=3, programs=10, topics=4, lessons=5, quizzes=2,
+    choices=4, enrollments=3, completion_rate=0.6, answer_rate=0.5, pending_rate=0.3, days=120,
+)
+
+Dataset = namedtuple('Dataset', 'managers users programs counts')
+
+
+def dataset_users(prefix):
+    return User.objects.filter(username__startswith=f'{prefix}-')
+
+
+def clear_dataset(prefix):
+    """删除以 prefix 生成的数据（项目由其管理员级联删除）"""
+    with transaction.atomic():
+        users = dataset_users(prefix)
+        Program.objects.filter(created_by__in=users).delete()
+        return users.delete()[1].get(User._meta.label, 0)
+
+
+def generate_dataset(scale=DEFAULT_SCALE, seed=0, prefix='load', password=None,
+                     batch_size=2000, log=None):
+    rng = random.Random(seed)
+    now = timezone.now()
+    log = log or (lambda message: None)
+    # 所有用户共用一个密码哈希，避免逐个计算
+    password = make_password(password) if password else make_password(None)
+    department_names = [f'Department {i + 1}' for i in range(scale.departments)]
+
+    with transaction.atomic():
+        log('Creating users...')
+        Department.objects.bulk_create(
+            [Department(name=name) for name in department_names], ignore_conflicts=True
+        )
+        by_name = Department.objects.in_bulk(department_names, field_name='name')
+        departments = [by_name[name] for name in department_names]
+        managers = User.objects.bulk_create([
+            User(username=f'{prefix}-manager-{i}', password=password, is_manager=True,
+                 department=rng.choice(departments))
+            for i in range(scale.managers)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-user-{i}', password=password,
+                 department=rng.choice(departments))
+            for i in range(scale.users)
+        ], batch_size=batch_size)
+        # bulk_create 不触发 signals，成员数在这里统一校正
+        Department.objects.refresh_member_counts([department.pk for department in departments])
+
+        log('Creating curriculum...')
+        programs = Program.objects.bulk_create([
+            Program(title=f'Program {i + 1}', description=f'Synthetic program {i + 1}',
+                    created_by=managers[i % len(managers)])
+            for i in range(scale.programs)
+        ])
+        topics = Topic.objects.bulk_create([
+            Topic(program=program, title=f'Topic {i + 1}', description='', order=i)
+            for program in programs for i in range(scale.topics)
+        ], batch_size=batch_size)
+        lessons = Lesson.objects.bulk_create([
+            Lesson(topic=topic, title=f'Lesson {i + 1}', content='Lorem ipsum ' * 20, order=i)
+            for topic in topics for i in range(scale.lessons)
+        ], batch_size=batch_size)
+        quizzes = Quiz.objects.bulk_create([
+            Quiz(lesson=lesson, title=f'Quiz {i + 1}', question='Question?',
+                 quiz_type='MCQ' if i % 2 == 0 else 'OPEN', points=rng.choice([5, 10, 20]))
+            for lesson in lessons for i in range(scale.quizzes)
+        ], batch_size=batch_size)
+        choices = QuizChoice.objects.bulk_create([
+            QuizChoice(quiz=quiz, choice_text=f'Choice {i + 1}', is_correct=i == 0)
+            for quiz in quizzes if quiz.quiz_type == 'MCQ' for i in range(scale.choices)
+        ], batch_size=batch_size)
+        # 结构版本号同样由 signals 建立，这里一次补齐，第一次请求页面时不用再插入
+        get_versions([program.pk for program in programs])
+
+        lessons_by_program, quizzes_by_program, choices_by_quiz = {}, {}, {}
+        for lesson in lessons:
+            lessons_by_program.setdefault(lesson.topic.program_id, []).append(lesson)
+        for quiz in quizzes:
+            quizzes_by_program.setdefault(quiz.lesson.topic.program_id, []).append(quiz)
+        for choice in choices:
+            choices_by_quiz.setdefault(choice.quiz_id, []).append(choice)
+
+        log('Creating enrollments, progress and responses...')
+        grader_id = get_system_grader_id()
+        enrollments, progress, responses = [], [], []
+        for user in users:
+            for program in rng.sample(programs, min(scale.enrollments, len(programs))):
+                enrollments.append(Enrollment(
+                    user=user, program=program, enrolled_by=program.created_by
+                ))
+                for lesson in lessons_by_program.get(program.id, ()):
+                    if rng.random() < scale.completion_rate:
+                        progress.append(LessonProgress(
+                            user=user, lesson=lesson, completed=True,
+                            completed_at=now - timedelta(
+                                days=rng.randrange(scale.days), seconds=rng.randrange(86400)
+                            )
+                        ))
+                for quiz in quizzes_by_program.get(program.id, ()):
+                    if rng.random() >= scale.answer_rate:
+                        continue
+                    response = QuizResponse(user=user, quiz=quiz)
+                    if quiz.quiz_type == 'MCQ':
+                        choice = rng.choice(choices_by_quiz[quiz.id])
+                        response.selected_choice = choice
+                        response.grading_status = 'GRADED'
+                        response.points_earned = quiz.points if choice.is_correct else 0
+                        response.graded_at = now
+                        response.graded_by_id = grader_id
+                    else:
+                        response.text_response = 'Synthetic answer'
+                        if rng.random() >= scale.pending_rate:
+                            response.grading_status = 'GRADED'
+                            response.points_earned = rng.randrange(quiz.points + 1)
+                            response.graded_at = now
+                            response.graded_by = program.created_by
+                    responses.append(response)
+
+        Enrollment.objects.bulk_create(enrollments, batch_size=batch_size)
+        LessonProgress.objects.bulk_create(progress, batch_size=batch_size)
+        QuizResponse.objects.bulk_create(responses, batch_size=batch_size)
+
+        log('Rebuilding progress and activity rollups...')
+        rollup.rebuild([program.pk for program in programs], batch_size=batch_size)
+        activity.rebuild([program.pk for program in programs], batch_size=batch_size)
+
+        log('Rebuilding search indexes...')
+        search.rebuild([program.pk for program in programs])
+        people = [(user.pk, user.username, user.email) for user in managers + users]
+        for start in range(0, len(people), batch_size):
+            user_search.index_users(people[start:start + batch_size])
+
+    counts = {
+        'managers': len(managers),
+        'users': len(users),
+        'programs': len(programs),
+        'topics': len(topics),
+        'lessons': len(lessons),
+        'quizzes': len(quizzes),
+        'choices': len(choices),
+        'enrollments': len(enrollments),
+        'lesson_progress': len(progress),
+        'responses': len(responses),
+    }
+    return Dataset(managers=managers, users=users, programs=programs, counts=counts)
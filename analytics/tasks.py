@@ -0,0 +1,42 @@
+"""后台任务（jobs.queue）：导出写入文件，完成后通过 jobs:job_download 下载"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.utils import timezone
+
+from jobs.queue import result_path, task
+from .aggregation import parse_dashboard_filters
+from .exports import CHUNK_SIZE, FORMATS, stream_export
+
+User = get_user_model()
+
+
+@task('analytics.export')
+def export_job(job, dataset, manager_id, params, fmt='csv', chunk_size=CHUNK_SIZE):
+    """params 为导出请求的 GET 参数（{key: [values]}），与 export_data 视图使用同一套解析"""
+    manager = User.objects.get(pk=manager_id, is_manager=True)
+    query = QueryDict(mutable=True)
+    for key, values in params.items():
+        query.setlist(key, values)
+    filters = parse_dashboard_filters(query)
+
+    content_type, extension = FORMATS[fmt]
+    path = result_path(job, extension)
+    partial = f'{path}.part'
+    lines = 0
+    with open(partial, 'w', encoding='utf-8', newline='') as output:
+        for chunk in stream_export(dataset, manager, filters, fmt, chunk_size=chunk_size):
+            output.write(chunk)
+            lines += 1
+            if lines % chunk_size == 0:
+                job.report_progress(lines, None, f'{lines} rows written')
+    # 写完后再改名，下载时不会读到不完整的文件
+    os.replace(partial, path)
+
+    return {
+        'file': os.path.basename(path),
+        'filename': f"{dataset}-{timezone.localdate():%Y%m%d}.{extension}",
+        'content_type': content_type,
+        'rows': lines - 1 if fmt == 'csv' else lines,
+    }
@@ -1,3 +1,120 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+
+from asgiref.sync import iscoroutinefunction
+from django.core.management import CommandError, call_command
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from courses.models import Enrollment, Program
+from micro_training.middleware import RequestMetricsMiddleware, current_metrics
+
+
+class AsyncMiddlewareTests(TransactionTestCase):
+    """ASGI 下中间件链保持异步，请求指标在异步视图中同样生效"""
+
+    # 异步仪表板在线程池的其他连接中查询，看不到 TestCase 事务中的数据
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', is_manager=True)
+        Program.objects.create(title='Safety', description='', created_by=self.manager)
+
+    @override_settings(DEBUG=True)
+    def test_chain_is_not_adapted(self):
+        # 只要有一个中间件被适配，Django 会记录 "... adapted for middleware ..."
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler()
+
+    async def test_async_branch_sets_current_metrics(self):
+        seen = []
+
+        async def view(request):
+            seen.append(current_metrics())
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = await middleware(RequestFactory().get('/'))
+
+        self.assertIsNotNone(seen[0])
+        self.assertIsNone(current_metrics())
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    async def test_async_dashboard_counts_queries(self):
+        await self.async_client.aforce_login(self.manager)
+
+        response = await self.async_client.get(reverse('analytics:update_dashboard_async'))
+
+        self.assertEqual(response.status_code, 200)
+        queries = int(response['Server-Timing'].split('desc="', 1)[1].split(' ', 1)[0])
+        self.assertGreater(queries, 0)
+
+
+class ExportCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        cls.program = Program.objects.create(title='Safety', description='', created_by=cls.manager)
+        cls.learner = User.objects.create_user('learner')
+        Enrollment.objects.create(user=cls.learner, program=cls.program)
+
+    def export(self, *args, **options):
+        stdout = StringIO()
+        call_command('export_data', 'progress', *args, manager='manager', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_exports_rows(self):
+        lines = self.export(program=[str(self.program.pk)]).splitlines()
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.learner.pk},learner,,{self.program.pk},Safety,'))
+
+    def test_invalid_filters_fail_before_writing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'export.csv')
+            for options, message in (
+                ({'time_range': 'soon'}, "timeRange must be 'all', 'custom' or a number of days."),
+                ({'time_range': 'custom', 'date_from': '2024-13-01'}, 'dateFrom must be a date (YYYY-MM-DD).'),
+                ({'user': ['x']}, 'users[] must be a list of ids.'),
+            ):
+                with self.subTest(**options), self.assertRaisesMessage(CommandError, message):
+                    self.export(output=output, **options)
+            self.assertFalse(os.path.exists(output))
+
+
+class DashboardConditionalTests(TestCase):
+    """只有成功的仪表板响应带 ETag，错误的筛选条件不会因为 If-None-Match 变成 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        Program.objects.create(title='Safety', description='', created_by=cls.manager)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def test_not_modified(self):
+        url = reverse('analytics:update_dashboard')
+        response = self.client.get(url, {'timeRange': '30'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, {'timeRange': '30'}, headers={'if-none-match': response['ETag']})
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalid_filters_have_no_etag(self):
+        for name in ('analytics:update_dashboard', 'analytics:update_dashboard_async'):
+            with self.subTest(name):
+                url = reverse(name)
+                response = self.client.get(url, {'timeRange': 'soon'})
+                self.assertEqual(response.status_code, 400)
+                self.assertNotIn('ETag', response)
+
+                response = self.client.get(url, {'timeRange': 'soon'}, headers={'if-none-match': '*'})
+
+                self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
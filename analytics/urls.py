@@ -5,6 +5,10 @@ app_name = 'analytics'
 
 urlpatterns = [
     path('manager/', views.ManagerDashboardView.as_view(), name='manager_dashboard'),
+    path('manager/analytics/', views.ManagerAnalyticsView.as_view(), name='manager_analytics'),
     path('user/', views.UserDashboardView.as_view(), name='user_dashboard'),
     path('manager/update/', views.update_dashboard, name='update_dashboard'),
+    path('manager/update/async/', views.update_dashboard_async, name='update_dashboard_async'),
+    path('manager/events/', views.dashboard_events, name='dashboard_events'),
+    path('manager/export/<slug:dataset>/', views.export_data, name='export_data'),
 ]
\ No newline at end of file
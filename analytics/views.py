@@ -1,15 +1,36 @@
+import logging
+
+from django.conf import settings
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Count, Avg, Case, When, FloatField, Q
+from django.db.models import Count, Avg, F, Q
 from django.db.models.functions import TruncMonth, TruncDate
 from django.utils import timezone
 from datetime import timedelta
-from courses.models import Program, QuizResponse, Topic, Lesson, Enrollment, Quiz
-from progress.models import ProgramEnrollment, LessonProgress
+from courses.models import Program, QuizResponse, Topic, Lesson, Enrollment, Quiz, LessonProgress
+from progress.models import DepartmentProgramStats, ProgramProgress
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
-from accounts.models import User
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from accounts.models import Department, User
 from django.contrib.auth.decorators import login_required
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.core.handlers.asgi import ASGIRequest
+from .aggregation import (
+    parse_dashboard_filters, validate_dashboard_filters, build_dashboard, build_dashboard_async
+)
+from . import cache as dashboard_cache
+from .events import aevent_stream, event_stream, events_enabled
+from .exports import DATASETS, FORMATS, stream_export
+from jobs.queue import enqueue
+from jobs.views import serialize_job
+from micro_training.conditional import make_etag
+
+logger = logging.getLogger(__name__)
+
+# 汇总行中已完成的项目
+COMPLETED_PROGRESS = Q(lessons_total__gt=0, lessons_completed__gte=F('lessons_total'))
 
 class UserAnalyticsView(LoginRequiredMixin, TemplateView):
     template_name = 'analytics/user_dashboard.html'
@@ -18,12 +39,15 @@ class UserAnalyticsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        # 学习进度统计
-        enrollments = ProgramEnrollment.objects.filter(user=user)
+        # 学习进度统计（一次查询，来自进度汇总表）
+        totals = ProgramProgress.objects.filter(user=user).aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=COMPLETED_PROGRESS),
+        )
         context.update({
-            'total_enrolled': enrollments.count(),
-            'completed_programs': enrollments.filter(completed=True).count(),
-            'in_progress_programs': enrollments.filter(completed=False).count(),
+            'total_enrolled': totals['total'],
+            'completed_programs': totals['completed'],
+            'in_progress_programs': totals['total'] - totals['completed'],
         })
 
         # 测验成绩统计
@@ -40,6 +64,7 @@ class UserAnalyticsView(LoginRequiredMixin, TemplateView):
         last_30_days = timezone.now() - timedelta(days=30)
         daily_progress = LessonProgress.objects.filter(
             user=user,
+            completed=True,
             completed_at__gte=last_30_days
         ).annotate(
             date=TruncDate('completed_at')
@@ -52,53 +77,65 @@ class UserAnalyticsView(LoginRequiredMixin, TemplateView):
         return context
 
 class ManagerAnalyticsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
-    template_name = 'analytics/manager_dashboard.html'
+    template_name = 'analytics/manager_analytics.html'
+
+    # 合计时累加的单元格字段
+    CELL_FIELDS = (
+        'enrolled_count', 'completed_count', 'points_earned', 'points_graded', 'pending_grading',
+    )
 
     def test_func(self):
         return self.request.user.is_manager
 
+    def _add(self, total, cell):
+        for name in self.CELL_FIELDS:
+            setattr(total, name, getattr(total, name) + getattr(cell, name))
+        if cell.updated_at and (total.updated_at is None or cell.updated_at > total.updated_at):
+            total.updated_at = cell.updated_at
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # 平台总体统计
-        context.update({
-            'total_users': ProgramEnrollment.objects.values('user').distinct().count(),
-            'total_programs': Program.objects.count(),
-            'total_completions': ProgramEnrollment.objects.filter(completed=True).count(),
-        })
-
-        # 项目参与度分析
-        program_analytics = Program.objects.annotate(
-            enrolled_count=Count('programenrollment__user', distinct=True),
-            completion_rate=Avg(
-                Case(
-                    When(programenrollment__completed=True, then=100),
-                    default=0,
-                    output_field=FloatField(),
-                )
-            ),
-            avg_quiz_score=Avg('lesson__quiz__quizattempt__score')
-        ).values('title', 'enrolled_count', 'completion_rate', 'avg_quiz_score')
-        
-        context['program_analytics'] = program_analytics
 
-        # 部门学习情况
-        department_analytics = ProgramEnrollment.objects.values(
-            'user__department'
-        ).annotate(
-            user_count=Count('user', distinct=True),
-            completion_rate=Avg(
-                Case(
-                    When(completed=True, then=100),
-                    default=0,
-                    output_field=FloatField(),
-                )
-            ),
-            avg_quiz_score=Avg('user__quizattempt__score')
+        # 只读部门 × 项目汇总表（progress.cube 维护），查询量与报名人数无关；
+        # 项目、部门和平台的合计在 Python 中由单元格相加得到
+        cells = list(
+            DepartmentProgramStats.objects.select_related('program', 'department')
+            .order_by('program__title', 'program_id')
+        )
+        overall = DepartmentProgramStats()
+        programs = {}
+        departments = {}
+        matrix = {}
+        for cell in cells:
+            program = programs.setdefault(cell.program_id, DepartmentProgramStats(program=cell.program))
+            department = departments.setdefault(
+                cell.department_id, DepartmentProgramStats(department=cell.department)
+            )
+            for total in (overall, program, department):
+                self._add(total, cell)
+            matrix[(cell.department_id, cell.program_id)] = cell
+
+        program_rows = list(programs.values())
+        # 没有部门的用户排在最后
+        department_rows = sorted(
+            departments.values(),
+            key=lambda row: (row.department is None, row.department.name if row.department else '')
         )
-        
-        context['department_analytics'] = department_analytics
 
+        context.update({
+            'total_programs': Program.objects.count(),
+            'total_enrollments': overall.enrolled_count,
+            'total_completions': overall.completed_count,
+            'pending_grading': overall.pending_grading,
+            'completion_rate': overall.completion_rate,
+            'updated_at': overall.updated_at,
+            'program_analytics': program_rows,
+            'department_analytics': department_rows,
+            'matrix_rows': [
+                (row, [matrix.get((row.department_id, program.program_id)) for program in program_rows])
+                for row in department_rows
+            ],
+        })
         return context
 
 class ManagerDashboardView(LoginRequiredMixin, TemplateView):
@@ -114,8 +151,11 @@ class ManagerDashboardView(LoginRequiredMixin, TemplateView):
         
         # 获取所有可用的筛选选项
         context['programs'] = Program.objects.filter(created_by=self.request.user)
-        context['departments'] = set(user.department for user in User.objects.all() if user.department)
-        context['users'] = User.objects.filter(is_manager=False)
+        context['departments'] = Department.objects.all()
+        context['users'] = User.objects.filter(is_manager=False, is_active=True)
+        # 实时事件流或定期轮询
+        context['live_events'] = events_enabled(self.request)
+        context['poll_seconds'] = settings.DASHBOARD_POLL_SECONDS
         
         # 获取基础统计数据
         context['active_programs_count'] = Program.objects.filter(
@@ -128,7 +168,7 @@ class ManagerDashboardView(LoginRequiredMixin, TemplateView):
         
         context['pending_grading_count'] = QuizResponse.objects.filter(
             quiz__lesson__topic__program__created_by=self.request.user,
-            grading_status='pending'
+            grading_status='PENDING'
         ).count()
         
         return context
@@ -147,7 +187,7 @@ class ManagerDashboardView(LoginRequiredMixin, TemplateView):
         if programs:
             query = query.filter(id__in=programs)
         if departments:
-            query = query.filter(enrolled_users__department__in=departments)
+            query = query.filter(enrolled_users__department_id__in=departments)
         if users:
             query = query.filter(enrolled_users__id__in=users)
             
@@ -291,141 +331,128 @@ def get_recent_activities(user):
 
     return sorted(activities, key=lambda x: x['timestamp'], reverse=True)
 
+def dashboard_etag(request, user=None, version=None):
+    """
+    update_dashboard 的 ETag：与响应缓存的键相同（管理员、筛选条件、日期和数据版本），
+    只需读取一次版本号
+    """
+    user = user if user is not None else request.user
+    if not user.is_manager:
+        return None
+    if version is None:
+        version = dashboard_cache.get_version(user.pk)
+    filters = parse_dashboard_filters(request.GET)
+    return make_etag(request, dashboard_cache.cache_key(user.pk, filters, version), user=user)
+
 @login_required
+@cache_control(private=True, no_cache=True)
 def update_dashboard(request):
     try:
         if not request.user.is_manager:
             return JsonResponse({'error': 'Permission denied'}, status=403)
 
         # 获取筛选参数
-        programs = request.GET.getlist('programs[]', [])
-        departments = request.GET.getlist('departments[]', [])
-        users = request.GET.getlist('users[]', [])
-        time_range = request.GET.get('timeRange', 'all')
-
-        # 构建基础查询
-        query = Program.objects.filter(created_by=request.user)
-        
-        # 应用筛选器
-        if 'all' not in programs and programs:
-            query = query.filter(id__in=programs)
-        if 'all' not in departments and departments:
-            query = query.filter(enrolled_users__department__in=departments)
-        if 'all' not in users and users:
-            query = query.filter(enrolled_users__id__in=users)
-            
-        # 处理时间范围
-        if time_range == 'custom':
-            date_from = request.GET.get('dateFrom')
-            date_to = request.GET.get('dateTo')
-            if date_from and date_to:
-                query = query.filter(
-                    created_at__gte=date_from,
-                    created_at__lte=date_to
-                )
-        elif time_range != 'all':
-            days = int(time_range)
-            date_threshold = timezone.now() - timezone.timedelta(days=days)
-            query = query.filter(created_at__gte=date_threshold)
+        filters = parse_dashboard_filters(request.GET)
+        error = validate_dashboard_filters(filters)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        # 校验之后才做条件判断：condition() 会给 400 和出错的响应也加上 ETag，
+        # 之后带着这个 ETag 的请求会得到 304 而不是错误
+        etag = quote_etag(dashboard_etag(request))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data, hit = dashboard_cache.get_dashboard(request.user, filters, build_dashboard)
+            response = JsonResponse(data)
+            response['X-Dashboard-Cache'] = 'hit' if hit else 'miss'
+        response['ETag'] = etag
+        return response
 
-        programs_data = []
-        total_completion = 0
-        program_count = 0
-
-        for program in query.distinct():
-            # 计算程序完成率
-            total_quizzes = Quiz.objects.filter(
-                lesson__topic__program=program
-            ).count()
-            
-            completed_quizzes = QuizResponse.objects.filter(
-                quiz__lesson__topic__program=program,
-                grading_status='GRADED'
-            ).count()
-            
-            completion_rate = (completed_quizzes / total_quizzes * 100) if total_quizzes > 0 else 0
-            total_completion += completion_rate
-            program_count += 1
-
-            # 计算每个主题和课程的完成率
-            topics_data = []
-            for topic in program.topics.all():
-                # 获取主题的测验数据
-                topic_total_quizzes = Quiz.objects.filter(
-                    lesson__topic=topic
-                ).count()
-                
-                topic_completed_quizzes = QuizResponse.objects.filter(
-                    quiz__lesson__topic=topic,
-                    grading_status='GRADED'
-                ).count()
-                
-                topic_completion_rate = (topic_completed_quizzes / topic_total_quizzes * 100) if topic_total_quizzes > 0 else 0
-                
-                # 获取每个课程的数据
-                lessons_data = []
-                for lesson in topic.lessons.all():
-                    lesson_total_quizzes = Quiz.objects.filter(
-                        lesson=lesson
-                    ).count()
-                    
-                    lesson_completed_quizzes = QuizResponse.objects.filter(
-                        quiz__lesson=lesson,
-                        grading_status='GRADED'
-                    ).count()
-                    
-                    lesson_completion_rate = (lesson_completed_quizzes / lesson_total_quizzes * 100) if lesson_total_quizzes > 0 else 0
-                    
-                    lessons_data.append({
-                        'title': lesson.title,
-                        'completion_rate': round(lesson_completion_rate, 1),
-                        'total_quizzes': lesson_total_quizzes,
-                        'completed_quizzes': lesson_completed_quizzes
-                    })
+    except Exception as e:
+        logger.exception('Error in update_dashboard')
+        return JsonResponse({'error': str(e)}, status=500)
 
-                topics_data.append({
-                    'title': topic.title,
-                    'completion_rate': round(topic_completion_rate, 1),
-                    'total_quizzes': topic_total_quizzes,
-                    'completed_quizzes': topic_completed_quizzes,
-                    'lessons': lessons_data  # 添加课程数据
-                })
-
-            # 计算平均测验分数
-            graded_responses = QuizResponse.objects.filter(
-                quiz__lesson__topic__program=program,
-                grading_status='GRADED'
-            )
-            
-            total_score = sum(response.points_earned or 0 for response in graded_responses)
-            total_possible = sum(response.quiz.points for response in graded_responses)
-            avg_quiz_score = (total_score / total_possible * 100) if total_possible > 0 else 0
+@login_required
+@cache_control(private=True, no_cache=True)
+async def update_dashboard_async(request):
+    """update_dashboard 的异步版本，互不依赖的统计查询并发执行，返回相同的 JSON"""
+    try:
+        user = await request.auser()
+        if not user.is_manager:
+            return JsonResponse({'error': 'Permission denied'}, status=403)
 
-            program_data = {
-                'id': program.id,
-                'title': program.title,
-                'enrolled_count': program.enrolled_users.count(),
-                'completion_rate': round(completion_rate, 1),
-                'avg_quiz_score': round(avg_quiz_score, 1),
-                'topics': topics_data
-            }
-            programs_data.append(program_data)
+        # condition() 在异步视图中同步调用 etag_func，这里先异步读取版本号再比较
+        version = await dashboard_cache.aget_version(user.pk)
+        etag = quote_etag(dashboard_etag(request, user=user, version=version))
+        filters = parse_dashboard_filters(request.GET)
+        error = validate_dashboard_filters(filters)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data, hit = await dashboard_cache.aget_dashboard(user, filters, build_dashboard_async)
+            response = JsonResponse(data)
+            response['X-Dashboard-Cache'] = 'hit' if hit else 'miss'
+        response['ETag'] = etag
+        return response
 
-        data = {
-            'active_programs_count': query.count(),
-            'total_enrollments': Enrollment.objects.filter(
-                program__in=query
-            ).count(),
-            'pending_grading_count': QuizResponse.objects.filter(
-                quiz__lesson__topic__program__in=query,
-                grading_status='PENDING'
-            ).count(),
-            'avg_completion_rate': round(total_completion / program_count, 1) if program_count > 0 else 0,
-            'programs': programs_data
-        }
+    except Exception as e:
+        logger.exception('Error in update_dashboard_async')
+        return JsonResponse({'error': str(e)}, status=500)
 
-        return JsonResponse(data)
+@login_required
+def dashboard_events(request):
+    """仪表板的 Server-Sent Events 流：报名、答卷、评分和课程完成的增量事件"""
+    if not request.user.is_manager:
+        raise PermissionDenied
+    if not events_enabled(request):
+        # 204 让 EventSource 停止重连，页面改为轮询
+        return HttpResponse(status=204)
+
+    # ASGI 下同步迭代器会被一次性读完，必须使用异步事件流
+    stream = aevent_stream if isinstance(request, ASGIRequest) else event_stream
+    response = StreamingHttpResponse(stream(request.user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # 禁止 nginx 等反向代理缓冲事件
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-    except Exception as e:
-        print(f"Error in update_dashboard: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+@login_required
+def export_data(request, dataset):
+    """
+    以 CSV 或 JSON Lines 流式导出进度/测验结果，筛选参数与 update_dashboard 相同。
+    POST 时改为排队执行（analytics.export），返回任务状态，完成后从 download_url 下载
+    """
+    if not request.user.is_manager:
+        raise PermissionDenied
+    if dataset not in DATASETS:
+        raise Http404
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    content_type, extension = FORMATS[fmt]
+
+    # 开始流式输出之后就不能再返回错误状态，先校验筛选条件
+    filters = parse_dashboard_filters(request.GET)
+    error = validate_dashboard_filters(filters)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    if request.method == 'POST':
+        job = enqueue(
+            'analytics.export',
+            created_by=request.user,
+            dataset=dataset,
+            manager_id=request.user.pk,
+            params={key: request.GET.getlist(key) for key in request.GET},
+            fmt=fmt,
+        )
+        return JsonResponse(serialize_job(job), status=202)
+
+    response = StreamingHttpResponse(
+        stream_export(dataset, request.user, filters, fmt),
+        content_type=content_type
+    )
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
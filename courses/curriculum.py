@@ -0,0 +1,257 @@
+"""
+课程结构缓存。
+
+每个项目的 program→topic→lesson→quiz→choice 结构以不可变的 namedtuple 树
+缓存，缓存键包含项目的版本号；Program/Topic/Lesson/Quiz/QuizChoice
+保存或删除时由 signals 在同一事务中更新版本号，旧的缓存自然失效。
+版本号保存在 CurriculumVersion 表中，是最后一次变化的毫秒时间戳，同时用作页面的
+Last-Modified。缓存本身可以是进程内的（locmem），每个进程按同一个版本号各自构建结构树。
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import CurriculumVersion, Program, Topic, Lesson, Quiz, QuizChoice
+
+CACHE_ALIAS = 'curriculum'
+
+
+class _Node:
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class ChoiceNode(_Node, namedtuple('ChoiceNode', 'id choice_text is_correct')):
+    __slots__ = ()
+
+
+class QuizNode(_Node, namedtuple('QuizNode', 'id lesson_id title question quiz_type points choices')):
+    __slots__ = ()
+
+    def get_quiz_type_display(self):
+        return dict(Quiz.QUIZ_TYPES).get(self.quiz_type, self.quiz_type)
+
+
+class LessonNode(_Node, namedtuple('LessonNode', 'id topic_id title order quizzes')):
+    __slots__ = ()
+
+
+class TopicNode(_Node, namedtuple('TopicNode', 'id title description order lessons')):
+    __slots__ = ()
+
+
+class LessonNavigation(namedtuple(
+        'LessonNavigation',
+        'lesson topic previous next position total topic_start topic_end')):
+    """
+    课程在项目中的位置。position 从 1 开始；
+    topic_start/topic_end 表示该课程是否为所在主题的第一课/最后一课。
+    """
+    __slots__ = ()
+
+
+class ProgramNode(_Node, namedtuple(
+        'ProgramNode', 'id title created_by_id version topics lessons navigation')):
+    """
+    lessons 为按 (topic.order, lesson.order) 展平的课程序列，
+    navigation 为 lesson_id → LessonNavigation 的索引，随结构树一起构建和失效。
+    """
+    __slots__ = ()
+
+    def iter_lessons(self):
+        return iter(self.lessons)
+
+    def get_lesson(self, lesson_id):
+        nav = self.navigation.get(lesson_id)
+        return nav.lesson if nav else None
+
+    def get_navigation(self, lesson_id):
+        return self.navigation.get(lesson_id)
+
+
+def build_navigation(topics):
+    """展平课程序列并预先计算每一课的上一课、下一课和主题边界"""
+    flat = [(topic, lesson) for topic in topics for lesson in topic.lessons]
+    lessons = tuple(lesson for _, lesson in flat)
+    total = len(flat)
+
+    navigation = {}
+    for index, (topic, lesson) in enumerate(flat):
+        navigation[lesson.id] = LessonNavigation(
+            lesson=lesson,
+            topic=topic,
+            previous=lessons[index - 1] if index > 0 else None,
+            next=lessons[index + 1] if index + 1 < total else None,
+            position=index + 1,
+            total=total,
+            topic_start=lesson is topic.lessons[0],
+            topic_end=lesson is topic.lessons[-1],
+        )
+    return lessons, navigation
+
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """当前进程的命中/未命中次数"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def _create_versions(program_ids):
+    """
+    为没有版本行的项目（如 bulk_create 创建的项目）建立版本行，返回 {program_id: version}，
+    不存在的项目不在结果中。项目数量不影响查询次数：一次读取项目、一次插入、一次读回
+    （并发插入时以先写入的版本号为准）
+    """
+    existing = list(Program.objects.filter(pk__in=program_ids).values_list('pk', flat=True))
+    if not existing:
+        return {}
+    version = _now()
+    CurriculumVersion.objects.bulk_create(
+        [CurriculumVersion(program_id=pk, version=version) for pk in existing],
+        ignore_conflicts=True
+    )
+    return dict(
+        CurriculumVersion.objects.filter(program_id__in=existing).values_list('program_id', 'version')
+    )
+
+
+def _create_version(program_id):
+    """没有版本行时建立，项目不存在时返回 None"""
+    return _create_versions([program_id]).get(program_id)
+
+
+def get_version(program_id):
+    """读取项目的结构版本号，项目不存在时返回 None"""
+    version = CurriculumVersion.objects.filter(program_id=program_id).values_list(
+        'version', flat=True
+    ).first()
+    if version is None:
+        version = _create_version(program_id)
+    return version
+
+
+def get_versions(program_ids):
+    """批量读取多个项目的版本号（一次查询），返回 {program_id: version}"""
+    versions = dict(
+        CurriculumVersion.objects.filter(program_id__in=program_ids).values_list('program_id', 'version')
+    )
+    missing = [pk for pk in program_ids if pk not in versions]
+    if missing:
+        created = _create_versions(missing)
+        for pk in missing:
+            versions[pk] = created.get(pk)
+    return versions
+
+
+def bump_version(program_id):
+    """项目结构发生变化时调用，新版本号为当前时间戳（至少比旧版本号大 1），只执行一条 UPDATE"""
+    if program_id is None:
+        return
+    version = _now()
+    updated = CurriculumVersion.objects.filter(program_id=program_id).update(
+        version=Greatest(F('version') + 1, Value(version))
+    )
+    if not updated:
+        _create_version(program_id)
+
+
+def version_modified(version):
+    """版本号对应的修改时间"""
+    return datetime.fromtimestamp(version / 1000, tz=timezone.utc)
+
+
+def build_tree(program_id, version=None):
+    """从数据库构建结构树（五次查询）"""
+    program = Program.objects.filter(pk=program_id).values('id', 'title', 'created_by_id').first()
+    if program is None:
+        return None
+
+    choices = {}
+    for choice in QuizChoice.objects.filter(
+            quiz__lesson__topic__program_id=program_id).order_by('id').values(
+            'id', 'quiz_id', 'choice_text', 'is_correct'):
+        quiz_id = choice.pop('quiz_id')
+        choices.setdefault(quiz_id, []).append(ChoiceNode(**choice))
+
+    quizzes = {}
+    for quiz in Quiz.objects.filter(
+            lesson__topic__program_id=program_id).order_by('id').values(
+            'id', 'lesson_id', 'title', 'question', 'quiz_type', 'points'):
+        quizzes.setdefault(quiz['lesson_id'], []).append(
+            QuizNode(choices=tuple(choices.get(quiz['id'], ())), **quiz)
+        )
+
+    lessons = {}
+    for lesson in Lesson.objects.filter(
+            topic__program_id=program_id).order_by('order', 'id').values(
+            'id', 'topic_id', 'title', 'order'):
+        lessons.setdefault(lesson['topic_id'], []).append(
+            LessonNode(quizzes=tuple(quizzes.get(lesson['id'], ())), **lesson)
+        )
+
+    topics = tuple(
+        TopicNode(lessons=tuple(lessons.get(topic['id'], ())), **topic)
+        for topic in Topic.objects.filter(program_id=program_id).order_by('order', 'id').values(
+            'id', 'title', 'description', 'order')
+    )
+    lessons, navigation = build_navigation(topics)
+    return ProgramNode(
+        version=version, topics=topics, lessons=lessons, navigation=navigation, **program
+    )
+
+
+def get_curriculum(program_id, version=None, refresh=False):
+    """
+    返回项目的结构树，项目不存在时返回 None。
+    缓存键为 (program_id, version)，版本变化后旧树不会再被读取；
+    调用方已经查到版本号时传入 version，省去一次查询。
+    refresh=True 时忽略缓存中的树，从数据库重新构建。
+    """
+    if version is None:
+        version = get_version(program_id)
+        if version is None:
+            return None
+    key = f'curriculum:tree:{program_id}:{version}'
+    cache = _cache()
+
+    tree = None if refresh else cache.get(key)
+    if tree is not None:
+        _count('hits')
+        return tree
+
+    _count('misses')
+    tree = build_tree(program_id, version)
+    if tree is not None:
+        cache.set(key, tree, timeout=getattr(settings, 'CURRICULUM_CACHE_TIMEOUT', None))
+    return tree
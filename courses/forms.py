@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.db.models import Q
+from accounts.models import Department
+from accounts.search import DEFAULT_LIMIT, search_users
 from .models import Program, Topic, Lesson, Quiz, QuizChoice, Enrollment, QuizResponse, QuizChoice
 
 User = get_user_model()
@@ -82,7 +84,6 @@ class QuizResponseForm(forms.ModelForm):
         if quiz:
             if quiz.quiz_type == 'MCQ':
                 choices = quiz.choices.all()
-                print(f"Debug: Found {choices.count()} choices for quiz {quiz.id}")
                 self.fields['selected_choice'].queryset = choices
                 self.fields['selected_choice'].required = True
                 self.fields['selected_choice'].label_from_instance = lambda obj: obj.choice_text
@@ -121,33 +122,29 @@ class EnrollmentManageForm(forms.Form):
     )
 
     users = forms.ModelMultipleChoiceField(
-        queryset=User.objects.filter(is_manager=False),
+        queryset=User.objects.filter(is_manager=False, is_active=True),
         widget=forms.CheckboxSelectMultiple,
         required=False
     )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Get unique departments
-        departments = User.objects.exclude(department='').values_list(
-            'department', flat=True).distinct()
+        # 部门表很小，成员数为缓存值，不需要扫描用户表
         self.fields['department'].choices = [('', 'All Departments')] + [
-            (dept, dept) for dept in departments
+            (department_id, f'{name} ({member_count})')
+            for department_id, name, member_count in Department.objects.values_list(
+                'id', 'name', 'member_count')
         ]
 
-    def filter_users(self, search_query='', department=''):
-        users = User.objects.filter(is_manager=False)
-        
-        if department:
-            users = users.filter(department=department)
-            
-        if search_query:
-            users = users.filter(
-                Q(username__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
-            
-        return users
+    @staticmethod
+    def filter_users(search_query='', department='', exclude_program=None, limit=DEFAULT_LIMIT):
+        """用户查找索引中最匹配的前 limit 个用户，可排除已报名 exclude_program 的用户"""
+        return search_users(
+            search_query,
+            department=department,
+            exclude_program=exclude_program,
+            limit=limit
+        )
 
 class CourseSearchForm(forms.Form):
     search = forms.CharField(
@@ -165,11 +162,11 @@ class CourseSearchForm(forms.Form):
     
     sort_by = forms.ChoiceField(
         choices=[
+            ('', 'Most Relevant'),
             ('newest', 'Newest First'),
             ('oldest', 'Oldest First'),
         ],
         required=False,
-        initial='newest',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
@@ -0,0 +1,228 @@
+"""
+选择题自动评分，以及管理员批量评分开放题。
+
+系统评分者是一个专用的停用账户，每个进程只查询一次并缓存其 id；
+评分逻辑只使用已加载的 quiz 和 choice 数据，不会触发额外查询。
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import Quiz, QuizChoice, QuizResponse
+from .signals import quiz_responses_changed
+
+GRADED_FIELDS = ['points_earned', 'grading_status', 'graded_at', 'graded_by', 'grading_comment']
+
+# 一次批量评分最多提交的答卷数
+MAX_BULK_GRADES = 500
+
+BulkGradeResult = namedtuple('BulkGradeResult', 'graded errors elapsed')
+
+_system_grader_id = None
+_system_grader_lock = threading.Lock()
+
+
+def get_system_grader_id():
+    """返回系统评分者的用户 id（不存在时创建）"""
+    global _system_grader_id
+    if _system_grader_id is None:
+        with _system_grader_lock:
+            if _system_grader_id is None:
+                User = get_user_model()
+                username = getattr(settings, 'SYSTEM_GRADER_USERNAME', 'system-grader')
+                grader, created = User.objects.get_or_create(
+                    username=username,
+                    defaults={'is_active': False}
+                )
+                if created:
+                    grader.set_unusable_password()
+                    grader.save(update_fields=['password'])
+                _system_grader_id = grader.pk
+    return _system_grader_id
+
+
+def reset_system_grader():
+    global _system_grader_id
+    _system_grader_id = None
+
+
+def autograde(response, quiz, choice, now=None):
+    """
+    用给定的 quiz 和 choice 为选择题答卷评分，只修改内存中的对象。
+    不是选择题或没有选择答案时返回 False。
+    """
+    if quiz.quiz_type != 'MCQ' or choice is None:
+        return False
+
+    response.points_earned = quiz.points if choice.is_correct else 0
+    response.grading_status = 'GRADED'
+    response.graded_at = now or timezone.now()
+    # 设置系统为评分者
+    if not response.graded_by_id:
+        response.graded_by_id = get_system_grader_id()
+    # 添加自动评分反馈
+    response.grading_comment = '自动评分: ' + ('回答正确！' if choice.is_correct else '回答错误。')
+    return True
+
+
+def bulk_autograde(responses, batch_size=1000):
+    """
+    批量评分选择题答卷：一次性加载涉及的 quiz 和 choice，
+    新答卷用 bulk_create 插入，已有答卷用 bulk_update 更新。
+    返回评分的答卷数量。
+    """
+    responses = list(responses)
+    quizzes = Quiz.objects.in_bulk({response.quiz_id for response in responses})
+    choices = QuizChoice.objects.in_bulk({
+        response.selected_choice_id for response in responses if response.selected_choice_id
+    })
+
+    now = timezone.now()
+    graded = [
+        response for response in responses
+        if autograde(
+            response,
+            quizzes[response.quiz_id],
+            choices.get(response.selected_choice_id),
+            now=now
+        )
+    ]
+    new = [response for response in responses if response.pk is None]
+    existing = [response for response in graded if response.pk is not None]
+
+    with transaction.atomic():
+        QuizResponse.objects.bulk_create(new, batch_size=batch_size)
+        QuizResponse.objects.bulk_update(existing, GRADED_FIELDS, batch_size=batch_size)
+        if responses:
+            quiz_responses_changed.send(
+                sender=QuizResponse,
+                responses=responses,
+                previous={response.pk: None for response in new},
+            )
+
+    return len(graded)
+
+
+def pending_open_responses(manager):
+    """管理员所有项目中待评分的开放题答卷"""
+    return QuizResponse.objects.filter(
+        quiz__lesson__topic__program__created_by=manager,
+        quiz__quiz_type='OPEN',
+        grading_status='PENDING',
+    )
+
+
+def _clean_grade(grade, quiz):
+    """返回 (points, comment) 或错误信息"""
+    try:
+        points = int(grade.get('points'))
+    except (TypeError, ValueError):
+        return 'Points must be a whole number.'
+    if not 0 <= points <= quiz.points:
+        return f'Points must be between 0 and {quiz.points}.'
+    comment = grade.get('comment') or ''
+    if not isinstance(comment, str):
+        return 'Comment must be text.'
+    return points, comment.strip() or None
+
+
+def bulk_grade(grader, grades, now=None, batch_size=1000):
+    """
+    批量评分开放题答卷。grades 为 {'id', 'points', 'comment'} 的列表。
+
+    先校验全部评分：答卷必须属于 grader 创建的项目、为开放题且仍在等待评分
+    （已评分的答卷不会被覆盖），分数在 0 到满分之间。
+    有任何错误时不写入，返回 errors（{答卷 id: 错误信息}）；
+    否则在一个事务中用一次 bulk_update 写入并发送 quiz_responses_changed。
+    """
+    start = time.perf_counter()
+    now = now or timezone.now()
+    errors = {}
+
+    by_id = {}
+    for grade in grades:
+        try:
+            by_id[int(grade.get('id'))] = grade
+        except (TypeError, ValueError):
+            errors[str(grade.get('id'))] = 'Invalid response id.'
+    if len(by_id) > MAX_BULK_GRADES:
+        errors['__all__'] = f'At most {MAX_BULK_GRADES} responses can be graded at once.'
+    if errors or not by_id:
+        return BulkGradeResult(0, errors, time.perf_counter() - start)
+
+    with transaction.atomic():
+        responses = (
+            QuizResponse.objects
+            .filter(pk__in=by_id, quiz__lesson__topic__program__created_by=grader)
+            .select_related('quiz')
+            .select_for_update(of=('self',))
+            .in_bulk()
+        )
+        previous = {}
+        for response_id, grade in by_id.items():
+            response = responses.get(response_id)
+            if response is None:
+                errors[response_id] = 'Response not found.'
+                continue
+            previous[response_id] = {
+                'grading_status': response.grading_status,
+                'points_earned': response.points_earned,
+                'graded_at': response.graded_at,
+            }
+            if response.quiz.quiz_type != 'OPEN':
+                errors[response_id] = 'Multiple-choice responses are graded automatically.'
+                continue
+            if response.grading_status != 'PENDING':
+                errors[response_id] = 'Response has already been graded.'
+                continue
+            cleaned = _clean_grade(grade, response.quiz)
+            if isinstance(cleaned, str):
+                errors[response_id] = cleaned
+                continue
+            response.points_earned, response.grading_comment = cleaned
+            response.grading_status = 'GRADED'
+            response.graded_at = now
+            response.graded_by = grader
+
+        if errors:
+            return BulkGradeResult(0, errors, time.perf_counter() - start)
+
+        graded = list(responses.values())
+        QuizResponse.objects.bulk_update(graded, GRADED_FIELDS, batch_size=batch_size)
+        quiz_responses_changed.send(sender=QuizResponse, responses=graded, previous=previous)
+
+    return BulkGradeResult(len(graded), {}, time.perf_counter() - start)
+
+
+def grading_stats(grader, now=None):
+    """
+    评分进度：剩余待评分数量、今天和最近一小时评分的数量，
+    以及今天从第一份到最后一份评分的平均速度（份/小时）。
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    graded_today = QuizResponse.objects.filter(
+        graded_by=grader, graded_at__gte=today
+    ).aggregate(
+        count=Count('id'),
+        last_hour=Count('id', filter=Q(graded_at__gte=now - timedelta(hours=1))),
+        first=Min('graded_at'),
+        last=Max('graded_at'),
+    )
+    hours = (
+        (graded_today['last'] - graded_today['first']).total_seconds() / 3600
+        if graded_today['count'] > 1 else 0
+    )
+    return {
+        'pending': pending_open_responses(grader).count(),
+        'graded_today': graded_today['count'],
+        'graded_last_hour': graded_today['last_hour'],
+        'per_hour_today': round(graded_today['count'] / hours, 1) if hours else None,
+    }
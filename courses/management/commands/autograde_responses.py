@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from courses.grading import bulk_autograde
+from courses.models import QuizResponse
+
+
+class Command(BaseCommand):
+    help = 'Auto-grade pending MCQ responses (e.g. rows imported without going through save())'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--program', type=int, action='append', dest='programs',
+            help='Only grade responses in the given program id (can be repeated)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        responses = QuizResponse.objects.filter(
+            grading_status='PENDING',
+            quiz__quiz_type='MCQ',
+            selected_choice__isnull=False,
+        ).order_by('id')
+        if options['programs']:
+            responses = responses.filter(quiz__lesson__topic__program_id__in=options['programs'])
+
+        graded = 0
+        last_id = 0
+        while True:
+            batch = list(
+                responses.filter(id__gt=last_id).only(
+                    'id', 'quiz_id', 'user_id', 'selected_choice_id', 'graded_by_id'
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            graded += bulk_autograde(batch, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Graded {graded} responses.'))
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Department
+from courses.models import Program
+from courses.services import (
+    DEFAULT_BATCH_SIZE, bulk_enroll, bulk_unenroll, csv_user_ids, department_user_ids
+)
+from jobs.queue import enqueue
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Enroll (or unenroll) users in a program in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('program_id', type=int)
+        parser.add_argument('--user', action='append', default=[], dest='users',
+                            help='User id (can be repeated)')
+        parser.add_argument('--department', help='Enroll every user of this department (name or id)')
+        parser.add_argument('--csv', dest='csv_path',
+                            help='CSV file with an id, username or email column')
+        parser.add_argument('--enrolled-by', help='Username recorded as enrolled_by')
+        parser.add_argument('--unenroll', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the enrollment for run_jobs instead of running it now')
+
+    def handle(self, *args, **options):
+        try:
+            program = Program.objects.get(pk=options['program_id'])
+        except Program.DoesNotExist:
+            raise CommandError(f"Program {options['program_id']} does not exist")
+
+        user_ids = [int(user_id) for user_id in options['users']]
+        if options['department']:
+            department = options['department']
+            lookup = {'pk': department} if department.isdigit() else {'name': department}
+            try:
+                department = Department.objects.get(**lookup)
+            except Department.DoesNotExist:
+                raise CommandError(f"Department '{options['department']}' does not exist")
+            user_ids += department_user_ids(department)
+        if options['csv_path']:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as csv_file:
+                found, missing = csv_user_ids(csv_file, batch_size=options['batch_size'])
+            user_ids += found
+            for value in missing:
+                self.stderr.write(f'No user matches {value!r}')
+        if not user_ids:
+            raise CommandError('No users selected')
+
+        enrolled_by = None
+        if options['enrolled_by']:
+            enrolled_by = User.objects.filter(username=options['enrolled_by']).first()
+
+        if options['background']:
+            job = enqueue(
+                'courses.bulk_enroll',
+                program_id=program.pk,
+                user_ids=list(dict.fromkeys(user_ids)),
+                enrolled_by_id=enrolled_by.pk if enrolled_by else None,
+                unenroll=options['unenroll'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Job #{job.pk} for {len(user_ids)} users {job.status}.'))
+            return
+
+        if options['unenroll']:
+            result = bulk_unenroll(program, user_ids, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Unenrolled {result.removed} users ({result.skipped} were not enrolled).'
+            ))
+            return
+
+        result = bulk_enroll(
+            program, user_ids, enrolled_by=enrolled_by, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Enrolled {result.created} users '
+            f'({result.skipped} already enrolled or not active learners).'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog search documents (and the full-text index built on them)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--program', type=int, action='append', dest='programs',
+            help='Only rebuild the given program id (can be repeated)'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = search.rebuild(options['programs'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} search documents ({search.get_backend()} backend).'
+        ))
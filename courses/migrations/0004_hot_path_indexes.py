@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_remove_quiz_created_by_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['user', 'completed_at'], name='lessonprog_user_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['lesson'], name='lessonprog_lesson_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresponse',
+            index=models.Index(fields=['user', 'grading_status'], name='quizresp_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresponse',
+            index=models.Index(fields=['user', '-submitted_at'], name='quizresp_user_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresponse',
+            index=models.Index(condition=models.Q(('grading_status', 'PENDING')), fields=['quiz', 'submitted_at'], name='quizresp_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models, transaction
+from django.utils.html import strip_tags
+
+TABLE = 'courses_programsearchdocument'
+FTS_TABLE = 'courses_programsearchdocument_fts'
+
+BATCH_SIZE = 500
+
+POSTGRES_INDEX = [
+    f"""ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED""",
+    f'CREATE INDEX {TABLE}_search_idx ON {TABLE} USING gin (search_vector)',
+]
+
+# 外部内容 FTS5 表，文档表的写入由触发器同步
+SQLITE_INDEX = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body, content='{TABLE}', content_rowid='program_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.program_id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.program_id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.program_id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.program_id, new.title, new.body);
+    END""",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    """
+    按数据库创建全文索引；其他数据库（或未编译 FTS5 的 SQLite）
+    由 courses.search 使用进程内的倒排索引。
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_INDEX
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_INDEX
+    else:
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            for statement in statements:
+                schema_editor.execute(statement)
+    except OperationalError:
+        pass
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    # Postgres 的生成列和索引随文档表一起删除
+
+
+def build_documents(apps, schema_editor):
+    """
+    为已有的项目生成搜索文档（与 courses.search.build_documents 的规则相同，使用历史模型），
+    全文索引由触发器 / 生成列随文档表写入。按项目主键分批处理。
+    """
+    Program = apps.get_model('courses', 'Program')
+    Topic = apps.get_model('courses', 'Topic')
+    Lesson = apps.get_model('courses', 'Lesson')
+    ProgramSearchDocument = apps.get_model('courses', 'ProgramSearchDocument')
+
+    last_id = 0
+    while True:
+        programs = list(Program.objects.filter(pk__gt=last_id).order_by('pk').values_list(
+            'id', 'title', 'description', 'created_by__username'
+        )[:BATCH_SIZE])
+        if not programs:
+            return
+        last_id = programs[-1][0]
+        parts = {
+            program_id: [description or '', username or '']
+            for program_id, _, description, username in programs
+        }
+        for program_id, title, description in Topic.objects.filter(
+                program_id__in=parts).order_by('order', 'id').values_list(
+                'program_id', 'title', 'description'):
+            parts[program_id].extend([title, description or ''])
+        for program_id, title, content in Lesson.objects.filter(
+                topic__program_id__in=parts).order_by('topic__order', 'order', 'id').values_list(
+                'topic__program_id', 'title', 'content'):
+            parts[program_id].extend([title, strip_tags(content or '')])
+
+        ProgramSearchDocument.objects.bulk_create([
+            ProgramSearchDocument(
+                program_id=program_id, title=title,
+                body='\n'.join(part for part in parts[program_id] if part)
+            )
+            for program_id, title, _, _ in programs
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramSearchDocument',
+            fields=[
+                ('program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='courses.program')),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
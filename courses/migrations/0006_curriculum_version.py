@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    # 初始版本号取项目的最后修改时间，旧进程缓存中的版本号不会再被使用
+    Program = apps.get_model('courses', 'Program')
+    CurriculumVersion = apps.get_model('courses', 'CurriculumVersion')
+    CurriculumVersion.objects.bulk_create(
+        CurriculumVersion(program_id=pk, version=int(updated_at.timestamp() * 1000))
+        for pk, updated_at in Program.objects.values_list('pk', 'updated_at')
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_programsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumVersion',
+            fields=[
+                ('program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='curriculum_version', serialize=False, to='courses.program')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
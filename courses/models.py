@@ -22,35 +22,33 @@ class Program(models.Model):
     )
     
     def get_completion_rate(self, user=None):
-        """获取项目完成率"""
-        lessons = Lesson.objects.filter(topic__program=self)
-        total_lessons = lessons.count()
-        if total_lessons == 0:
-            return 0
-        
+        """获取项目完成率（读取 progress 汇总表）"""
+        from progress.models import ProgramProgress
+
         if user:
+            rollup = ProgramProgress.objects.filter(user=user, program=self).first()
+            if rollup:
+                return rollup.progress_percentage
+
+            # 未报名的用户没有汇总行，直接统计
+            total_lessons = Lesson.objects.filter(topic__program=self).count()
+            if total_lessons == 0:
+                return 0
             completed = LessonProgress.objects.filter(
                 user=user,
                 lesson__topic__program=self,
                 completed=True
             ).count()
             return (completed / total_lessons) * 100
-        
+
         # 所有用户的平均完成率
-        enrollments = self.enrolled_users.all()
-        if not enrollments:
+        totals = ProgramProgress.objects.filter(program=self).aggregate(
+            completed=models.Sum('lessons_completed'),
+            total=models.Sum('lessons_total')
+        )
+        if not totals['total']:
             return 0
-        
-        total_rate = 0
-        for user in enrollments:
-            completed = LessonProgress.objects.filter(
-                user=user,
-                lesson__topic__program=self,
-                completed=True
-            ).count()
-            total_rate += (completed / total_lessons) * 100
-        
-        return total_rate / enrollments.count()
+        return totals['completed'] / totals['total'] * 100
 
     def get_average_quiz_score(self, user=None):
         """获取项目的平均测验分数"""
@@ -85,8 +83,7 @@ class Topic(models.Model):
     
     def get_completion_rate(self, user=None):
         """获取主题完成率"""
-        lessons = self.lessons.all()
-        total_lessons = lessons.count()
+        total_lessons = self.lessons.count()
         if total_lessons == 0:
             return 0
             
@@ -98,21 +95,18 @@ class Topic(models.Model):
             ).count()
             return (completed / total_lessons) * 100
             
-        # 所有用户的平均完成率
-        enrollments = self.program.enrolled_users.all()
-        if not enrollments:
+        # 所有用户的平均完成率：一次统计所有已报名用户的完成数
+        enrollments = Enrollment.objects.filter(program_id=self.program_id)
+        enrolled_count = enrollments.count()
+        if not enrolled_count:
             return 0
             
-        total_rate = 0
-        for user in enrollments:
-            completed = LessonProgress.objects.filter(
-                user=user,
-                lesson__topic=self,
-                completed=True
-            ).count()
-            total_rate += (completed / total_lessons) * 100
-            
-        return total_rate / enrollments.count()
+        completed = LessonProgress.objects.filter(
+            lesson__topic=self,
+            completed=True,
+            user__in=enrollments.values('user')
+        ).count()
+        return completed / (total_lessons * enrolled_count) * 100
 
     def __str__(self):
         return self.title
@@ -230,20 +224,10 @@ class QuizResponse(models.Model):
     )
 
     def save(self, *args, **kwargs):
-        # 如果是多选题，自动评分
-        if self.quiz.quiz_type == 'MCQ' and self.selected_choice:
-            self.points_earned = self.quiz.points if self.selected_choice.is_correct else 0
-            self.grading_status = 'GRADED'
-            self.graded_at = timezone.now()
-            # 设置系统为评分者
-            if not self.graded_by:
-                # 获取第一个超级用户作为系统评分者
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                system_grader = User.objects.filter(is_superuser=True).first()
-                self.graded_by = system_grader
-            # 添加自动评分反馈
-            self.grading_comment = '自动评分: ' + ('回答正确！' if self.selected_choice.is_correct else '回答错误。')
+        # 如果是多选题，自动评分（只使用已加载的 quiz 和 choice）
+        if self.selected_choice_id:
+            from .grading import autograde
+            autograde(self, self.quiz, self.selected_choice)
         
         super().save(*args, **kwargs)
 
@@ -252,6 +236,18 @@ class QuizResponse(models.Model):
 
     class Meta:
         unique_together = ['quiz', 'user']
+        indexes = [
+            # 用户自己的答卷按评分状态统计
+            models.Index(fields=['user', 'grading_status'], name='quizresp_user_status_idx'),
+            # 最近提交的答卷
+            models.Index(fields=['user', '-submitted_at'], name='quizresp_user_submitted_idx'),
+            # 待评分答卷只占一小部分，部分索引只包含这些行
+            models.Index(
+                fields=['quiz', 'submitted_at'],
+                name='quizresp_pending_idx',
+                condition=models.Q(grading_status='PENDING')
+            ),
+        ]
 
 class LessonProgress(models.Model):
     user = models.ForeignKey(
@@ -268,4 +264,52 @@ class LessonProgress(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ['user', 'lesson']
\ No newline at end of file
+        unique_together = ['user', 'lesson']
+        indexes = [
+            # 只索引已完成的记录：用户完成数统计和按 completed_at 的时间趋势
+            models.Index(
+                fields=['user', 'completed_at'],
+                name='lessonprog_user_done_idx',
+                condition=models.Q(completed=True)
+            ),
+            # 每个课程的完成人数
+            models.Index(
+                fields=['lesson'],
+                name='lessonprog_lesson_done_idx',
+                condition=models.Q(completed=True)
+            ),
+        ]
+
+class ProgramSearchDocument(models.Model):
+    """
+    课程目录搜索用的文档：每个项目一行，由 courses.search 维护。
+    全文索引（Postgres 的 tsvector 生成列 / SQLite 的 FTS5 表）建立在这张表上，
+    见迁移 0005_programsearchdocument。
+    """
+    program = models.OneToOneField(
+        Program,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    title = models.CharField(max_length=200)
+    # 描述、创建者、主题和课程的文本
+    body = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+class CurriculumVersion(models.Model):
+    """
+    项目结构的版本号（courses.curriculum），项目、主题、课程、测验或选项变化时
+    在同一事务中更新为当前的毫秒时间戳。结构树和模板片段的缓存键包含版本号，
+    版本号保存在数据库中，所有进程（Web 进程和 run_jobs）读到的都是同一个值。
+    """
+    program = models.OneToOneField(
+        Program,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='curriculum_version'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.program_id}: {self.version}"
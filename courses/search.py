@@ -0,0 +1,288 @@
+"""
+课程目录全文搜索。
+
+每个项目的标题、描述、创建者、主题和课程文本汇总成一行 ProgramSearchDocument，
+由 signals 在事务提交后更新。查询按数据库选择后端：
+
+- postgresql：文档表上的 tsvector 生成列 + GIN 索引，ts_rank 排序
+- sqlite：以文档表为外部内容的 FTS5 表（触发器同步），bm25 排序
+- python：数据库没有全文索引时，在进程内根据文档表构建倒排索引，TF-IDF 排序
+
+CATALOG_SEARCH_BACKEND 可以强制指定后端（'auto' 为自动选择）。
+
+中日韩文字之间没有空格，按 \w+ 分词后整句是一个词，无法按其中的词语检索；
+查询中含有这些文字时改为在文档表上做子串匹配（扫描文档表，每个项目一行）。
+调用方的筛选条件（programs 查询集）在排序和截取 limit 之前生效。
+"""
+import bisect
+import math
+import operator
+import re
+import threading
+from collections import defaultdict
+from functools import partial, reduce
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, Max, Q, Value, When
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Lesson, Program, ProgramSearchDocument, Topic
+
+FTS_TABLE = 'courses_programsearchdocument_fts'
+
+# 返回的结果数上限
+RESULT_LIMIT = 200
+
+# Python 后端中标题的权重
+TITLE_WEIGHT = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# 平假名/片假名、中日韩统一表意文字（含扩展 A 和兼容字符）、韩文音节
+CJK_RE = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+# 文档维护
+def build_documents(program_ids):
+    """三次查询取出项目及其主题、课程的文本，返回 {program_id: (title, body)}"""
+    programs = list(Program.objects.filter(pk__in=program_ids).values_list(
+        'id', 'title', 'description', 'created_by__username'
+    ))
+    parts = {
+        program_id: [description or '', username or '']
+        for program_id, _, description, username in programs
+    }
+    titles = {program_id: title for program_id, title, _, _ in programs}
+
+    for program_id, title, description in Topic.objects.filter(
+            program_id__in=parts).order_by('order', 'id').values_list(
+            'program_id', 'title', 'description'):
+        parts[program_id].extend([title, description or ''])
+    for program_id, title, content in Lesson.objects.filter(
+            topic__program_id__in=parts).order_by('topic__order', 'order', 'id').values_list(
+            'topic__program_id', 'title', 'content'):
+        parts[program_id].extend([title, strip_tags(content or '')])
+
+    return {
+        program_id: (titles[program_id], '\n'.join(part for part in body if part))
+        for program_id, body in parts.items()
+    }
+
+
+def index_programs(program_ids):
+    """重建给定项目的搜索文档；已删除的项目删除其文档"""
+    program_ids = {program_id for program_id in program_ids if program_id is not None}
+    if not program_ids:
+        return 0
+    documents = build_documents(program_ids)
+    now = timezone.now()
+    ProgramSearchDocument.objects.bulk_create(
+        [
+            ProgramSearchDocument(program_id=program_id, title=title, body=body, updated_at=now)
+            for program_id, (title, body) in documents.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['program'],
+        update_fields=['title', 'body', 'updated_at'],
+    )
+    ProgramSearchDocument.objects.filter(
+        program_id__in=program_ids - documents.keys()
+    ).delete()
+    return len(documents)
+
+
+def schedule_index(program_id):
+    """事务提交后更新项目的搜索文档"""
+    if program_id is not None:
+        transaction.on_commit(partial(index_programs, [program_id]))
+
+
+def rebuild(program_ids=None, batch_size=500):
+    """重建搜索文档，program_ids 为空时重建全部。返回更新的文档数"""
+    if program_ids is None:
+        ProgramSearchDocument.objects.exclude(
+            program_id__in=Program.objects.values('id')
+        ).delete()
+        program_ids = Program.objects.order_by('id').values_list('id', flat=True)
+    program_ids = list(program_ids)
+    count = 0
+    for start in range(0, len(program_ids), batch_size):
+        with transaction.atomic():
+            count += index_programs(program_ids[start:start + batch_size])
+    return count
+
+
+# 查询
+_sqlite_fts = None
+
+
+def _has_sqlite_fts():
+    """FTS5 表由迁移创建，SQLite 未编译 FTS5 时不存在"""
+    global _sqlite_fts
+    if _sqlite_fts is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            _sqlite_fts = cursor.fetchone() is not None
+    return _sqlite_fts
+
+
+def get_backend():
+    backend = getattr(settings, 'CATALOG_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _has_sqlite_fts():
+        return 'sqlite'
+    return 'python'
+
+
+def _restrict(column, programs):
+    """programs 查询集转换为 column IN (子查询) 条件，返回 (sql, params)"""
+    if programs is None:
+        return '', []
+    sql, params = programs.values('pk').query.sql_with_params()
+    return f' AND {column} IN ({sql})', list(params)
+
+
+def _search_postgresql(tokens, limit, programs=None):
+    # 每个词按前缀匹配，词之间为 AND；tokens 只含 \w 字符，可以直接拼成 tsquery
+    query = ' & '.join(f'{token}:*' for token in tokens)
+    restriction, params = _restrict('program_id', programs)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT program_id FROM {ProgramSearchDocument._meta.db_table} '
+            f"WHERE search_vector @@ to_tsquery('simple', %s){restriction} "
+            "ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, program_id "
+            'LIMIT %s',
+            [query, *params, query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_sqlite(tokens, limit, programs=None):
+    query = ' AND '.join(f'"{token}"*' for token in tokens)
+    restriction, params = _restrict('rowid', programs)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s{restriction} '
+            f'ORDER BY bm25({FTS_TABLE}, {float(TITLE_WEIGHT)}, 1.0), rowid LIMIT %s',
+            [query, *params, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_substring(tokens, limit, programs=None):
+    """子串匹配（中日韩文字）：所有词都必须出现，标题中出现的词多的排在前面"""
+    documents = ProgramSearchDocument.objects.all()
+    if programs is not None:
+        documents = documents.filter(program__in=programs.values('pk'))
+    for token in tokens:
+        documents = documents.filter(Q(title__icontains=token) | Q(body__icontains=token))
+    title_hits = reduce(operator.add, (
+        Case(When(title__icontains=token, then=Value(1)), default=Value(0)) for token in tokens
+    ))
+    return list(
+        documents.annotate(title_hits=title_hits).order_by('-title_hits', 'program_id')
+        .values_list('program_id', flat=True)[:limit]
+    )
+
+
+class InvertedIndex:
+    """进程内的倒排索引：term → {program_id: 加权词频}"""
+
+    def __init__(self, documents):
+        self.postings = defaultdict(lambda: defaultdict(int))
+        for program_id, title, body in documents:
+            for token in tokenize(title):
+                self.postings[token][program_id] += TITLE_WEIGHT
+            for token in tokenize(body):
+                self.postings[token][program_id] += 1
+        self.terms = sorted(self.postings)
+        self.size = len(documents)
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self.terms, prefix)
+        for term in self.terms[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, tokens, limit, candidates=None):
+        scores = None
+        for token in tokens:
+            token_scores = defaultdict(float)
+            for term in self._prefix_terms(token):
+                postings = self.postings[term]
+                idf = math.log(1 + self.size / len(postings))
+                for program_id, frequency in postings.items():
+                    token_scores[program_id] += frequency * idf
+            if scores is None:
+                scores = token_scores
+            else:
+                # 所有词都必须出现
+                scores = {
+                    program_id: score + token_scores[program_id]
+                    for program_id, score in scores.items() if program_id in token_scores
+                }
+            if not scores:
+                return []
+        if candidates is not None:
+            scores = {
+                program_id: score for program_id, score in scores.items() if program_id in candidates
+            }
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [program_id for program_id, _ in ranked[:limit]]
+
+
+_python_index = None
+_python_index_signature = None
+_python_index_lock = threading.Lock()
+
+
+def _get_python_index():
+    """文档数或最后更新时间变化时重建（每次查询只多一条聚合查询）"""
+    global _python_index, _python_index_signature
+    signature = tuple(ProgramSearchDocument.objects.aggregate(
+        count=Count('program_id'), updated=Max('updated_at')
+    ).values())
+    with _python_index_lock:
+        if _python_index is None or signature != _python_index_signature:
+            _python_index = InvertedIndex(
+                ProgramSearchDocument.objects.values_list('program_id', 'title', 'body')
+            )
+            _python_index_signature = signature
+        return _python_index
+
+
+def _search_python(tokens, limit, programs=None):
+    candidates = set(programs.values_list('pk', flat=True)) if programs is not None else None
+    return _get_python_index().search(tokens, limit, candidates)
+
+
+BACKENDS = {
+    'postgresql': _search_postgresql,
+    'sqlite': _search_sqlite,
+    'python': _search_python,
+}
+
+
+def search_programs(text, limit=RESULT_LIMIT, programs=None):
+    """
+    按相关度排序的项目 id 列表。programs 为 Program 查询集时只在其中搜索，
+    筛选条件在截取前 limit 个之前生效
+    """
+    tokens = list(dict.fromkeys(tokenize(text)))
+    if not tokens:
+        return []
+    if any(CJK_RE.search(token) for token in tokens):
+        return _search_substring(tokens, limit, programs)
+    return BACKENDS[get_backend()](tokens, limit, programs)
@@ -0,0 +1,164 @@
+import csv
+import io
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Enrollment, LessonProgress
+from .signals import enrollments_changed, mark_bulk_delete
+
+User = get_user_model()
+
+BulkResult = namedtuple('BulkResult', 'created skipped')
+UnenrollResult = namedtuple('UnenrollResult', 'removed skipped')
+
+DEFAULT_BATCH_SIZE = 500
+
+# 报名和课程完成情况只存放在 courses.Enrollment / courses.LessonProgress，
+# 所有写入都经过下面的函数；进度汇总由 progress.signals 跟随更新。
+
+
+def _batches(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def enroll(user, program, enrolled_by=None):
+    """报名单个用户，返回 (enrollment, created)"""
+    return Enrollment.objects.get_or_create(
+        user=user,
+        program=program,
+        defaults={'enrolled_by': enrolled_by}
+    )
+
+
+def unenroll(user, program):
+    """取消报名，返回是否删除了记录"""
+    deleted, _ = Enrollment.objects.filter(user=user, program=program).delete()
+    return deleted > 0
+
+
+def complete_lesson(user, lesson, completed_at=None):
+    """
+    标记课程完成，已完成时不再写入。
+    返回 (progress, changed)。
+    """
+    completed_at = completed_at or timezone.now()
+    progress, created = LessonProgress.objects.get_or_create(
+        user=user,
+        lesson=lesson,
+        defaults={'completed': True, 'completed_at': completed_at}
+    )
+    if created:
+        return progress, True
+    if progress.completed:
+        return progress, False
+    progress.completed = True
+    progress.completed_at = completed_at
+    progress.save(update_fields=['completed', 'completed_at'])
+    return progress, True
+
+
+def department_user_ids(department):
+    """部门（Department 或其 id）内所有启用的普通用户的 id，走 users.department_id 索引"""
+    return list(
+        User.objects.filter(is_manager=False, is_active=True, department=department)
+        .values_list('id', flat=True)
+    )
+
+
+def csv_user_ids(csv_file, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    从 CSV 读取用户。有表头时读取 id / username / email 列，
+    否则把第一列当作用户名或邮箱。返回 (user_ids, 未匹配的值)。
+    """
+    if isinstance(csv_file, bytes):
+        csv_file = io.StringIO(csv_file.decode('utf-8-sig'))
+    rows = [row for row in csv.reader(csv_file) if row and row[0].strip()]
+    if not rows:
+        return [], []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((name for name in ('id', 'username', 'email') if name in header), None)
+    if column:
+        index = header.index(column)
+        values = [row[index].strip() for row in rows[1:] if len(row) > index]
+    else:
+        values = [row[0].strip() for row in rows]
+
+    found = {}
+    for chunk in _batches(dict.fromkeys(values), batch_size):
+        if column == 'id':
+            lookup = Q(id__in=[value for value in chunk if value.isdigit()])
+        else:
+            lookup = Q(username__in=chunk) | Q(email__in=chunk)
+        for user_id, username, email in User.objects.filter(
+                lookup, is_manager=False, is_active=True).values_list('id', 'username', 'email'):
+            found[str(user_id)] = found[username] = user_id
+            if email:
+                found[email] = user_id
+
+    user_ids = list(dict.fromkeys(found[value] for value in values if value in found))
+    missing = [value for value in values if value not in found]
+    return user_ids, missing
+
+
+def bulk_enroll(program, user_ids, enrolled_by=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    批量报名：每批先查出可以报名的用户（启用的普通用户）和已报名的用户，
+    再用一次 bulk_create 插入其余用户。不存在、已停用或管理员的 id 与已报名的一起计入 skipped。
+    所有批次在同一个事务中完成。
+    """
+    user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    created_ids = []
+
+    with transaction.atomic():
+        for batch in _batches(user_ids, batch_size):
+            eligible = set(
+                User.objects.filter(pk__in=batch, is_manager=False, is_active=True)
+                .values_list('id', flat=True)
+            )
+            existing = set(
+                Enrollment.objects.filter(program=program, user_id__in=batch)
+                .values_list('user_id', flat=True)
+            )
+            new_ids = [user_id for user_id in batch if user_id in eligible and user_id not in existing]
+            Enrollment.objects.bulk_create(
+                [
+                    Enrollment(program=program, user_id=user_id, enrolled_by=enrolled_by)
+                    for user_id in new_ids
+                ],
+                ignore_conflicts=True
+            )
+            created_ids.extend(new_ids)
+
+        if created_ids:
+            enrollments_changed.send(
+                sender=Enrollment, program=program, user_ids=created_ids, action='enroll'
+            )
+
+    return BulkResult(created=len(created_ids), skipped=len(user_ids) - len(created_ids))
+
+
+def bulk_unenroll(program, user_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """批量取消报名，返回 (删除数, 未报名而跳过的数量)"""
+    user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    removed_ids = []
+
+    with transaction.atomic():
+        for batch in _batches(user_ids, batch_size):
+            enrollments = Enrollment.objects.filter(program=program, user_id__in=batch)
+            removed_ids.extend(enrollments.values_list('user_id', flat=True))
+            # 逐行的 post_delete 仍会发送，由 enrollments_changed 统一处理汇总
+            mark_bulk_delete(enrollments).delete()
+
+        if removed_ids:
+            enrollments_changed.send(
+                sender=Enrollment, program=program, user_ids=removed_ids, action='unenroll'
+            )
+
+    return UnenrollResult(removed=len(removed_ids), skipped=len(user_ids) - len(removed_ids))
@@ -0,0 +1,84 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import curriculum, search
+from .models import Program, Topic, Lesson, Quiz, QuizChoice
+
+CURRICULUM_MODELS = (Program, Topic, Lesson, Quiz, QuizChoice)
+
+# 批量报名/取消报名不会逐行触发 post_save（取消报名的 post_delete 见 mark_bulk_delete），
+# 完成后发送此信号：program, user_ids, action ('enroll' 或 'unenroll')
+enrollments_changed = Signal()
+
+# 批量评分（grading.bulk_autograde / bulk_grade）完成后发送：responses, previous
+# previous 为 {答卷 id: 写入前的 grading_status/points_earned/graded_at}，新建的答卷为 None；
+# 发送方不知道之前状态的答卷不在 previous 中
+quiz_responses_changed = Signal()
+
+
+def mark_bulk_delete(queryset):
+    """
+    标记由调用方在删除后发送汇总信号的批量删除：逐行的 post_delete 仍然发送，
+    receiver 用 is_bulk_delete(origin) 判断后跳过。返回 queryset 本身
+    """
+    queryset.bulk_delete = True
+    return queryset
+
+
+def is_bulk_delete(origin):
+    return isinstance(origin, QuerySet) and getattr(origin, 'bulk_delete', False)
+
+
+def _cascaded_from_curriculum(origin, sender):
+    """由上级结构的删除级联而来时，上级的 handler 已经负责递增版本号"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in CURRICULUM_MODELS and model is not sender
+
+
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+def program_changed(sender, instance, **kwargs):
+    curriculum.bump_version(instance.pk)
+    search.schedule_index(instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_changed(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_curriculum(origin, sender):
+        curriculum.bump_version(instance.program_id)
+        search.schedule_index(instance.program_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_curriculum(origin, sender):
+        program_id = Topic.objects.filter(pk=instance.topic_id).values_list(
+            'program_id', flat=True
+        ).first()
+        curriculum.bump_version(program_id)
+        search.schedule_index(program_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_curriculum(origin, sender):
+        curriculum.bump_version(
+            Lesson.objects.filter(pk=instance.lesson_id).values_list(
+                'topic__program_id', flat=True
+            ).first()
+        )
+
+
+@receiver(post_save, sender=QuizChoice)
+@receiver(post_delete, sender=QuizChoice)
+def quiz_choice_changed(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_curriculum(origin, sender):
+        curriculum.bump_version(
+            Quiz.objects.filter(pk=instance.quiz_id).values_list(
+                'lesson__topic__program_id', flat=True
+            ).first()
+        )
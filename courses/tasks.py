@@ -0,0 +1,59 @@
+"""
+后台任务（jobs.queue）：大批量报名和删除项目。
+
+每批单独提交，重试时已完成的批次会被跳过（报名和取消报名都可以重复执行）。
+"""
+from django.contrib.auth import get_user_model
+
+from jobs.queue import task
+
+from .models import Enrollment, Program
+from .services import DEFAULT_BATCH_SIZE, bulk_enroll, bulk_unenroll
+
+User = get_user_model()
+
+
+@task('courses.bulk_enroll')
+def bulk_enroll_job(job, program_id, user_ids, enrolled_by_id=None, unenroll=False,
+                    batch_size=DEFAULT_BATCH_SIZE):
+    program = Program.objects.filter(pk=program_id).first()
+    if program is None:
+        return {'created': 0, 'removed': 0, 'skipped': len(user_ids)}
+    enrolled_by = User.objects.filter(pk=enrolled_by_id).first() if enrolled_by_id else None
+
+    action = 'unenrolled' if unenroll else 'enrolled'
+    changed = skipped = 0
+    total = len(user_ids)
+    for start in range(0, total, batch_size):
+        batch = user_ids[start:start + batch_size]
+        if unenroll:
+            result = bulk_unenroll(program, batch, batch_size=batch_size)
+            changed += result.removed
+        else:
+            result = bulk_enroll(program, batch, enrolled_by=enrolled_by, batch_size=batch_size)
+            changed += result.created
+        skipped += result.skipped
+        job.report_progress(start + len(batch), total, f'{changed} users {action}')
+
+    key = 'removed' if unenroll else 'created'
+    return {key: changed, 'skipped': skipped}
+
+
+@task('courses.delete_program')
+def delete_program_job(job, program_id, batch_size=DEFAULT_BATCH_SIZE):
+    """先分批取消报名（批量更新进度汇总），再删除项目及其课程内容"""
+    program = Program.objects.filter(pk=program_id).first()
+    if program is None:
+        return {'deleted': False}
+
+    user_ids = list(
+        Enrollment.objects.filter(program=program).order_by('user_id').values_list('user_id', flat=True)
+    )
+    total = len(user_ids)
+    for start in range(0, total, batch_size):
+        batch = user_ids[start:start + batch_size]
+        bulk_unenroll(program, batch, batch_size=batch_size)
+        job.report_progress(start + len(batch), total, 'Removing enrollments')
+
+    program.delete()
+    return {'deleted': True, 'title': program.title, 'enrollments': total}
@@ -0,0 +1,35 @@
+"""
+模板片段缓存的拼接。
+
+{% cache %} 缓存的是所有用户都相同的部分（课程大纲、测验内容），其中需要按用户
+显示的位置用 {% slot key %} 留出占位；视图单独渲染当前用户的内容，
+再由 stitch 过滤器填入占位：
+
+    {% filter stitch:lesson_status %}{% cache ... %} ... {% slot lesson.id %} ... {% endcache %}{% endfilter %}
+"""
+import re
+
+from django import template
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+SLOT_PATTERN = re.compile(r'<!--slot:([\w-]+)-->')
+
+
+@register.simple_tag
+def slot(key):
+    """占位标记，会随片段一起缓存"""
+    return mark_safe(f'<!--slot:{key}-->')
+
+
+@register.filter(is_safe=True)
+def stitch(fragment, slots):
+    """
+    把片段中的占位替换为 slots[key]（已渲染的 HTML 或文本），没有对应内容的占位替换为空
+    """
+    slots = slots or {}
+    return mark_safe(SLOT_PATTERN.sub(
+        lambda match: conditional_escape(slots.get(match.group(1), '')), fragment
+    ))
@@ -1,3 +1,297 @@
+from django.core.cache import caches
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import User
+from micro_training.testing import MigrationTestCase
+from . import search
+from .curriculum import get_versions
+from .grading import bulk_grade, reset_system_grader
+from .models import (
+    CurriculumVersion, Enrollment, Lesson, Program, ProgramSearchDocument, Quiz, QuizChoice, QuizResponse, Topic,
+)
+from .services import bulk_enroll, bulk_unenroll
+
+
+class BulkEnrollmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        cls.program = Program.objects.create(title='Safety', description='', created_by=cls.manager)
+        cls.learners = [User.objects.create_user(f'learner{n}') for n in range(4)]
+        cls.inactive = User.objects.create_user('inactive', is_active=False)
+
+    def test_bulk_enroll_skips_existing_and_ineligible(self):
+        Enrollment.objects.create(user=self.learners[0], program=self.program)
+        user_ids = [user.pk for user in self.learners] + [
+            self.learners[1].pk, self.manager.pk, self.inactive.pk, 999999,
+        ]
+
+        result = bulk_enroll(self.program, user_ids, enrolled_by=self.manager, batch_size=2)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.skipped, 4)
+        self.assertEqual(
+            set(Enrollment.objects.filter(program=self.program).values_list('user_id', flat=True)),
+            {user.pk for user in self.learners}
+        )
+        self.assertEqual(
+            Enrollment.objects.filter(program=self.program, enrolled_by=self.manager).count(), 3
+        )
+
+    def test_bulk_enroll_creates_progress_rows(self):
+        bulk_enroll(self.program, [user.pk for user in self.learners])
+
+        self.assertEqual(self.program.progress_rollups.count(), 4)
+
+    def test_bulk_unenroll(self):
+        bulk_enroll(self.program, [user.pk for user in self.learners[:3]])
+
+        result = bulk_unenroll(self.program, [user.pk for user in self.learners], batch_size=2)
+
+        self.assertEqual(result.removed, 3)
+        self.assertEqual(result.skipped, 1)
+        self.assertFalse(Enrollment.objects.filter(program=self.program).exists())
+        self.assertFalse(self.program.progress_rollups.exists())
+
+
+class BulkGradeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        cls.other_manager = User.objects.create_user('other', is_manager=True)
+        program = Program.objects.create(title='Safety', description='', created_by=cls.manager)
+        topic = Topic.objects.create(program=program, title='Basics', description='')
+        lesson = Lesson.objects.create(topic=topic, title='Intro', content='')
+        cls.open_quiz = Quiz.objects.create(
+            lesson=lesson, title='Explain', question='Why?', quiz_type='OPEN', points=10
+        )
+        cls.mcq = Quiz.objects.create(
+            lesson=lesson, title='Pick', question='Which?', quiz_type='MCQ', points=5
+        )
+        cls.choice = QuizChoice.objects.create(quiz=cls.mcq, choice_text='A', is_correct=True)
+        cls.learners = [User.objects.create_user(f'learner{n}') for n in range(3)]
+        for user in cls.learners:
+            Enrollment.objects.create(user=user, program=program)
+
+    def setUp(self):
+        # 系统评分者的 id 缓存在进程中，每个测试回滚后重新创建
+        self.addCleanup(reset_system_grader)
+
+    def respond(self, user):
+        return QuizResponse.objects.create(quiz=self.open_quiz, user=user, text_response='Because')
+
+    def test_grades_pending_responses(self):
+        responses = [self.respond(user) for user in self.learners[:2]]
+
+        result = bulk_grade(self.manager, [
+            {'id': responses[0].pk, 'points': 7, 'comment': ' Good '},
+            {'id': responses[1].pk, 'points': 0},
+        ])
+
+        self.assertEqual(result.errors, {})
+        self.assertEqual(result.graded, 2)
+        responses[0].refresh_from_db()
+        self.assertEqual(responses[0].grading_status, 'GRADED')
+        self.assertEqual(responses[0].points_earned, 7)
+        self.assertEqual(responses[0].grading_comment, 'Good')
+        self.assertEqual(responses[0].graded_by, self.manager)
+
+    def test_rejects_graded_responses(self):
+        response = self.respond(self.learners[0])
+        bulk_grade(self.manager, [{'id': response.pk, 'points': 7}])
+
+        result = bulk_grade(self.manager, [{'id': response.pk, 'points': 2}])
+
+        self.assertEqual(result.graded, 0)
+        self.assertEqual(result.errors, {response.pk: 'Response has already been graded.'})
+        response.refresh_from_db()
+        self.assertEqual(response.points_earned, 7)
+
+    def test_one_error_rejects_the_whole_batch(self):
+        pending = self.respond(self.learners[0])
+        mcq = QuizResponse.objects.create(quiz=self.mcq, user=self.learners[1], selected_choice=self.choice)
+
+        result = bulk_grade(self.manager, [
+            {'id': pending.pk, 'points': 5},
+            {'id': mcq.pk, 'points': 5},
+            {'id': 'x', 'points': 5},
+        ])
+
+        self.assertEqual(result.graded, 0)
+        self.assertEqual(set(result.errors), {'x'})
+        result = bulk_grade(self.manager, [
+            {'id': pending.pk, 'points': 11},
+            {'id': mcq.pk, 'points': 5},
+        ])
+        self.assertEqual(result.errors, {
+            pending.pk: 'Points must be between 0 and 10.',
+            mcq.pk: 'Multiple-choice responses are graded automatically.',
+        })
+        pending.refresh_from_db()
+        self.assertEqual(pending.grading_status, 'PENDING')
+
+    def test_only_own_programs(self):
+        response = self.respond(self.learners[0])
+
+        result = bulk_grade(self.other_manager, [{'id': response.pk, 'points': 5}])
+
+        self.assertEqual(result.errors, {response.pk: 'Response not found.'})
+
+
+class CurriculumVersionTests(TestCase):
+    def test_missing_versions_are_created_in_one_batch(self):
+        manager = User.objects.create_user('manager', is_manager=True)
+        # bulk_create 不发送 post_save，这些项目没有版本行
+        programs = Program.objects.bulk_create([
+            Program(title=f'Program {n}', description='', created_by=manager) for n in range(20)
+        ])
+        saved = Program.objects.create(title='Saved', description='', created_by=manager)
+        program_ids = [saved.pk] + [program.pk for program in programs]
+
+        # 读取版本号、读取项目、插入、读回，与缺少版本行的项目数量无关
+        with self.assertNumQueries(4):
+            versions = get_versions(program_ids + [999999])
+
+        self.assertIsNone(versions.pop(999999))
+        self.assertEqual(versions, dict(CurriculumVersion.objects.values_list('program_id', 'version')))
+        self.assertEqual(set(versions), set(program_ids))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_versions(program_ids), versions)
+
+
+class LessonDetailQueryTests(TestCase):
+    """课程页面在缓存为空时（结构树和模板片段都要重新构建）也不超出查询预算（10）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        program = Program.objects.create(title='Safety', description='', created_by=cls.manager)
+        topic = Topic.objects.create(program=program, title='Basics', description='')
+        cls.lesson = Lesson.objects.create(topic=topic, title='Intro', content='<p>Hi</p>')
+        Lesson.objects.create(topic=topic, title='Next', content='', order=1)
+        open_quiz = Quiz.objects.create(
+            lesson=cls.lesson, title='Explain', question='Why?', quiz_type='OPEN', points=10
+        )
+        mcq = Quiz.objects.create(
+            lesson=cls.lesson, title='Pick', question='Which?', quiz_type='MCQ', points=5
+        )
+        choice = QuizChoice.objects.create(quiz=mcq, choice_text='A', is_correct=True)
+        cls.learners = [User.objects.create_user(f'learner{n}') for n in range(5)]
+        for user in cls.learners:
+            Enrollment.objects.create(user=user, program=program)
+            QuizResponse.objects.create(quiz=open_quiz, user=user, text_response='Because')
+            QuizResponse.objects.create(quiz=mcq, user=user, selected_choice=choice)
+
+    def setUp(self):
+        self.addCleanup(reset_system_grader)
+        for alias in ('curriculum', 'template_fragments'):
+            caches[alias].clear()
+        self.url = reverse('courses:lesson_detail', args=[self.lesson.pk])
+
+    def test_manager_cold_cache(self):
+        self.client.force_login(self.manager)
+
+        # 会话、用户、课程（带结构版本号）、结构树五次、全部答卷一次
+        with self.assertNumQueries(9):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'learner4', count=2)
+
+    def test_learner_cold_cache(self):
+        self.client.force_login(self.learners[0])
+
+        # 会话、用户、课程（带结构版本号）、结构树五次、学习数据版本号、自己的答卷一次
+        with self.assertNumQueries(10):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Because')
+        # ETag 包含第一次响应设置的 CSRF cookie
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', is_manager=True)
+        cls.bob = User.objects.create_user('bob', is_manager=True)
+        cls.forklift = Program.objects.create(
+            title='Forklift safety', description='Operating heavy machinery', created_by=cls.alice
+        )
+        cls.fire = Program.objects.create(
+            title='Fire drills', description='Evacuation and safety routes', created_by=cls.bob
+        )
+        cls.onboarding = Program.objects.create(
+            title='新员工入职培训', description='公司制度与安全规范', created_by=cls.alice
+        )
+        topic = Topic.objects.create(program=cls.fire, title='Extinguishers', description='')
+        Lesson.objects.create(topic=topic, title='Using a forklift near exits', content='')
+        search.index_programs([cls.forklift.pk, cls.fire.pk, cls.onboarding.pk])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search.search_programs('forklift'), [self.forklift.pk, self.fire.pk])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(search.search_programs('evac safe'), [self.fire.pk])
+        self.assertEqual(search.search_programs('forklift evacuation'), [self.fire.pk])
+        self.assertEqual(search.search_programs('forklift drills'), [self.fire.pk])
+        self.assertEqual(search.search_programs('  '), [])
+
+    def test_filters_apply_before_limit(self):
+        programs = Program.objects.filter(created_by=self.bob)
+
+        self.assertEqual(search.search_programs('forklift', limit=1, programs=programs), [self.fire.pk])
+
+    def test_cjk_substring(self):
+        self.assertEqual(search.search_programs('入职'), [self.onboarding.pk])
+        self.assertEqual(search.search_programs('安全'), [self.onboarding.pk])
+        self.assertEqual(
+            search.search_programs('入职', programs=Program.objects.filter(created_by=self.bob)), []
+        )
+
+    def test_python_backend(self):
+        with self.settings(CATALOG_SEARCH_BACKEND='python'):
+            self.assertEqual(search.search_programs('forklift'), [self.forklift.pk, self.fire.pk])
+            self.assertEqual(
+                search.search_programs('safety', programs=Program.objects.filter(created_by=self.alice)),
+                [self.forklift.pk]
+            )
+
+    def test_document_follows_edits(self):
+        self.forklift.title = 'Pallet jacks'
+        self.forklift.save()
+        search.index_programs([self.forklift.pk])
+
+        self.assertEqual(search.search_programs('pallet'), [self.forklift.pk])
+        self.assertEqual(search.search_programs('forklift'), [self.fire.pk])
+
+
+class SearchIndexMigrationTests(MigrationTestCase):
+    """搜索文档表建立之前已有的项目在迁移后可以被搜索到"""
+
+    migrate_from = [('courses', '0004_hot_path_indexes')]
+
+    def test_existing_programs_are_indexed(self):
+        OldUser = self.old_apps.get_model('accounts', 'User')
+        OldProgram = self.old_apps.get_model('courses', 'Program')
+        OldTopic = self.old_apps.get_model('courses', 'Topic')
+        OldLesson = self.old_apps.get_model('courses', 'Lesson')
+        alice = OldUser.objects.create(username='alice', is_manager=True)
+        forklift = OldProgram.objects.create(title='Forklift safety', description='', created_by=alice)
+        fire = OldProgram.objects.create(title='Fire drills', description='Evacuation routes')
+        topic = OldTopic.objects.create(program=fire, title='Extinguishers', description='')
+        OldLesson.objects.create(topic=topic, title='Exits', content='<p>Keep the <b>forklift</b> lane clear</p>')
+
+        self.migrate(self.latest)
+
+        self.assertEqual(
+            ProgramSearchDocument.objects.get(pk=fire.pk).body,
+            'Evacuation routes\nExtinguishers\nExits\nKeep the forklift lane clear'
+        )
+        self.assertEqual(search.search_programs('forklift'), [forklift.pk, fire.pk])
+        self.assertEqual(search.search_programs('alice'), [forklift.pk])
+        self.assertEqual(search.search_programs('extinguish'), [fire.pk])
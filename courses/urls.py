@@ -31,6 +31,8 @@ urlpatterns = [
     # Quiz Response URLs
     path('quiz-response/<int:pk>/grade/', views.QuizResponseGradeView.as_view(), name='grade_response'),
     path('quiz-responses/<int:quiz_id>/', views.QuizResponseListView.as_view(), name='quiz_responses'),
+    path('grading/', views.GradingWorkbenchView.as_view(), name='grading_workbench'),
+    path('api/grading/', views.grading_api, name='grading_api'),
 
     # Enrollment management URLs
     path('program/<int:pk>/enrollments/', 
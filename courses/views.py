@@ -8,13 +8,25 @@ from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 from django.utils import timezone
 from django.forms import inlineformset_factory
-from .models import Program, Topic, Lesson, Quiz, QuizChoice, QuizResponse, Enrollment, LessonProgress
+from .models import Program, Topic, Lesson, Quiz, QuizChoice, QuizResponse, Enrollment
+from .curriculum import get_curriculum, get_versions, version_modified
+from .search import search_programs
+from .grading import MAX_BULK_GRADES, bulk_grade, grading_stats, pending_open_responses
+from . import services
+from .services import bulk_enroll, bulk_unenroll, csv_user_ids, department_user_ids
 from .forms import ProgramForm, TopicForm, LessonForm, QuizForm, QuizChoiceFormSet, EnrollmentManageForm, CourseSearchForm, QuizResponseForm, QuizGradingForm
-from django.http import JsonResponse
-from django.template.loader import render_to_string
+from django.http import Http404, JsonResponse
+from django.template.loader import get_template, render_to_string
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Exists, OuterRef
+from django.db.models import F, Q, Case, Count, Exists, OuterRef, Subquery, When
 from django.db import IntegrityError
+from progress.models import ProgramProgress
+from progress import versions as progress_versions
+from micro_training.conditional import ConditionalGetMixin
+from micro_training.pagination import KeysetPaginationMixin, paginate
+from jobs.queue import enqueue
+from django.conf import settings
+import json
 
 User = get_user_model()
 
@@ -22,8 +34,41 @@ class ManagerRequiredMixin(UserPassesTestMixin):
     def test_func(self):
         return self.request.user.is_manager
 
+
+class FragmentCacheMixin:
+    """模板中 {% cache %} 片段的过期时间；片段键包含项目的结构版本号，内容变化后旧片段不会再被读取"""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['fragment_timeout'] = settings.CURRICULUM_CACHE_TIMEOUT
+        return context
+
+
+def curriculum_validators(user, tree):
+    """
+    课程页面的条件 GET 验证信息：结构版本号，学员再加上自己的学习数据版本号。
+    最后修改时间取两者中较晚的一个
+    """
+    last_modified = version_modified(tree.version)
+    if user.is_manager:
+        return (tree.id, tree.version), last_modified
+    progress = progress_versions.get_version(user.pk)
+    if progress is None:
+        return None
+    version, updated_at = progress
+    return (tree.id, tree.version, version), max(last_modified, updated_at)
+
+
+def render_slots(template_name, items):
+    """
+    逐项渲染按用户变化的内容，items 为 (key, context) 序列；
+    返回 {key: html}，由 stitch 过滤器填入缓存片段中的 {% slot key %}
+    """
+    template = get_template(template_name)
+    return {str(key): template.render(context) for key, context in items}
+
 # Program Views
-class ProgramListView(LoginRequiredMixin, ListView):
+class ProgramListView(LoginRequiredMixin, FragmentCacheMixin, ListView):
     model = Program
     template_name = 'courses/program_list.html'
     context_object_name = 'programs'
@@ -31,79 +76,105 @@ class ProgramListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         if self.request.user.is_manager:
             # 管理员可以看到自己创建的所有课程
-            return Program.objects.filter(created_by=self.request.user)
+            return Program.objects.filter(created_by=self.request.user).select_related('created_by')
         else:
             # 普通用户可以看到所有课程（包括已加入和未加入的）
-            return Program.objects.all()
+            return Program.objects.select_related('created_by')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if not self.request.user.is_manager:
             # 获取用户已加入的课程
-            enrolled_programs = Program.objects.filter(enrolled_users=self.request.user)
-            
-            # 为每个课程添加未完成的测验信息
-            for program in enrolled_programs:
-                # 获取课程中所有的测验
-                total_quizzes = Quiz.objects.filter(
-                    lesson__topic__program=program
-                ).count()
-                
-                # 获取用户已完成的测验
-                completed_quizzes = QuizResponse.objects.filter(
-                    quiz__lesson__topic__program=program,
+            enrolled_programs = list(
+                Program.objects.filter(enrolled_users=self.request.user).select_related('created_by')
+            )
+            program_ids = [program.pk for program in enrolled_programs]
+
+            # 每个课程的测验总数和用户已完成的测验数（各一次查询）
+            total_quizzes = dict(
+                Quiz.objects.filter(lesson__topic__program__in=program_ids).values(
+                    'lesson__topic__program'
+                ).annotate(total=Count('id')).order_by().values_list('lesson__topic__program', 'total')
+            )
+            completed_quizzes = dict(
+                QuizResponse.objects.filter(
+                    quiz__lesson__topic__program__in=program_ids,
                     user=self.request.user
-                ).count()
-                
-                # 计算未完成的测验数量
-                program.pending_quizzes = total_quizzes - completed_quizzes
-            
+                ).values('quiz__lesson__topic__program').annotate(
+                    total=Count('id')
+                ).order_by().values_list('quiz__lesson__topic__program', 'total')
+            )
+
+            # 计算未完成的测验数量
+            for program in enrolled_programs:
+                program.pending_quizzes = (
+                    total_quizzes.get(program.pk, 0) - completed_quizzes.get(program.pk, 0)
+                )
+
+            available_programs = list(
+                Program.objects.exclude(enrolled_users=self.request.user).select_related('created_by')
+            )
             context['enrolled_programs'] = enrolled_programs
-            context['available_programs'] = Program.objects.exclude(enrolled_users=self.request.user)
+            context['available_programs'] = available_programs
+            # 课程卡片是缓存的公共片段，未完成测验的提示单独渲染后填入
+            context['pending_status'] = render_slots(
+                'courses/partials/pending_status.html',
+                ((program.pk, {'program': program}) for program in enrolled_programs)
+            )
+            programs = enrolled_programs + available_programs
+        else:
+            programs = context['programs'] = list(context['programs'])
+
+        versions = get_versions([program.pk for program in programs])
+        for program in programs:
+            program.structure_version = versions[program.pk]
         return context
 
-class ProgramDetailView(LoginRequiredMixin, DetailView):
+class ProgramDetailView(LoginRequiredMixin, ConditionalGetMixin, FragmentCacheMixin, DetailView):
     model = Program
     template_name = 'courses/program_detail.html'
 
+    def get_queryset(self):
+        return Program.objects.select_related('created_by')
+
+    def get_validators(self):
+        tree = self.get_curriculum(self.kwargs['pk'])
+        if tree is None:
+            return None
+        return curriculum_validators(self.request.user, tree)
+
+    def get_curriculum(self, program_id):
+        if not hasattr(self, '_curriculum'):
+            self._curriculum = get_curriculum(program_id)
+        return self._curriculum
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_manager'] = self.request.user.is_manager
         context['is_owner'] = self.object.created_by == self.request.user
 
-        if self.request.user.is_manager:
-            # 管理员视图直接使用原始数据
-            context['topics'] = self.object.topics.all()
-        else:
-            # 学生视图使用处理后的数据
-            processed_topics = []
-            for topic in self.object.topics.all():
-                processed_lessons = []
-                for lesson in topic.lessons.all():
-                    lesson_info = {
-                        'lesson': lesson,
-                        'has_quizzes': False,
-                        'pending_quizzes': 0
-                    }
-                    
-                    total_quizzes = lesson.quizzes.count()
-                    if total_quizzes > 0:
-                        lesson_info['has_quizzes'] = True
-                        completed_quizzes = QuizResponse.objects.filter(
-                            quiz__lesson=lesson,
-                            user=self.request.user
-                        ).count()
-                        lesson_info['pending_quizzes'] = total_quizzes - completed_quizzes
-                    
-                    processed_lessons.append(lesson_info)
-                
-                topic_info = {
-                    'topic': topic,
-                    'lessons': processed_lessons
-                }
-                processed_topics.append(topic_info)
-            
-            context['processed_topics'] = processed_topics
+        # 课程结构来自缓存，模板中的大纲片段按结构版本号缓存
+        tree = self.get_curriculum(self.object.pk)
+        context['curriculum'] = tree
+        context['topics'] = tree.topics
+
+        if not self.request.user.is_manager:
+            # 学生视图：每课未完成的测验数单独渲染，填入大纲片段
+            answered = dict(
+                QuizResponse.objects.filter(
+                    quiz__lesson__topic__program=self.object,
+                    user=self.request.user
+                ).values('quiz__lesson_id').annotate(
+                    total=Count('id')
+                ).order_by().values_list('quiz__lesson_id', 'total')
+            )
+            context['lesson_status'] = render_slots(
+                'courses/partials/lesson_status.html',
+                (
+                    (lesson.id, {'pending_quizzes': len(lesson.quizzes) - answered.get(lesson.id, 0)})
+                    for lesson in tree.iter_lessons() if lesson.quizzes
+                )
+            )
 
         return context
 
@@ -147,6 +218,20 @@ class ProgramDeleteView(LoginRequiredMixin, ManagerRequiredMixin, DeleteView):
         messages.success(request, 'Program successfully deleted.')
         return super().delete(request, *args, **kwargs)
 
+    def form_valid(self, form):
+        # 报名人数多时级联删除很慢，部署了 worker 时交给后台任务
+        if settings.JOBS_ENABLED and (
+                Enrollment.objects.filter(program=self.object).count() > settings.JOBS_INLINE_LIMIT):
+            job = enqueue(
+                'courses.delete_program', created_by=self.request.user, program_id=self.object.pk
+            )
+            messages.info(
+                self.request,
+                f'"{self.object.title}" is being deleted in the background (job #{job.pk}).'
+            )
+            return redirect(self.get_success_url())
+        return super().form_valid(form)
+
 # Topic Views
 class TopicCreateView(LoginRequiredMixin, ManagerRequiredMixin, CreateView):
     model = Topic
@@ -380,34 +465,43 @@ class EnrollmentManageView(LoginRequiredMixin, ManagerRequiredMixin, View):
             raise PermissionDenied
         return program
 
+    def get_enrollments(self, program):
+        # 已报名用户和报名记录一次查询取出（进度链接需要报名 id）
+        return Enrollment.objects.filter(program=program).select_related(
+            'user__department'
+        ).order_by('user__username')
+
+    def get_department_id(self, data):
+        department = data.get('department', '')
+        return int(department) if department.isdigit() else None
+
     def get(self, request, *args, **kwargs):
         program = self.get_program()
-        form = EnrollmentManageForm()
-        enrolled_users = program.enrolled_users.all()
-        
-        context = {
-            'program': program,
-            'form': form,
-            'enrolled_users': enrolled_users,
-        }
-        
+
         if request.headers.get('HX-Request'):
-            users = form.filter_users(
-                request.GET.get('search', ''),
-                request.GET.get('department', '')
-            ).exclude(id__in=enrolled_users.values_list('id', flat=True))
-            context['users'] = users
+            # 输入联想：只取最匹配的前 N 个未报名用户，不需要构建表单（部门列表）
+            context = {
+                'program': program,
+                'users': EnrollmentManageForm.filter_users(
+                    request.GET.get('search', ''),
+                    self.get_department_id(request.GET),
+                    exclude_program=program.pk
+                ),
+            }
             html = render_to_string(
                 'courses/partials/user_list.html',
                 context,
                 request=request
             )
             return JsonResponse({'html': html})
-            
-        available_users = User.objects.filter(is_manager=False).exclude(
-            id__in=enrolled_users.values_list('id', flat=True)
-        )
-        context['users'] = available_users
+
+        form = EnrollmentManageForm()
+        context = {
+            'program': program,
+            'form': form,
+            'enrollments': self.get_enrollments(program),
+            'users': form.filter_users(exclude_program=program.pk),
+        }
         return render(request, self.template_name, context)
 
     def post(self, request, *args, **kwargs):
@@ -417,51 +511,66 @@ class EnrollmentManageView(LoginRequiredMixin, ManagerRequiredMixin, View):
         
         # 准备基本上下文
         form = EnrollmentManageForm()
-        enrolled_users = program.enrolled_users.all()
-        available_users = User.objects.filter(is_manager=False).exclude(
-            id__in=enrolled_users.values_list('id', flat=True)
-        )
-        
         context = {
             'program': program,
             'form': form,
-            'enrolled_users': enrolled_users,
-            'users': available_users
+            'enrollments': self.get_enrollments(program),
+            'users': form.filter_users(exclude_program=program.pk)
         }
 
+        # 整个部门或 CSV 名单
+        if action == 'enroll_department':
+            department = self.get_department_id(request.POST)
+            if department is None:
+                messages.error(request, 'Please select a department.')
+                return render(request, self.template_name, context)
+            user_ids = department_user_ids(department)
+            action = 'enroll'
+        elif action == 'enroll_csv':
+            csv_file = request.FILES.get('csv_file')
+            if not csv_file:
+                messages.error(request, 'Please upload a CSV file.')
+                return render(request, self.template_name, context)
+            user_ids, missing = csv_user_ids(csv_file.read())
+            if missing:
+                messages.warning(request, f'{len(missing)} rows did not match any user.')
+            action = 'enroll'
+
         if not user_ids:
             messages.error(request, 'Please select at least one user.')
             return render(request, self.template_name, context)
 
-        users = User.objects.filter(id__in=user_ids)
+        if (settings.JOBS_ENABLED and len(user_ids) > settings.JOBS_INLINE_LIMIT
+                and action in ('enroll', 'unenroll')):
+            # 部署了 worker 时大批量报名交给后台任务，页面不等待
+            job = enqueue(
+                'courses.bulk_enroll',
+                created_by=request.user,
+                program_id=program.pk,
+                user_ids=[int(user_id) for user_id in user_ids],
+                enrolled_by_id=request.user.pk,
+                unenroll=action == 'unenroll',
+            )
+            messages.info(
+                request,
+                f'{len(user_ids)} users are being {action}ed in the background (job #{job.pk}).'
+            )
 
-        if action == 'enroll':
-            for user in users:
-                enrollment, created = Enrollment.objects.get_or_create(
-                    program=program,
-                    user=user,
-                    defaults={
-                        'enrolled_by': request.user,
-                    }
-                )
-            messages.success(request, f'Successfully enrolled {len(users)} users.')
+        elif action == 'enroll':
+            result = bulk_enroll(program, user_ids, enrolled_by=request.user)
+            messages.success(
+                request,
+                f'Successfully enrolled {result.created} users '
+                f'({result.skipped} already enrolled or not active learners).'
+            )
         
         elif action == 'unenroll':
-            if not user_ids:
-                messages.error(request, 'Please select at least one user to unenroll.')
-                return render(request, self.template_name, context)
-            
-            Enrollment.objects.filter(
-                user__in=users,
-                program=program
-            ).delete()
-            messages.success(request, f'Successfully unenrolled {len(users)} users.')
+            result = bulk_unenroll(program, user_ids)
+            messages.success(request, f'Successfully unenrolled {result.removed} users.')
 
         # 更新已注册用户列表
-        context['enrolled_users'] = program.enrolled_users.all()
-        context['users'] = User.objects.filter(is_manager=False).exclude(
-            id__in=context['enrolled_users'].values_list('id', flat=True)
-        )
+        context['enrollments'] = self.get_enrollments(program)
+        context['users'] = form.filter_users(exclude_program=program.pk)
         
         return render(request, self.template_name, context)
 
@@ -497,21 +606,9 @@ class UserDashboardView(LoginRequiredMixin, ListView):
             sort_by = form.cleaned_data.get('sort_by')
             progress = form.cleaned_data.get('progress')
 
-            if search:
-                queryset = queryset.filter(
-                    Q(title__icontains=search) |
-                    Q(description__icontains=search) |
-                    Q(created_by__username__icontains=search)
-                )
-
             if creator:
                 queryset = queryset.filter(created_by_id=creator)
 
-            if sort_by == 'oldest':
-                queryset = queryset.order_by('created_at')
-            else:
-                queryset = queryset.order_by('-created_at')
-
             if progress:
                 enrollments = Enrollment.objects.filter(
                     user=self.request.user,
@@ -532,6 +629,21 @@ class UserDashboardView(LoginRequiredMixin, ListView):
                         # Add logic for completed courses
                     )
 
+            ranked_ids = None
+            if search:
+                # 全文索引只在筛选后的项目中按相关度返回项目 id
+                ranked_ids = search_programs(search, programs=queryset)
+                queryset = queryset.filter(pk__in=ranked_ids)
+
+            if sort_by == 'oldest':
+                queryset = queryset.order_by('created_at')
+            elif sort_by == 'newest' or not search:
+                queryset = queryset.order_by('-created_at')
+            elif ranked_ids:
+                queryset = queryset.order_by(Case(
+                    *[When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)]
+                ))
+
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -540,37 +652,83 @@ class UserDashboardView(LoginRequiredMixin, ListView):
             self.request.GET,
             creator_choices=User.objects.filter(is_manager=True)
         )
+        # 课程数和完成数直接取进度汇总行
+        rollup = ProgramProgress.objects.filter(
+            user=self.request.user,
+            program=OuterRef('pk')
+        )
         context['enrolled_courses'] = Program.objects.filter(
             enrolled_users=self.request.user
         ).annotate(
-            total_lessons=Count('topics__lessons'),
-            completed_lessons=Count(
-                'topics__lessons',
-                filter=Q(topics__lessons__lessonprogress__user=self.request.user,
-                        topics__lessons__lessonprogress__completed=True)
-            )
+            total_lessons=Subquery(rollup.values('lessons_total')[:1]),
+            completed_lessons=Subquery(rollup.values('lessons_completed')[:1])
         )
         return context
 
-class LessonDetailView(LoginRequiredMixin, DetailView):
+class LessonDetailView(LoginRequiredMixin, ConditionalGetMixin, FragmentCacheMixin, DetailView):
     model = Lesson
     template_name = 'courses/lesson_detail.html'
 
+    def get_queryset(self):
+        # 结构版本号随课程一起读取，get_curriculum 不再单独查询
+        return Lesson.objects.select_related('topic__program').annotate(
+            structure_version=F('topic__program__curriculum_version__version')
+        )
+
+    def get_object(self, queryset=None):
+        # get_validators 和 get() 都需要课程，只查询一次
+        if not hasattr(self, '_lesson'):
+            self._lesson = super().get_object(queryset)
+        return self._lesson
+
+    def get_validators(self):
+        # 管理员页面包含所有学员的答卷，不做条件判断
+        if self.request.user.is_manager:
+            return None
+        tree = self.get_curriculum()
+        if tree is None:
+            return None
+        return curriculum_validators(self.request.user, tree)
+
+    def get_curriculum(self):
+        if getattr(self, '_curriculum', None) is None:
+            lesson = self.get_object()
+            self._curriculum = get_curriculum(lesson.topic.program_id, lesson.structure_version)
+        return self._curriculum
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_manager'] = self.request.user.is_manager
-        context['is_owner'] = self.object.topic.program.created_by == self.request.user
+        context['is_owner'] = self.object.topic.program.created_by_id == self.request.user.pk
 
-        if not self.request.user.is_manager:
+        navigation = self.get_navigation()
+        lesson_node = navigation.lesson
+        context['curriculum'] = self.get_curriculum()
+        context['quizzes'] = lesson_node.quizzes
+        context['navigation'] = navigation
+        context['prev_lesson'] = navigation.previous
+        context['next_lesson'] = navigation.next
+
+        if self.request.user.is_manager:
+            # 测验内容在模板中按结构版本号缓存，学员答卷一次查询后按测验分组
+            responses = {}
+            for response in QuizResponse.objects.filter(quiz__lesson=self.object).select_related(
+                    'user', 'selected_choice', 'graded_by').order_by('pk'):
+                responses.setdefault(response.quiz_id, []).append(response)
+            context['quiz_sections'] = [
+                (quiz, responses.get(quiz.id, [])) for quiz in lesson_node.quizzes
+            ]
+        else:
             # 获取所有测验
-            all_quizzes = self.object.quizzes.all()
-            user_responses = QuizResponse.objects.filter(
-                quiz__in=all_quizzes,
+            all_quizzes = lesson_node.quizzes
+            # 已完成的测验响应（只查询一次，下面的分组都使用这个列表）
+            user_responses = list(QuizResponse.objects.filter(
+                quiz__lesson=self.object,
                 user=self.request.user
-            ).select_related('quiz', 'selected_choice')
+            ).select_related('quiz', 'selected_choice', 'graded_by').order_by('-submitted_at'))
             
             # 创建已回答测验的ID集合
-            answered_quiz_ids = set(response.quiz.id for response in user_responses)
+            answered_quiz_ids = set(response.quiz_id for response in user_responses)
             
             # 未完成的测验
             context['pending_quizzes'] = [
@@ -578,8 +736,7 @@ class LessonDetailView(LoginRequiredMixin, DetailView):
                 if quiz.id not in answered_quiz_ids
             ]
             
-            # 已完成的测验响应
-            completed_responses = user_responses.order_by('-submitted_at')
+            completed_responses = user_responses
             
             # 分离待评分和已评分的测验
             context['waiting_for_grading'] = [
@@ -596,33 +753,21 @@ class LessonDetailView(LoginRequiredMixin, DetailView):
 
         return context
 
+    def get_navigation(self):
+        navigation = self.get_curriculum().get_navigation(self.object.pk)
+        if navigation is None:
+            # 结构树在课程写入之前读取（或课程刚移到这个项目），按当前数据重新构建
+            self._curriculum = get_curriculum(self.object.topic.program_id, refresh=True)
+            navigation = self._curriculum.get_navigation(self.object.pk)
+            if navigation is None:
+                raise Http404('Lesson not found in its program.')
+        return navigation
+
     def get_next_lesson(self):
-        current_topic_lessons = self.object.topic.lessons.order_by('order')
-        try:
-            return current_topic_lessons.filter(
-                order__gt=self.object.order
-            )[0]
-        except IndexError:
-            next_topic = self.object.topic.program.topics.filter(
-                order__gt=self.object.topic.order
-            ).first()
-            if next_topic:
-                return next_topic.lessons.order_by('order').first()
-        return None
+        return self.get_navigation().next
 
     def get_prev_lesson(self):
-        current_topic_lessons = self.object.topic.lessons.order_by('-order')
-        try:
-            return current_topic_lessons.filter(
-                order__lt=self.object.order
-            )[0]
-        except IndexError:
-            prev_topic = self.object.topic.program.topics.filter(
-                order__lt=self.object.topic.order
-            ).last()
-            if prev_topic:
-                return prev_topic.lessons.order_by('-order').first()
-        return None
+        return self.get_navigation().previous
 
 class QuizResponseCreateView(LoginRequiredMixin, CreateView):
     model = QuizResponse
@@ -631,10 +776,12 @@ class QuizResponseCreateView(LoginRequiredMixin, CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         # 在任何处理之前检查
-        self.quiz = get_object_or_404(Quiz, pk=self.kwargs['quiz_id'])
+        self.quiz = get_object_or_404(
+            Quiz.objects.select_related('lesson__topic'), pk=self.kwargs['quiz_id']
+        )
         if QuizResponse.objects.filter(quiz=self.quiz, user=request.user).exists():
             messages.error(request, '您已经回答过这个测验了！')
-            return redirect('courses:lesson_detail', pk=self.quiz.lesson.pk)
+            return redirect('courses:lesson_detail', pk=self.quiz.lesson_id)
         return super().dispatch(request, *args, **kwargs)
 
     def get_form_kwargs(self):
@@ -649,11 +796,7 @@ class QuizResponseCreateView(LoginRequiredMixin, CreateView):
         return context
 
     def form_valid(self, form):
-        # 再次检查，以防并发提交
-        if QuizResponse.objects.filter(quiz=self.quiz, user=self.request.user).exists():
-            messages.error(self.request, '您已经回答过这个测验了！')
-            return redirect('courses:lesson_detail', pk=self.quiz.lesson.pk)
-        
+        # 并发提交由唯一约束兜底（见下方 IntegrityError）
         try:
             form.instance.quiz = self.quiz
             form.instance.user = self.request.user
@@ -662,10 +805,10 @@ class QuizResponseCreateView(LoginRequiredMixin, CreateView):
             return response
         except IntegrityError:
             messages.error(self.request, '提交失败，您可能已经回答过这个测验。')
-            return redirect('courses:lesson_detail', pk=self.quiz.lesson.pk)
+            return redirect('courses:lesson_detail', pk=self.quiz.lesson_id)
 
     def get_success_url(self):
-        return reverse('courses:lesson_detail', kwargs={'pk': self.quiz.lesson.pk})
+        return reverse('courses:lesson_detail', kwargs={'pk': self.quiz.lesson_id})
 
 class QuizGradingView(LoginRequiredMixin, ManagerRequiredMixin, UpdateView):
     model = QuizResponse
@@ -686,42 +829,149 @@ class QuizGradingView(LoginRequiredMixin, ManagerRequiredMixin, UpdateView):
         messages.success(self.request, 'Quiz response has been graded successfully.')
         return redirect('courses:lesson_detail', pk=response.quiz.lesson.pk)
 
-class EnrollCourseView(LoginRequiredMixin, View):
+def _pending_grading_queryset(request):
+    """工作台和 API 共用：待评分的开放题答卷，可按项目、测验筛选"""
+    queryset = pending_open_responses(request.user).select_related(
+        'user', 'quiz__lesson__topic__program'
+    )
+    program = request.GET.get('program')
+    if program and program.isdigit():
+        queryset = queryset.filter(quiz__lesson__topic__program_id=program)
+    quiz = request.GET.get('quiz')
+    if quiz and quiz.isdigit():
+        queryset = queryset.filter(quiz_id=quiz)
+    return queryset
+
+class GradingWorkbenchView(LoginRequiredMixin, ManagerRequiredMixin, KeysetPaginationMixin, ListView):
+    """批量评分工作台：按提交时间翻页浏览待评分答卷，一次提交整页的分数和评语"""
+    template_name = 'courses/grading_workbench.html'
+    context_object_name = 'responses'
+    keyset = ('submitted_at', 'id')
+    paginate_by = 50
+
+    def get_queryset(self):
+        return _pending_grading_queryset(self.request)
+
+    def get_context_data(self, errors=None, submitted=None, **kwargs):
+        context = super().get_context_data(**kwargs)
+        errors = errors or {}
+        submitted = submitted or {}
+        for response in context['responses']:
+            response.grade_error = errors.get(response.pk)
+            response.submitted_points = submitted.get(f'points_{response.pk}', '')
+            response.submitted_comment = submitted.get(f'comment_{response.pk}', '')
+        context.update({
+            'programs': Program.objects.filter(created_by=self.request.user).order_by('title'),
+            'selected_program': self.request.GET.get('program', ''),
+            'stats': grading_stats(self.request.user),
+            'form_error': errors.get('__all__'),
+        })
+        return context
+
     def post(self, request, *args, **kwargs):
-        program = get_object_or_404(Program, pk=kwargs['pk'])
-        enrollment, created = Enrollment.objects.get_or_create(
-            program=program,
-            user=request.user,
-            defaults={
-                'enrolled_by': request.user,
+        # 分数留空的答卷跳过，不评分
+        grades = [
+            {
+                'id': response_id,
+                'points': request.POST.get(f'points_{response_id}'),
+                'comment': request.POST.get(f'comment_{response_id}'),
             }
+            for response_id in request.POST.getlist('responses')
+            if request.POST.get(f'points_{response_id}', '').strip()
+        ]
+        if not grades:
+            messages.warning(request, 'Enter points for at least one response.')
+            return redirect(request.get_full_path())
+
+        result = bulk_grade(request.user, grades)
+        if result.errors:
+            messages.error(request, f'{len(result.errors)} grades are invalid; nothing was saved.')
+            self.object_list = self.get_queryset()
+            context = self.get_context_data(errors=result.errors, submitted=request.POST)
+            return self.render_to_response(context)
+
+        messages.success(
+            request,
+            f'Graded {result.graded} responses in {result.elapsed * 1000:.0f} ms.'
         )
+        # 已评分的答卷不再出现在列表中，保持当前游标即可看到后续答卷
+        return redirect(request.get_full_path())
+
+@login_required
+def grading_api(request):
+    """
+    批量评分 API。
+    GET：待评分答卷（键集分页，?after= 游标，?page_size= 最多 MAX_BULK_GRADES 即 500）；
+    POST：{"grades": [{"id": 1, "points": 5, "comment": "..."}]}，全部校验通过才写入，
+    已评分的答卷不能再次提交。
+    """
+    if not request.user.is_manager:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    if request.method == 'POST':
+        try:
+            grades = json.loads(request.body)['grades']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON body with a "grades" list'}, status=400)
+        if not isinstance(grades, list) or not all(isinstance(grade, dict) for grade in grades):
+            return JsonResponse({'error': '"grades" must be a list of objects'}, status=400)
+
+        result = bulk_grade(request.user, grades)
+        if result.errors:
+            return JsonResponse({'errors': result.errors}, status=400)
+        return JsonResponse({
+            'graded': result.graded,
+            'elapsed_ms': round(result.elapsed * 1000, 1),
+            'per_second': round(result.graded / result.elapsed, 1) if result.elapsed else None,
+            'stats': grading_stats(request.user),
+        })
+
+    try:
+        page_size = min(int(request.GET.get('page_size', 50)), MAX_BULK_GRADES)
+    except ValueError:
+        page_size = 50
+    page = paginate(
+        _pending_grading_queryset(request), ('submitted_at', 'id'), request.GET, max(page_size, 1)
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'id': response.pk,
+                'user': response.user.username,
+                'program': response.quiz.lesson.topic.program.title,
+                'lesson': response.quiz.lesson.title,
+                'quiz': response.quiz.title,
+                'question': response.quiz.question,
+                'max_points': response.quiz.points,
+                'text_response': response.text_response,
+                'submitted_at': response.submitted_at,
+            }
+            for response in page
+        ],
+        'next': f'{request.path}?{page.next_query}' if page.next_query else None,
+        'previous': f'{request.path}?{page.previous_query}' if page.previous_query else None,
+        'stats': grading_stats(request.user),
+    })
+
+class EnrollCourseView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        program = get_object_or_404(Program, pk=kwargs['pk'])
+        services.enroll(request.user, program, enrolled_by=request.user)
         messages.success(request, f'You have successfully enrolled in {program.title}')
         return redirect('courses:user_dashboard')
 
 class UnenrollCourseView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         program = get_object_or_404(Program, pk=kwargs['pk'])
-        Enrollment.objects.filter(
-            user=request.user,
-            program=program
-        ).delete()
+        services.unenroll(request.user, program)
         messages.success(request, f'You have unenrolled from {program.title}')
         return redirect('courses:user_dashboard')
 
 class CompleteLessonView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         lesson = get_object_or_404(Lesson, pk=kwargs['pk'])
-        progress, created = LessonProgress.objects.get_or_create(
-            user=request.user,
-            lesson=lesson,
-            defaults={'completed': True, 'completed_at': timezone.now()}
-        )
-        if not created:
-            progress.completed = True
-            progress.completed_at = timezone.now()
-            progress.save()
-        
+        services.complete_lesson(request.user, lesson)
+
         messages.success(request, 'Lesson marked as completed!')
         return redirect('courses:lesson_detail', pk=lesson.pk)
 
@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'attempts', 'progress_done', 'progress_total',
+                    'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'created_by__username']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'heartbeat_at', 'worker']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Queue the selected failed jobs again')
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None, worker=''
+        )
+        self.message_user(request, f'{count} jobs queued again.')
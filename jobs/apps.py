@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+
+    def ready(self):
+        # 各应用的 tasks.py 在导入时注册后台任务
+        autodiscover_modules('tasks')
+        from . import checks  # noqa: F401
@@ -0,0 +1,14 @@
+"""
+进程池子进程的入口。子进程用 spawn 启动（不继承父进程已打开的数据库连接），
+反序列化入口函数时只导入本模块，Django 初始化之后才导入任务代码。
+"""
+import django
+
+
+def init():
+    django.setup()
+
+
+def execute(job_id):
+    from .worker import execute
+    return execute(job_id)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_result_dir(app_configs, **kwargs):
+    """worker 写入的导出文件由 web 进程提供下载，两者必须使用同一个目录"""
+    if settings.JOBS_ENABLED and not settings.JOBS_RESULT_DIR:
+        return [Error(
+            'JOBS_RESULT_DIR must be set when JOBS_ENABLED is on.',
+            hint='Point it at a directory shared by the run_jobs worker and the web processes.',
+            id='jobs.E001',
+        )]
+    return []
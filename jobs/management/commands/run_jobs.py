@@ -0,0 +1,39 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (exports, rollup rebuilds, bulk enrollment)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOBS_CONCURRENCY,
+                            help='Jobs executed at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default=settings.JOBS_POOL)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Seconds between queue checks when idle')
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Only run this task (can be repeated)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is due instead of waiting for more')
+        parser.add_argument('--max-jobs', type=int, help='Exit after this many jobs')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+            task_names=options['tasks'],
+        )
+        # 收到 SIGTERM / SIGINT 后不再领取新任务，等正在执行的任务结束
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+
+        self.stdout.write(
+            f"Worker {worker.name} started ({worker.pool} pool, concurrency {worker.concurrency})"
+        )
+        count = worker.run(once=options['once'], max_jobs=options['max_jobs'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} jobs.'))
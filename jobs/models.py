@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """数据库中的后台任务，由 run_jobs 命令领取执行（见 jobs.queue / jobs.worker）"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # worker 按 run_after 顺序领取排队中的任务
+            models.Index(fields=['status', 'run_after'], name='jobs_status_run_after_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='jobs_created_by_idx'),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def percent(self):
+        if not self.progress_total:
+            return 100 if self.status == self.SUCCEEDED else None
+        return min(round(self.progress_done / self.progress_total * 100, 1), 100)
+
+    def report_progress(self, done, total=None, message=''):
+        """
+        记录进度并刷新心跳。在事务中调用时只更新实例：写入要到提交后才可见，
+        还会锁住任务行挡住 worker 的心跳，所以长任务应分批提交并在批次之间报告。
+        """
+        self.progress_done = done
+        self.progress_total = total
+        self.progress_message = message[:255]
+        self.heartbeat_at = timezone.now()
+        if transaction.get_connection().in_atomic_block:
+            return
+        Job.objects.filter(pk=self.pk).update(
+            progress_done=self.progress_done,
+            progress_total=self.progress_total,
+            progress_message=self.progress_message,
+            heartbeat_at=self.heartbeat_at,
+        )
+
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
@@ -0,0 +1,155 @@
+"""
+数据库任务队列。
+
+各应用在 tasks.py 中用 @task 注册函数，enqueue 写入一行 Job；run_jobs 命令
+（jobs.worker）用条件 UPDATE 领取任务（status 仍为 queued 才能改成 running），
+不需要 SELECT ... FOR UPDATE SKIP LOCKED，在 SQLite 和 PostgreSQL 上都可用。
+没有部署 worker 时（JOBS_ENABLED 为 False）任务在 enqueue 的进程中立即执行。
+失败的任务按 JOBS_RETRY_DELAY 的指数退避重试，超过 max_attempts 后标记为 failed；
+心跳超过 JOBS_STALE_TIMEOUT 的 running 任务（worker 退出或卡死）按失败处理。
+"""
+import logging
+import os
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', 'name func max_attempts')
+
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """
+    注册后台任务。函数的第一个参数是 Job（用于 report_progress），
+    其余参数为关键字参数，必须能序列化为 JSON；返回值保存在 Job.result。
+    """
+    def register(func):
+        TASKS[name] = Task(name, func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, created_by=None, delay=None, max_attempts=None, **kwargs):
+    """
+    新建一个排队中的任务并返回。在事务中调用时，worker 要到事务提交后才能领取。
+    JOBS_ENABLED 为 False 时任务在事务提交后于当前进程中执行（delay 被忽略），
+    不在事务中调用时返回的 Job 已经是执行后的状态。
+    """
+    if name not in TASKS:
+        raise KeyError(f"Unknown task '{name}'")
+    if max_attempts is None:
+        max_attempts = TASKS[name].max_attempts or settings.JOBS_MAX_ATTEMPTS
+    run_after = timezone.now()
+    if delay:
+        run_after += timedelta(seconds=delay)
+    job = Job.objects.create(
+        task=name,
+        kwargs=kwargs,
+        created_by=created_by,
+        max_attempts=max_attempts,
+        run_after=run_after,
+    )
+    if not settings.JOBS_ENABLED:
+        from .worker import run_inline
+
+        def run():
+            run_inline(job.pk)
+            job.refresh_from_db()
+
+        transaction.on_commit(run)
+    return job
+
+
+def claim_job(job_id, worker, now=None):
+    """把一个排队中的任务标记为由 worker 执行，已被其他 worker 领取时返回 False"""
+    now = now or timezone.now()
+    return bool(Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+        status=Job.RUNNING,
+        worker=worker,
+        attempts=F('attempts') + 1,
+        started_at=now,
+        heartbeat_at=now,
+    ))
+
+
+def claim(worker, limit, task_names=None):
+    """领取最多 limit 个到期的任务，返回领取到的 id 列表"""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+    if task_names:
+        candidates = candidates.filter(task__in=task_names)
+    # 多取一些候选：其他 worker 可能同时领走其中一部分
+    candidate_ids = list(
+        candidates.order_by('run_after', 'id').values_list('id', flat=True)[:limit * 2]
+    )
+
+    claimed = []
+    for job_id in candidate_ids:
+        if claim_job(job_id, worker, now):
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def heartbeat(job_ids):
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def succeed(job, result):
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=Job.SUCCEEDED,
+        result=result,
+        error='',
+        progress_done=F('progress_total') if job.progress_total else job.progress_done,
+        finished_at=timezone.now(),
+    )
+
+
+def fail(job, error):
+    """失败后还有重试次数时重新排队（指数退避），否则标记为 failed"""
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker)
+    if job.attempts < job.max_attempts:
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        running.update(
+            status=Job.QUEUED, error=error, worker='', run_after=now + timedelta(seconds=delay)
+        )
+        logger.warning('Job %s (%s) failed, retrying in %ss', job.pk, job.task, delay)
+    else:
+        running.update(status=Job.FAILED, error=error, finished_at=now)
+        logger.error('Job %s (%s) failed after %s attempts', job.pk, job.task, job.attempts)
+
+
+def requeue_stale():
+    """心跳超时的 running 任务按失败处理，返回处理的数量"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_STALE_TIMEOUT)
+    stale = list(Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff))
+    for job in stale:
+        fail(job, f'Worker {job.worker} stopped responding')
+    return len(stale)
+
+
+def result_dir():
+    """
+    任务生成的文件所在的目录。部署 worker 时必须配置 worker 和 web 进程共享的
+    JOBS_RESULT_DIR（见 jobs.checks）；任务在 web 进程内执行时默认使用临时目录。
+    """
+    return settings.JOBS_RESULT_DIR or os.path.join(tempfile.gettempdir(), 'micro_training', 'jobs')
+
+
+def result_path(job, extension):
+    """任务生成的文件路径"""
+    os.makedirs(result_dir(), exist_ok=True)
+    return os.path.join(result_dir(), f'job-{job.pk}.{extension}')
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue, worker
+from .models import Job
+
+
+def add(job, a, b):
+    return a + b
+
+
+def explode(job):
+    raise ValueError('boom')
+
+
+TEST_TASKS = {
+    'tests.add': queue.Task('tests.add', add, None),
+    'tests.explode': queue.Task('tests.explode', explode, None),
+}
+
+
+@override_settings(JOBS_ENABLED=True, JOBS_MAX_ATTEMPTS=3, JOBS_RETRY_DELAY=30,
+                   JOBS_STALE_TIMEOUT=600)
+class QueueTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(queue.TASKS, TEST_TASKS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_unknown_task(self):
+        with self.assertRaises(KeyError):
+            queue.enqueue('tests.missing')
+
+    def test_claim_only_due_jobs_in_order(self):
+        later = queue.enqueue('tests.add', a=1, b=2, delay=60)
+        first = queue.enqueue('tests.add', a=1, b=2)
+        second = queue.enqueue('tests.add', a=3, b=4)
+
+        self.assertEqual(queue.claim('w1', limit=5), [first.pk, second.pk])
+        first.refresh_from_db()
+        self.assertEqual(first.status, Job.RUNNING)
+        self.assertEqual(first.worker, 'w1')
+        self.assertEqual(first.attempts, 1)
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_claim_respects_limit_and_task_names(self):
+        queue.enqueue('tests.add', a=1, b=2)
+        explode_job = queue.enqueue('tests.explode')
+
+        self.assertEqual(queue.claim('w1', limit=1, task_names=['tests.explode']), [explode_job.pk])
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+    def test_job_is_claimed_once(self):
+        job = queue.enqueue('tests.add', a=1, b=2)
+
+        self.assertTrue(queue.claim_job(job.pk, 'w1'))
+        self.assertFalse(queue.claim_job(job.pk, 'w2'))
+        self.assertEqual(queue.claim('w2', limit=5), [])
+        job.refresh_from_db()
+        self.assertEqual(job.worker, 'w1')
+
+    def test_run_success(self):
+        job = queue.enqueue('tests.add', a=1, b=2)
+        queue.claim_job(job.pk, 'w1')
+
+        self.assertEqual(worker.run(job.pk), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failure_retries_with_backoff(self):
+        job = queue.enqueue('tests.explode')
+
+        for attempt, delay in ((1, 30), (2, 60)):
+            before = timezone.now()
+            queue.claim_job(job.pk, 'w1')
+            self.assertEqual(worker.run(job.pk), Job.FAILED)
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertEqual(job.attempts, attempt)
+            self.assertEqual(job.worker, '')
+            self.assertIn('boom', job.error)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay))
+            # 退避期间不会被领取
+            self.assertEqual(queue.claim('w1', limit=5), [])
+
+        queue.claim_job(job.pk, 'w1')
+        worker.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_result_from_another_worker_is_ignored(self):
+        job = queue.enqueue('tests.add', a=1, b=2)
+        queue.claim_job(job.pk, 'w1')
+        job.refresh_from_db()
+        job.worker = 'w2'
+
+        queue.succeed(job, 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    def test_requeue_stale(self):
+        stale = queue.enqueue('tests.add', a=1, b=2)
+        fresh = queue.enqueue('tests.add', a=1, b=2)
+        queue.claim_job(stale.pk, 'w1', now=timezone.now() - timedelta(seconds=601))
+        queue.claim_job(fresh.pk, 'w1')
+
+        self.assertEqual(queue.requeue_stale(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.QUEUED)
+        self.assertIn('w1 stopped responding', stale.error)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, Job.RUNNING)
+
+    def test_requeue_stale_fails_last_attempt(self):
+        job = queue.enqueue('tests.add', max_attempts=1, a=1, b=2)
+        queue.claim_job(job.pk, 'w1', now=timezone.now() - timedelta(seconds=601))
+
+        queue.requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+
+@override_settings(JOBS_ENABLED=False)
+class InlineJobTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(queue.TASKS, TEST_TASKS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = queue.enqueue('tests.add', a=1, b=2)
+            self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertTrue(job.worker.startswith('inline:'))
+
+    def test_failure_is_not_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = queue.enqueue('tests.explode')
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
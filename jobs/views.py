@@ -0,0 +1,78 @@
+import os
+
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from .models import Job
+from .queue import result_dir
+
+# 任务列表最多返回的条数
+RECENT_JOBS = 20
+
+
+def get_job(request, pk):
+    """只有任务的创建者（或超级用户）可以查看"""
+    jobs = Job.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=pk)
+
+
+def serialize_job(job):
+    data = {
+        'id': job.pk,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'progress': {
+            'done': job.progress_done,
+            'total': job.progress_total,
+            'percent': job.percent,
+            'message': job.progress_message,
+        },
+        'result': job.result,
+        # 只返回异常的最后一行，完整的 traceback 在 admin 中查看
+        'error': job.error.strip().splitlines()[-1] if job.error.strip() else None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('jobs:job_status', args=[job.pk]),
+    }
+    if job.status == Job.SUCCEEDED and isinstance(job.result, dict) and job.result.get('file'):
+        data['download_url'] = reverse('jobs:job_download', args=[job.pk])
+    return data
+
+
+@login_required
+def job_list(request):
+    """当前用户最近的任务，?status= 可按状态筛选"""
+    jobs = Job.objects.filter(created_by=request.user)
+    status = request.GET.get('status')
+    if status:
+        jobs = jobs.filter(status=status)
+    return JsonResponse({'results': [serialize_job(job) for job in jobs[:RECENT_JOBS]]})
+
+
+@login_required
+def job_status(request, pk):
+    return JsonResponse(serialize_job(get_job(request, pk)))
+
+
+@login_required
+def job_download(request, pk):
+    """下载任务生成的文件（如后台导出）"""
+    job = get_job(request, pk)
+    if job.status != Job.SUCCEEDED or not isinstance(job.result, dict) or not job.result.get('file'):
+        raise Http404
+    path = os.path.join(result_dir(), os.path.basename(job.result['file']))
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=job.result.get('filename') or os.path.basename(path),
+        content_type=job.result.get('content_type'),
+    )
@@ -0,0 +1,152 @@
+"""
+run_jobs 的执行循环。
+
+主线程负责领取任务、刷新心跳和处理超时任务，任务在线程池或进程池中执行
+（JOBS_POOL）。每个线程 / 子进程使用自己的数据库连接。
+"""
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db import DatabaseError, close_old_connections
+
+from . import bootstrap, queue
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def run(job_id, retry=True):
+    """执行一个已领取的任务，返回最终状态；retry 为 False 时失败不再重新排队"""
+    job = Job.objects.get(pk=job_id)
+    registered = queue.TASKS.get(job.task)
+    if registered is None:
+        job.max_attempts = job.attempts
+        queue.fail(job, f"Unknown task '{job.task}'")
+        return Job.FAILED
+    try:
+        result = registered.func(job, **job.kwargs)
+    except Exception:
+        logger.exception('Job %s (%s) raised', job.pk, job.task)
+        if not retry:
+            job.max_attempts = job.attempts
+        queue.fail(job, traceback.format_exc())
+        return Job.FAILED
+    queue.succeed(job, result)
+    return Job.SUCCEEDED
+
+
+def execute(job_id):
+    """worker 线程 / 子进程中执行任务，前后清理过期的数据库连接"""
+    close_old_connections()
+    try:
+        return run(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_inline(job_id):
+    """
+    没有部署 worker（JOBS_ENABLED 为 False）时在当前进程中执行刚排队的任务。
+    使用调用方的数据库连接；失败时直接标记为 failed，没有进程会再重试。
+    """
+    name = f'inline:{socket.gethostname()}:{os.getpid()}'
+    if queue.claim_job(job_id, name):
+        run(job_id, retry=False)
+
+
+class Worker:
+    def __init__(self, concurrency=1, pool='thread', poll_interval=1.0, task_names=None):
+        if pool not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool '{pool}'")
+        self.concurrency = max(concurrency, 1)
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.task_names = task_names or None
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+
+    def stop(self, *args):
+        """处理完正在执行的任务后退出"""
+        self.stopping.set()
+
+    def _executor(self):
+        if self.pool == 'process':
+            return ProcessPoolExecutor(
+                self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=bootstrap.init,
+            )
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix='job')
+
+    def _entry(self):
+        return bootstrap.execute if self.pool == 'process' else execute
+
+    def _collect(self, running, done):
+        """处理已结束的任务，子进程异常退出时返回 True（进程池需要重建）"""
+        broken = False
+        for future in done:
+            job_id = running.pop(future)
+            self.processed += 1
+            try:
+                status = future.result()
+            except BrokenProcessPool:
+                # 子进程被杀死（如内存不足），任务按失败处理，不必等心跳超时
+                logger.error('Job %s: worker process terminated abruptly', job_id)
+                job = Job.objects.filter(pk=job_id, status=Job.RUNNING).first()
+                if job is not None:
+                    queue.fail(job, 'Worker process terminated abruptly')
+                broken = True
+            except Exception:
+                logger.exception('Job %s crashed the worker', job_id)
+            else:
+                logger.info('Job %s %s', job_id, status)
+        return broken
+
+    def run(self, once=False, max_jobs=None):
+        """
+        持续领取并执行任务。once 为 True 时处理完当前到期的任务后退出；
+        max_jobs 限制最多执行的任务数。返回执行的任务数。
+        """
+        running = {}
+        claimed_total = 0
+        executor = self._executor()
+        try:
+            while True:
+                try:
+                    if not self.stopping.is_set():
+                        queue.requeue_stale()
+                        free = self.concurrency - len(running)
+                        if max_jobs is not None:
+                            free = min(free, max_jobs - claimed_total)
+                        if free > 0:
+                            for job_id in queue.claim(self.name, free, self.task_names):
+                                running[executor.submit(self._entry(), job_id)] = job_id
+                                claimed_total += 1
+                    queue.heartbeat(list(running.values()))
+                except DatabaseError:
+                    # 数据库暂时不可用（或 SQLite 被锁）时等待下一轮
+                    logger.exception('Job worker %s could not reach the database', self.name)
+                    close_old_connections()
+
+                if not running:
+                    finished = max_jobs is not None and claimed_total >= max_jobs
+                    if once or finished or self.stopping.is_set():
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                if self._collect(running, done):
+                    # 进程池已不可用，其余任务也会以 BrokenProcessPool 结束
+                    self._collect(running, list(running))
+                    executor.shutdown(wait=False)
+                    executor = self._executor()
+        finally:
+            executor.shutdown(wait=True)
+        return self.processed
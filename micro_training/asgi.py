@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'micro_training.settings')
+# 告诉 settings 当前是 ASGI：持久连接按线程保存，默认不保留（用 DB_POOL）
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
+
+from micro_training.database import open_pools  # noqa: E402
+open_pools()
@@ -0,0 +1,58 @@
+"""
+条件 GET（ETag / Last-Modified）。
+
+视图在执行前给出廉价的验证信息（课程结构版本号、用户学习数据版本号、仪表板数据版本号），
+由 django.views.decorators.http.condition 与 If-None-Match / If-Modified-Since 比较，
+没有变化时直接返回 304，不执行视图本身。
+
+页面中有用户名和带 CSRF 令牌的表单，所以 ETag 还包含当前用户和 CSRF cookie，
+重新登录后不会继续使用浏览器里旧的页面。响应带 Cache-Control: private, no-cache：
+浏览器每次都重新验证，共享缓存不保存。
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def make_etag(request, *parts, user=None):
+    """由路径、当前用户、CSRF cookie 和 parts 计算 ETag；异步视图传入 await request.auser() 的结果"""
+    if user is None:
+        user = request.user
+    source = ':'.join(str(part) for part in (
+        request.path, user.pk, user.get_username(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''), *parts
+    ))
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def has_pending_messages(request):
+    """有待显示的消息时页面与版本号无关，不能返回 304（判断不会把消息标记为已读）"""
+    return len(get_messages(request)) > 0
+
+
+class ConditionalGetMixin:
+    """
+    类视图的条件 GET。get_validators() 返回 (ETag 组成部分, 最后修改时间)，
+    只能使用版本号等廉价的信息，不执行 get_context_data；
+    返回 None 时按普通请求处理，最后修改时间为 None 时只使用 ETag。
+    """
+
+    def get_validators(self):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        validators = None if has_pending_messages(request) else self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        parts, last_modified = validators
+        etag = make_etag(request, *parts)
+        response = condition(
+            etag_func=lambda request, *args, **kwargs: etag,
+            last_modified_func=lambda request, *args, **kwargs: last_modified,
+        )(super().get)(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,89 @@
+"""
+数据库连接：连接池的启动 / 关闭和连接指标。
+
+micro_training.postgresql 在每次取得新连接时调用 record_acquire：未启用 DB_POOL 时
+记录的是建立连接（握手）的耗时，启用时是从连接池取连接的等待时间；复用持久连接的
+请求不取新连接。耗时按进程累计，同时计入当前请求的 Server-Timing（conn）和请求日志，
+/metrics/db/ 返回累计值和连接池的使用情况。
+"""
+import atexit
+import threading
+
+from django.db import connections
+
+from .middleware import current_metrics
+
+_lock = threading.Lock()
+_acquire = {}
+
+
+def record_acquire(alias, seconds):
+    with _lock:
+        stats = _acquire.setdefault(alias, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.add_connect(seconds)
+
+
+def acquire_stats(alias):
+    with _lock:
+        stats = dict(_acquire.get(alias, {'count': 0, 'total': 0.0, 'max': 0.0}))
+    return {
+        'count': stats['count'],
+        'total_ms': round(stats['total'] * 1000, 1),
+        'avg_ms': round(stats['total'] / stats['count'] * 1000, 2) if stats['count'] else 0,
+        'max_ms': round(stats['max'] * 1000, 1),
+    }
+
+
+def _pool(alias):
+    # 只有 PostgreSQL 后端有 pool 属性，未启用 DB_POOL 时为 None
+    return getattr(connections[alias], 'pool', None)
+
+
+def pool_stats(alias):
+    """psycopg_pool 的统计（pool_size、pool_available、requests_wait_ms 等），没有连接池时为 None"""
+    pool = _pool(alias)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    stats['in_use'] = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    return stats
+
+
+def snapshot():
+    return {
+        alias: {
+            'engine': connections.settings[alias]['ENGINE'],
+            'conn_max_age': connections.settings[alias].get('CONN_MAX_AGE'),
+            'health_checks': connections.settings[alias].get('CONN_HEALTH_CHECKS'),
+            'acquire': acquire_stats(alias),
+            'pool': pool_stats(alias),
+        }
+        for alias in connections
+    }
+
+
+def open_pools():
+    """
+    在 wsgi.py / asgi.py 中调用：进程启动时打开连接池，后台预先建立 min_size 个连接，
+    第一批请求不用等待握手。gunicorn 使用 --preload 时连接会在 fork 前建立并被
+    所有 worker 共用，此时不要在主进程中调用。
+    """
+    opened = False
+    for alias in connections:
+        pool = _pool(alias)
+        if pool is not None:
+            pool.open(wait=False)
+            opened = True
+    if opened:
+        atexit.register(close_pools)
+
+
+def close_pools():
+    for alias in connections:
+        if _pool(alias) is not None:
+            connections[alias].close_pool()
@@ -0,0 +1,190 @@
+"""
+请求级别的性能指标。
+
+RequestMetricsMiddleware 统计每个请求的 SQL 数量、数据库耗时、取得新连接的耗时
+（micro_training.database）、模板渲染耗时（micro_training.template_backend）和总耗时，
+写入 Server-Timing 响应头和一行 JSON 日志；超过 VIEW_QUERY_BUDGETS 中的查询预算时记录警告。
+
+流式响应（导出、事件流）的内容在中间件返回之后才生成，其中的查询和渲染不计入。
+
+两个中间件都同时支持同步和异步：ASGI 下中间件链中只要有一个只支持同步，
+Django 就会把整条链放到线程里执行，异步视图（仪表板更新、事件流）也就失去了意义。
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger('micro_training.requests')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.connects = 0
+        self.connect_time = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper 的回调；异步视图可能在多个线程里同时执行查询
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.queries += 1
+                self.db_time += elapsed
+
+    def add_connect(self, seconds):
+        with self._lock:
+            self.connects += 1
+            self.connect_time += seconds
+
+    def add_template(self, seconds):
+        with self._lock:
+            self.template_time += seconds
+
+
+def current_metrics():
+    """当前请求的 RequestMetrics，不在请求中时为 None"""
+    return _current.get()
+
+
+@contextmanager
+def track_queries():
+    """
+    在当前线程的数据库连接上统计查询。
+    连接是线程本地的，异步视图放到其他线程执行的查询需要用它包一层才会计入当前请求。
+    """
+    metrics = _current.get()
+    with ExitStack() as stack:
+        if metrics is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+        yield
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match._func_path
+
+
+def query_budget(request):
+    """依次按视图路径、视图名、URL 名查找预算"""
+    budgets = getattr(settings, 'VIEW_QUERY_BUDGETS', {})
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not budgets:
+        return None
+    for key in (match._func_path, match._func_path.rsplit('.', 1)[-1], match.view_name):
+        if key in budgets:
+            return budgets[key]
+    return None
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING', True)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # sync_to_async 会复制 contextvars，放到线程里执行的查询也能找到当前请求的指标
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with track_queries():
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        """写入 Server-Timing 响应头和日志"""
+        view = view_name(request)
+        if self.server_timing:
+            timings = [
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ]
+            if metrics.connects:
+                timings.insert(1, f'conn;dur={metrics.connect_time * 1000:.1f};desc="{metrics.connects} new"')
+            response['Server-Timing'] = ', '.join(timings)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'connect_ms': round(metrics.connect_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }))
+
+        budget = query_budget(request)
+        if budget is not None and metrics.queries > budget:
+            logger.warning(
+                'Query budget exceeded: %s ran %d queries (budget %d) for %s',
+                view, metrics.queries, budget, request.path
+            )
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware 只支持同步，这里加上异步分支；静态文件在线程中打开"""
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
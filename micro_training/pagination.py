@@ -0,0 +1,128 @@
+"""
+键集（seek）分页。
+
+按固定的排序键 (a, b, ...) 翻页：下一页的条件是 (a, b) 大于当前页最后一行，
+不使用 OFFSET 也不做 COUNT，每页的查询耗时不随表的大小增长。
+游标是排序键取值的 JSON 经 base64 编码后的字符串，放在 ?after= / ?before= 中。
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """解析游标，格式不正确时返回 None（回到第一页）"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def keyset_filter(keys, values, reverse=False):
+    """
+    (a, b, c) > (x, y, z) 展开为
+    a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    """
+    lookup = 'lt' if reverse else 'gt'
+    condition = Q()
+    for index, key in enumerate(keys):
+        equal = dict(zip(keys[:index], values[:index]))
+        condition |= Q(**equal, **{f'{key}__{lookup}': values[index]})
+    return condition
+
+
+class KeysetPage:
+    """一页结果，以及上一页/下一页的查询字符串（保留其他 GET 参数）"""
+
+    def __init__(self, object_list, keys, has_next, has_previous, params):
+        self.object_list = object_list
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, key) for key in self.keys)
+
+    def _query(self, name=None, obj=None):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        if name:
+            params[name] = self._cursor(obj)
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        if self.has_next and self.object_list:
+            return self._query('after', self.object_list[-1])
+        return None
+
+    @property
+    def previous_query(self):
+        if self.has_previous and self.object_list:
+            return self._query('before', self.object_list[0])
+        return None
+
+    @property
+    def first_query(self):
+        return self._query()
+
+
+def paginate(queryset, keys, params, page_size):
+    """按 keys 对 queryset 做键集分页，params 为 request.GET"""
+    keys = tuple(keys)
+    after = decode_cursor(params.get('after'), len(keys))
+    before = decode_cursor(params.get('before'), len(keys))
+
+    if before is not None:
+        # 向前翻页：倒序取 page_size + 1 行，再恢复正序
+        rows = list(
+            queryset.filter(keyset_filter(keys, before, reverse=True))
+            .order_by(*(f'-{key}' for key in keys))[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(keys, after))
+        rows = list(queryset.order_by(*keys)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    return KeysetPage(rows, keys, has_next, has_previous, params)
+
+
+class KeysetPaginationMixin:
+    """
+    用于 ListView：keyset 为排序键（组合起来必须唯一），
+    模板中的 page_obj 为 KeysetPage。
+    """
+    keyset = ('id',)
+    paginate_by = 50
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginate(queryset, self.keyset, self.request.GET, page_size)
+        return None, page, page.object_list, page.has_other_pages()
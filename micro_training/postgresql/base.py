@@ -0,0 +1,15 @@
+"""Django 自带的 PostgreSQL 后端，另外记录取得新连接的耗时（见 micro_training.database）"""
+import time
+
+from django.db.backends.postgresql import base
+
+from micro_training import database
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            database.record_acquire(self.alias, time.perf_counter() - start)
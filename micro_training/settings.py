@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,9 +49,12 @@ INSTALLED_APPS = [
     'courses',
     # 'quizzes',
     'progress',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    # 放在最前面，统计整个请求的耗时
+    'micro_training.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,14 +62,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise 加上异步分支，ASGI 下整条中间件链保持异步
+    'micro_training.middleware.StaticFilesMiddleware',
 ]
 
 ROOT_URLCONF = 'micro_training.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for RequestMetricsMiddleware
+        'BACKEND': 'micro_training.template_backend.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],  # 添加这一行
         'APP_DIRS': True,
         'OPTIONS': {
@@ -96,11 +102,196 @@ DATABASES = {
 # Render PostgreSQL database (Live)
 import dj_database_url
 
+# DB_POOL enables Django's psycopg connection pool (requires `pip install "psycopg[binary,pool]"`);
+# without it, connections persist for DB_CONN_MAX_AGE seconds and are health-checked before reuse.
+# asgi.py sets DJANGO_ASGI: persistent connections are per thread there, so the default age is 0
+DB_POOL = env.bool('DB_POOL', default=False)
+
 DATABASES = {
-    'default': dj_database_url.parse(env('DATABASE_URL'))
+    'default': dj_database_url.parse(
+        env('DATABASE_URL'),
+        conn_max_age=0 if DB_POOL else env.int(
+            'DB_CONN_MAX_AGE', default=0 if env.bool('DJANGO_ASGI', default=False) else 60
+        ),
+        conn_health_checks=env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+    )
+}
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Same backend, plus connection acquire timing (micro_training.database)
+    DATABASES['default']['ENGINE'] = 'micro_training.postgresql'
+    if DB_POOL:
+        # Django's pool is psycopg 3 only, and requirements.txt installs psycopg2: Django would
+        # only notice on the first connection, so fail at startup instead
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured(
+                'DB_POOL requires psycopg 3 with its pool: pip install "psycopg[binary,pool]", '
+                'or unset DB_POOL.'
+            )
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            # Seconds a request waits for a free connection before failing
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),
+            'max_idle': env.float('DB_POOL_MAX_IDLE', default=60 * 10),
+            'max_lifetime': env.float('DB_POOL_MAX_LIFETIME', default=60 * 60),
+        }
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# CURRICULUM_CACHE_BACKEND: 'locmem' (per process) or 'file' (shared between workers).
+# Curriculum versions live in the database (courses.CurriculumVersion), so either
+# backend is safe across workers; 'file' only saves rebuilding the tree in each process.
+CURRICULUM_CACHE_BACKEND = env('CURRICULUM_CACHE_BACKEND', default='locmem')
+
+CURRICULUM_CACHE_TIMEOUT = env.int('CURRICULUM_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+if CURRICULUM_CACHE_BACKEND == 'file':
+    import tempfile
+    _curriculum_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env(
+            'CURRICULUM_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'micro_training', 'curriculum')
+        ),
+    }
+    _fragment_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(_curriculum_cache['LOCATION'], 'fragments'),
+    }
+else:
+    _curriculum_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'curriculum',
+    }
+    _fragment_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'curriculum': dict(_curriculum_cache, TIMEOUT=CURRICULUM_CACHE_TIMEOUT),
+    # {% cache %} fragments of catalog and lesson pages; keys carry the curriculum version from the database
+    'template_fragments': dict(
+        _fragment_cache,
+        TIMEOUT=CURRICULUM_CACHE_TIMEOUT,
+        OPTIONS={'MAX_ENTRIES': env.int('FRAGMENT_CACHE_ENTRIES', default=5000)},
+    ),
+    # update_dashboard responses; keys carry a data version, so per-process caches never serve stale data
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboard',
+        'TIMEOUT': env.int('DASHBOARD_CACHE_TIMEOUT', default=60 * 10),
+        'OPTIONS': {'MAX_ENTRIES': env.int('DASHBOARD_CACHE_ENTRIES', default=1000)},
+    },
 }
 
 
+# Quiz auto-grading
+# Dedicated inactive account recorded as the grader of auto-graded MCQ responses
+SYSTEM_GRADER_USERNAME = env('SYSTEM_GRADER_USERNAME', default='system-grader')
+
+
+# Catalog search
+# 'auto' picks Postgres full-text search, SQLite FTS5 or the in-process index;
+# set to 'python' to force the in-process index
+CATALOG_SEARCH_BACKEND = env('CATALOG_SEARCH_BACKEND', default='auto')
+
+
+# Request metrics
+# Server-Timing header (db / tpl / total) on every response
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+
+# Query budget per view (dotted view path, view name or URL name);
+# RequestMetricsMiddleware logs a warning when a request goes over it
+VIEW_QUERY_BUDGETS = {
+    'courses.views.ProgramListView': 10,
+    'courses.views.ProgramDetailView': 10,
+    'courses.views.LessonDetailView': 10,
+    'courses.views.EnrollmentManageView': 20,
+    'progress.views.UserProgressListView': 5,
+    'progress.views.ManagerProgressView': 6,
+    'accounts.views.UserListView': 6,
+    'analytics.views.ManagerDashboardView': 10,
+    'analytics.views.ManagerAnalyticsView': 6,
+    'analytics.views.update_dashboard': 15,
+    'analytics.views.update_dashboard_async': 15,
+}
+
+
+# Manager dashboard
+# Dashboard query threads shared by all async dashboard requests in a process
+# (each keeps its own DB connection, reused according to DB_CONN_MAX_AGE / DB_POOL)
+DASHBOARD_QUERY_CONCURRENCY = env.int('DASHBOARD_QUERY_CONCURRENCY', default=4)
+# Live updates (Server-Sent Events) keep one connection open per dashboard tab. Under ASGI that is
+# cheap; under WSGI each stream holds a whole worker, so it is off unless DASHBOARD_EVENTS_WSGI is set,
+# and the dashboard polls update_dashboard instead (answered with 304 while nothing changed).
+DASHBOARD_EVENTS_WSGI = env.bool('DASHBOARD_EVENTS_WSGI', default=False)
+# Under WSGI a stream is closed after this many seconds; the browser reconnects and refreshes once
+DASHBOARD_EVENTS_WSGI_SECONDS = env.int('DASHBOARD_EVENTS_WSGI_SECONDS', default=60)
+DASHBOARD_POLL_SECONDS = env.int('DASHBOARD_POLL_SECONDS', default=30)
+
+
+# Background jobs
+# Set JOBS_ENABLED once a worker runs (`python manage.py run_jobs`); until then jobs are
+# executed inline in the process that queues them, after its transaction commits.
+JOBS_ENABLED = env.bool('JOBS_ENABLED', default=False)
+# 'thread' or 'process' pool
+JOBS_POOL = env('JOBS_POOL', default='thread')
+JOBS_CONCURRENCY = env.int('JOBS_CONCURRENCY', default=2)
+JOBS_POLL_INTERVAL = env.float('JOBS_POLL_INTERVAL', default=1.0)
+JOBS_MAX_ATTEMPTS = env.int('JOBS_MAX_ATTEMPTS', default=3)
+# Seconds before the first retry, doubled on every further attempt
+JOBS_RETRY_DELAY = env.int('JOBS_RETRY_DELAY', default=30)
+# Running jobs without a heartbeat for this many seconds are treated as failed
+JOBS_STALE_TIMEOUT = env.int('JOBS_STALE_TIMEOUT', default=60 * 10)
+# Files produced by jobs (exports). Required with JOBS_ENABLED: a directory shared by the worker
+# and web processes (e.g. a mounted volume). Without a worker, a temporary directory is used.
+JOBS_RESULT_DIR = env('JOBS_RESULT_DIR', default=None)
+# Enrollments and program deletes touching more users than this run in the background
+JOBS_INLINE_LIMIT = env.int('JOBS_INLINE_LIMIT', default=500)
+
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'micro_training.requests': {
+            'level': env('REQUEST_LOG_LEVEL', default='INFO'),
+        },
+        'analytics': {
+            'level': 'INFO',
+        },
+        'jobs': {
+            'level': 'INFO',
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,36 @@
+"""
+带渲染计时的模板后端（RequestMetricsMiddleware 的 template_ms）。
+
+DjangoTemplates 的子类：get_template / from_string 返回的模板在 render() 前后计时，
+计入当前请求的 RequestMetrics。只包装后端的模板（render()/TemplateResponse 的入口），
+{% include %} 等嵌套渲染使用引擎内部的模板，不会被重复计时。
+"""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .middleware import current_metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.add_template(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
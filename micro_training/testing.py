@@ -0,0 +1,32 @@
+"""
+测试工具。
+
+MigrationTestCase：把测试数据库迁移回 migrate_from 的状态，用当时的历史模型写入数据，
+再迁移到最新，检查数据迁移在已有数据的数据库上的结果。
+"""
+from io import StringIO
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    # [(app_label, migration_name)]，写入旧数据时数据库所处的状态
+    migrate_from = []
+
+    def setUp(self):
+        super().setUp()
+        self.latest = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        # 无论测试是否通过都迁移回最新，之后的测试使用当前的表结构
+        self.addCleanup(self.migrate, self.latest)
+        self.old_apps = self.migrate(self.migrate_from)
+
+    def migrate(self, targets):
+        """迁移到 targets，返回数据库当前状态（所有已执行的迁移）的历史模型（apps）"""
+        executor = MigrationExecutor(connection)
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(list(executor.loader.applied_migrations)).apps
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from django.views.generic import TemplateView
+from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,6 +26,8 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('courses/', include('courses.urls')),
     path('progress/', include('progress.urls')),
+    path('jobs/', include('jobs.urls', namespace='jobs')),
     # path('quizzes/', include('quizzes.urls')),
     path('analytics/', include('analytics.urls', namespace='analytics')),
+    path('metrics/db/', views.db_metrics, name='db_metrics'),
 ]
@@ -0,0 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from . import database
+
+
+@staff_member_required
+def db_metrics(request):
+    """数据库连接指标：取连接的次数和耗时、连接池的大小和使用情况"""
+    return JsonResponse(database.snapshot())
@@ -15,4 +15,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'micro_training.settings')
 
 application = get_wsgi_application()
 
+# DB_POOL 启用时预先打开连接池
+from micro_training.database import open_pools  # noqa: E402
+open_pools()
+
 app = application
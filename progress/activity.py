@@ -0,0 +1,410 @@
+"""
+每日学习活动汇总（DailyActivity）。
+
+每个 (课程, 部门, 日期) 一行：完成课程数、测验提交数、评分数与得分、活跃学员数。
+signals 在写入时对所在的桶做增量更新，rebuild 用分组查询从原始记录重建，
+时间序列和时间范围筛选只需要读取按日汇总的行。
+
+增量更新和重建使用同一个归属规则：活动计入用户当前所在的部门（与 DepartmentProgramStats
+一致）。用户换部门时其全部历史移到新部门，删除用户时扣除其贡献。
+活跃学员数按桶去重，多个桶相加得到的是“学员 × 课程”数，不是去重的学员数。
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from courses.models import Lesson, LessonProgress, Program, Quiz, QuizResponse
+from .models import DailyActivity
+
+User = get_user_model()
+
+COUNTERS = (
+    'completions', 'quiz_submissions', 'graded_responses',
+    'points_earned', 'points_graded', 'active_learners',
+)
+
+
+def bucket_day(moment):
+    """活动时间所在的日期（按当前时区）"""
+    return timezone.localdate(moment) if moment else None
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def user_department_id(user_id):
+    return User.objects.filter(pk=user_id).values_list('department_id', flat=True).first()
+
+
+# 增量更新
+def record(lesson_id, department_id, day, program_id=None, **deltas):
+    """对一个桶做 O(1) 增量更新，桶不存在时创建"""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas or day is None:
+        return
+    bucket = DailyActivity.objects.filter(
+        lesson_id=lesson_id, department_id=department_id, day=day
+    )
+    changes = {name: F(name) + value for name, value in deltas.items()}
+    if bucket.update(**changes):
+        return
+    if any(value < 0 for value in deltas.values()):
+        # 桶不存在时不会有可以扣减的计数（例如汇总表建立之前的记录）
+        return
+    if program_id is None:
+        program_id = Lesson.objects.filter(pk=lesson_id).values_list(
+            'topic__program_id', flat=True
+        ).first()
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(
+                lesson_id=lesson_id, department_id=department_id, day=day,
+                program_id=program_id, **deltas
+            )
+    except IntegrityError:
+        # 并发请求先创建了同一个桶
+        bucket.update(**changes)
+
+
+def is_active(user_id, lesson_id, day, exclude_progress=None, exclude_response=None):
+    """用户当天是否还有该课程的其他活动（完成课程或提交测验）"""
+    start, end = day_bounds(day)
+    completions = LessonProgress.objects.filter(
+        user_id=user_id, lesson_id=lesson_id, completed=True,
+        completed_at__gte=start, completed_at__lt=end
+    )
+    responses = QuizResponse.objects.filter(
+        user_id=user_id, quiz__lesson_id=lesson_id,
+        submitted_at__gte=start, submitted_at__lt=end
+    )
+    if exclude_progress is not None:
+        completions = completions.exclude(pk=exclude_progress)
+    if exclude_response is not None:
+        responses = responses.exclude(pk=exclude_response)
+    return completions.exists() or responses.exists()
+
+
+def record_activity(user_id, lesson_id, moment, program_id=None, added=True,
+                    exclude_progress=None, exclude_response=None, **deltas):
+    """
+    记录一次学员活动并维护活跃学员数：
+    新增活动时如果当天在该课程没有其他活动则 +1，撤销时如果没有其他活动则 -1。
+    """
+    day = bucket_day(moment)
+    if day is None:
+        return
+    department_id = user_department_id(user_id)
+    if not is_active(user_id, lesson_id, day, exclude_progress, exclude_response):
+        deltas['active_learners'] = 1 if added else -1
+    record(lesson_id, department_id, day, program_id=program_id, **deltas)
+
+
+def graded_contribution(status, points_earned, points):
+    """一份答卷对评分统计的贡献 (graded_responses, points_earned, points_graded)"""
+    if status != 'GRADED':
+        return 0, 0, 0
+    return 1, points_earned or 0, points
+
+
+def record_grading(user_id, lesson_id, moment, contribution, program_id=None, sign=1):
+    graded, earned, possible = contribution
+    if graded:
+        record(
+            lesson_id, user_department_id(user_id), bucket_day(moment), program_id=program_id,
+            graded_responses=sign * graded,
+            points_earned=sign * earned,
+            points_graded=sign * possible,
+        )
+
+
+def responses_changed(responses, previous=None):
+    """
+    批量写入答卷后重建受影响的日期。previous 为 {答卷 id: 写入前的状态}，
+    新建的答卷对应 None；不在 previous 中的答卷之前的评分日期未知，
+    只能确定不早于提交日期，从提交日期起重建。
+    """
+    previous = previous or {}
+    programs = dict(
+        Quiz.objects.filter(pk__in={response.quiz_id for response in responses})
+        .values_list('id', 'lesson__topic__program_id')
+    )
+    days, since = defaultdict(set), {}
+    for response in responses:
+        program_id = programs.get(response.quiz_id)
+        submitted = bucket_day(response.submitted_at)
+        days[program_id].add(submitted)
+        if response.grading_status == 'GRADED':
+            days[program_id].add(bucket_day(response.graded_at) or submitted)
+        if response.pk not in previous:
+            since[program_id] = min(since.get(program_id, submitted), submitted)
+        elif previous[response.pk] and previous[response.pk].get('grading_status') == 'GRADED':
+            days[program_id].add(bucket_day(previous[response.pk].get('graded_at')) or submitted)
+
+    for program_id, program_days in days.items():
+        if program_id is None:
+            continue
+        if program_id in since:
+            rebuild([program_id], since=since[program_id])
+        else:
+            rebuild([program_id], days=program_days)
+
+
+# 重建
+def _in_days(field, days):
+    condition = Q()
+    for day in days:
+        start, end = day_bounds(day)
+        condition |= Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return condition
+
+
+def compute_rows(program_ids, since=None, days=None, user_id=None):
+    """
+    用分组查询重新计算汇总行（未保存）。
+    since 为日期时只计算该日期及之后的桶，days 为日期集合时只计算这些日期的桶；
+    user_id 不为 None 时只计算该用户的贡献，program_ids 为 None 时不限项目。
+    """
+    completed = LessonProgress.objects.filter(completed=True, completed_at__isnull=False)
+    submitted = QuizResponse.objects.all()
+    if program_ids is not None:
+        program_ids = list(program_ids)
+        completed = completed.filter(lesson__topic__program_id__in=program_ids)
+        submitted = submitted.filter(quiz__lesson__topic__program_id__in=program_ids)
+    if user_id is not None:
+        completed = completed.filter(user_id=user_id)
+        submitted = submitted.filter(user_id=user_id)
+    graded = submitted.filter(grading_status='GRADED').annotate(
+        graded_day=TruncDate(Coalesce('graded_at', 'submitted_at'))
+    )
+    if since is not None:
+        start = day_bounds(since)[0]
+        completed = completed.filter(completed_at__gte=start)
+        submitted = submitted.filter(submitted_at__gte=start)
+        graded = graded.filter(graded_day__gte=since)
+    if days is not None:
+        days = list(days)
+        completed = completed.filter(_in_days('completed_at', days))
+        submitted = submitted.filter(_in_days('submitted_at', days))
+        graded = graded.filter(graded_day__in=days)
+
+    buckets = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    programs = {}
+    active = defaultdict(set)
+
+    for row in completed.annotate(day=TruncDate('completed_at')).values(
+            'lesson_id', 'lesson__topic__program_id', 'user__department_id', 'day', 'user_id'
+    ).order_by().iterator(chunk_size=2000):
+        key = (row['lesson_id'], row['user__department_id'], row['day'])
+        programs[key] = row['lesson__topic__program_id']
+        buckets[key]['completions'] += 1
+        active[key].add(row['user_id'])
+
+    for row in submitted.annotate(day=TruncDate('submitted_at')).values(
+            'quiz__lesson_id', 'quiz__lesson__topic__program_id', 'user__department_id', 'day'
+    ).annotate(total=Count('id')).order_by():
+        key = (row['quiz__lesson_id'], row['user__department_id'], row['day'])
+        programs[key] = row['quiz__lesson__topic__program_id']
+        buckets[key]['quiz_submissions'] += row['total']
+
+    # 同一天既完成课程又提交测验的学员只算一次，需要逐个学员合并
+    for lesson_id, department_id, day, user_id in submitted.annotate(
+            day=TruncDate('submitted_at')).values_list(
+            'quiz__lesson_id', 'user__department_id', 'day', 'user_id'
+    ).distinct().order_by().iterator(chunk_size=2000):
+        active[(lesson_id, department_id, day)].add(user_id)
+
+    for row in graded.values(
+            'quiz__lesson_id', 'quiz__lesson__topic__program_id', 'user__department_id',
+            'graded_day'
+    ).annotate(
+        total=Count('id'), earned=Sum('points_earned'), possible=Sum('quiz__points')
+    ).order_by():
+        key = (row['quiz__lesson_id'], row['user__department_id'], row['graded_day'])
+        programs[key] = row['quiz__lesson__topic__program_id']
+        buckets[key]['graded_responses'] += row['total']
+        buckets[key]['points_earned'] += row['earned'] or 0
+        buckets[key]['points_graded'] += row['possible'] or 0
+
+    for key, users in active.items():
+        buckets[key]['active_learners'] = len(users)
+
+    return [
+        DailyActivity(
+            lesson_id=lesson_id, department_id=department_id, day=day,
+            program_id=programs[(lesson_id, department_id, day)], **counters
+        )
+        for (lesson_id, department_id, day), counters in buckets.items()
+    ]
+
+
+def rebuild(program_ids=None, since=None, days=None, batch_size=1000, progress=None):
+    """
+    按项目重建汇总表，program_ids 为 None 时重建全部。
+    since / days 限定重建的日期（见 compute_rows）。每个项目单独提交，
+    之后调用 progress(已完成项目数, 项目总数)。返回写入的行数
+    """
+    if program_ids is None:
+        if since is None and days is None:
+            DailyActivity.objects.exclude(program_id__in=Program.objects.values('id')).delete()
+        program_ids = Program.objects.order_by('id').values_list('id', flat=True)
+    program_ids = list(program_ids)
+    count = 0
+    for index, program_id in enumerate(program_ids, 1):
+        stale = DailyActivity.objects.filter(program_id=program_id)
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        if days is not None:
+            stale = stale.filter(day__in=days)
+        with transaction.atomic():
+            stale.delete()
+            rows = compute_rows([program_id], since=since, days=days)
+            DailyActivity.objects.bulk_create(rows, batch_size=batch_size)
+        count += len(rows)
+        if progress:
+            progress(index, len(program_ids))
+    return count
+
+
+def refresh_program(program_id):
+    if program_id is not None:
+        rebuild([program_id])
+
+
+def merge_department(department_id):
+    """部门删除前把它的活动并入同一课程、同一天的无部门行"""
+    rows = DailyActivity.objects.filter(department_id=department_id)
+    with transaction.atomic():
+        for row in rows.iterator():
+            record(
+                row.lesson_id, None, row.day, program_id=row.program_id,
+                **{name: getattr(row, name) for name in COUNTERS}
+            )
+        rows.delete()
+
+
+def move_user(user_id, old_department_id, new_department_id):
+    """用户换部门时，把其所有活动从原部门的桶移到新部门的桶"""
+    with transaction.atomic():
+        for row in compute_rows(None, user_id=user_id):
+            counters = {name: getattr(row, name) for name in COUNTERS}
+            record(
+                row.lesson_id, old_department_id, row.day, program_id=row.program_id,
+                **{name: -value for name, value in counters.items()}
+            )
+            record(row.lesson_id, new_department_id, row.day, program_id=row.program_id, **counters)
+
+
+def remove_user(user_id):
+    """删除用户前扣除其活动（学习记录和答卷随用户级联删除，不会逐行触发 signals）"""
+    department_id = user_department_id(user_id)
+    with transaction.atomic():
+        for row in compute_rows(None, user_id=user_id):
+            record(
+                row.lesson_id, department_id, row.day, program_id=row.program_id,
+                **{name: -getattr(row, name) for name in COUNTERS}
+            )
+
+
+def move_lessons(lesson_ids, program_id):
+    """课程（或其主题）换到另一个项目时，修正汇总行上冗余的项目 id"""
+    DailyActivity.objects.filter(lesson_id__in=lesson_ids).update(program_id=program_id)
+
+
+# 读取
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def date_window(filters, default_days=None):
+    """仪表板时间筛选对应的日期范围 (start, end)，'all' 时为 None 或最近 default_days 天"""
+    today = timezone.localdate()
+    time_range = filters['time_range']
+    if time_range == 'custom':
+        start, end = _parse_date(filters['date_from']), _parse_date(filters['date_to'])
+        if start and end:
+            return start, end
+    elif time_range != 'all':
+        return today - timedelta(days=int(time_range)), today
+    if default_days:
+        return today - timedelta(days=default_days), today
+    return None
+
+
+def timeline(program_ids, start, end, department_ids=()):
+    """
+    按日汇总的时间序列：一天一行。
+    active_learners 是各课程活跃学员数之和（学员 × 课程），同一学员学了几课就计几次
+    """
+    activity = DailyActivity.objects.filter(
+        program_id__in=program_ids, day__gte=start, day__lte=end
+    )
+    if department_ids:
+        activity = activity.filter(department_id__in=department_ids)
+    return list(
+        activity.values('day').annotate(
+            completions=Sum('completions'),
+            quiz_submissions=Sum('quiz_submissions'),
+            graded_responses=Sum('graded_responses'),
+            active_learners=Sum('active_learners'),
+        ).order_by('day')
+    )
+
+
+def learner_timeline(program_ids, user_ids, start, end):
+    """
+    选中了具体学员时汇总表没有对应的维度，直接从这些学员的原始记录计算
+    （按 user 索引读取，行数受学员数限制）。活跃学员与汇总表一致，按课程计数。
+    """
+    start_at, end_at = day_bounds(start)[0], day_bounds(end)[1]
+    days = defaultdict(lambda: dict.fromkeys(
+        ('completions', 'quiz_submissions', 'graded_responses', 'active_learners'), 0
+    ))
+    active = set()
+
+    completed = LessonProgress.objects.filter(
+        user_id__in=user_ids, lesson__topic__program_id__in=program_ids, completed=True,
+        completed_at__gte=start_at, completed_at__lt=end_at
+    ).annotate(day=TruncDate('completed_at'))
+    for day, lesson_id, user_id in completed.values_list('day', 'lesson_id', 'user_id'):
+        days[day]['completions'] += 1
+        active.add((day, lesson_id, user_id))
+
+    responses = QuizResponse.objects.filter(
+        user_id__in=user_ids, quiz__lesson__topic__program_id__in=program_ids
+    )
+    submitted = responses.filter(
+        submitted_at__gte=start_at, submitted_at__lt=end_at
+    ).annotate(day=TruncDate('submitted_at'))
+    for day, lesson_id, user_id in submitted.values_list('day', 'quiz__lesson_id', 'user_id'):
+        days[day]['quiz_submissions'] += 1
+        active.add((day, lesson_id, user_id))
+
+    graded = responses.filter(grading_status='GRADED').annotate(
+        day=TruncDate(Coalesce('graded_at', 'submitted_at'))
+    ).filter(day__gte=start, day__lte=end)
+    for row in graded.values('day').annotate(total=Count('id')).order_by():
+        days[row['day']]['graded_responses'] += row['total']
+
+    for day, _, _ in active:
+        days[day]['active_learners'] += 1
+    return [dict(counters, day=day) for day, counters in sorted(days.items())]
+
+
+def active_program_ids(start, end, department_ids=()):
+    """在日期范围内有学习活动的项目"""
+    activity = DailyActivity.objects.filter(day__gte=start, day__lte=end).filter(
+        Q(completions__gt=0) | Q(quiz_submissions__gt=0) | Q(graded_responses__gt=0)
+    )
+    if department_ids:
+        activity = activity.filter(department_id__in=department_ids)
+    return activity.values('program_id')
@@ -0,0 +1,160 @@
+"""
+部门 × 项目汇总（DepartmentProgramStats）。
+
+每个单元格是 ProgramProgress 按 (program, 用户所在部门) 分组的合计：
+报名人数、完成人数、得分、待评分答卷数。progress.rollup 每次写入汇总行时
+计算该行对单元格贡献的变化并增量更新；整个项目重算时单元格随之重建。
+refresh_analytics_cube 命令可以定期全量校正。
+"""
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import DepartmentProgramStats, ProgramProgress
+
+User = get_user_model()
+
+COMPLETED = Q(lessons_total__gt=0, lessons_completed__gte=F('lessons_total'))
+
+# 计算贡献需要的汇总行字段（顺序与 contribution 的参数一致）
+ROW_FIELDS = (
+    'lessons_completed', 'lessons_total', 'points_earned', 'points_graded', 'quizzes_pending',
+)
+
+
+def contribution(lessons_completed, lessons_total, points_earned, points_graded,
+                 quizzes_pending, sign=1):
+    """一行 ProgramProgress 对所在单元格的贡献"""
+    completed = lessons_total > 0 and lessons_completed >= lessons_total
+    return Counter({
+        'enrolled_count': sign,
+        'completed_count': sign * int(completed),
+        'points_earned': sign * points_earned,
+        'points_graded': sign * points_graded,
+        'pending_grading': sign * quizzes_pending,
+    })
+
+
+def row_contributions(queryset, sign=1):
+    """queryset 中每行的贡献按单元格合计，返回 {(program_id, department_id): Counter}"""
+    cells = defaultdict(Counter)
+    for program_id, department_id, *values in queryset.values_list(
+            'program_id', 'user__department_id', *ROW_FIELDS):
+        cells[(program_id, department_id)].update(contribution(*values, sign=sign))
+    return cells
+
+
+def instance_contributions(rows):
+    """新计算出的 ProgramProgress 实例的贡献（部门从用户表读取）"""
+    departments = dict(
+        User.objects.filter(pk__in={row.user_id for row in rows}).values_list('id', 'department_id')
+    )
+    cells = defaultdict(Counter)
+    for row in rows:
+        cells[(row.program_id, departments.get(row.user_id))].update(
+            contribution(*(getattr(row, name) for name in ROW_FIELDS))
+        )
+    return cells
+
+
+def apply(cells):
+    """把贡献的变化写入单元格，单元格不存在时创建"""
+    now = timezone.now()
+    for (program_id, department_id), deltas in cells.items():
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            continue
+        cell = DepartmentProgramStats.objects.filter(
+            program_id=program_id, department_id=department_id
+        )
+        changes = {name: F(name) + value for name, value in deltas.items()}
+        if cell.update(updated_at=now, **changes):
+            continue
+        if any(value < 0 for value in deltas.values()):
+            continue
+        try:
+            with transaction.atomic():
+                DepartmentProgramStats.objects.create(
+                    program_id=program_id, department_id=department_id,
+                    updated_at=now, **deltas
+                )
+        except IntegrityError:
+            cell.update(updated_at=now, **changes)
+
+
+def merge(*cell_maps):
+    merged = defaultdict(Counter)
+    for cells in cell_maps:
+        for key, deltas in cells.items():
+            merged[key].update(deltas)
+    return merged
+
+
+def row_changed(program_id, user_id, deltas):
+    """
+    ProgramProgress 的一行刚被增量更新（deltas 为各字段的变化量）：
+    读取更新后的值，还原出更新前的值，只把两者贡献的差写入单元格。
+    """
+    row = ProgramProgress.objects.filter(user_id=user_id, program_id=program_id).values_list(
+        'user__department_id', *ROW_FIELDS
+    ).first()
+    if row is None:
+        return
+    department_id, *after = row
+    before = [value - deltas.get(name, 0) for name, value in zip(ROW_FIELDS, after)]
+    change = contribution(*after)
+    change.update(contribution(*before, sign=-1))
+    apply({(program_id, department_id): change})
+
+
+def move_user(user_id, old_department_id, new_department_id):
+    """用户换部门时，把其所有汇总行的贡献从原部门移到新部门"""
+    rows = ProgramProgress.objects.filter(user_id=user_id)
+    cells = defaultdict(Counter)
+    for program_id, *values in rows.values_list('program_id', *ROW_FIELDS):
+        cells[(program_id, old_department_id)].update(contribution(*values, sign=-1))
+        cells[(program_id, new_department_id)].update(contribution(*values))
+    apply(cells)
+
+
+def remove_user(user_id):
+    """删除用户前扣除其汇总行的贡献（汇总行随用户级联删除）"""
+    apply(row_contributions(ProgramProgress.objects.filter(user_id=user_id), sign=-1))
+
+
+def rebuild(program_ids=None):
+    """用一次分组查询重建单元格，program_ids 为 None 时重建全部。返回单元格数"""
+    progress = ProgramProgress.objects.all()
+    stale = DepartmentProgramStats.objects.all()
+    if program_ids is not None:
+        program_ids = list(program_ids)
+        progress = progress.filter(program_id__in=program_ids)
+        stale = stale.filter(program_id__in=program_ids)
+
+    now = timezone.now()
+    cells = [
+        DepartmentProgramStats(
+            program_id=row['program_id'],
+            department_id=row['user__department_id'],
+            enrolled_count=row['enrolled'],
+            completed_count=row['completed'],
+            points_earned=row['earned'] or 0,
+            points_graded=row['graded'] or 0,
+            pending_grading=row['pending'] or 0,
+            updated_at=now,
+        )
+        for row in progress.values('program_id', 'user__department_id').annotate(
+            enrolled=Count('id'),
+            completed=Count('id', filter=COMPLETED),
+            earned=Sum('points_earned'),
+            graded=Sum('points_graded'),
+            pending=Sum('quizzes_pending'),
+        ).order_by()
+    ]
+    with transaction.atomic():
+        stale.delete()
+        DepartmentProgramStats.objects.bulk_create(cells)
+    return len(cells)
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import enqueue
+from progress import activity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily activity rollup from lesson completions and quiz responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--program', type=int, action='append', dest='programs',
+            help='Only rebuild the given program id (can be repeated)'
+        )
+        parser.add_argument(
+            '--since', help='Only rebuild days on or after this date (YYYY-MM-DD)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the rebuild for run_jobs instead of running it now')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['since']}")
+        if options['background']:
+            job = enqueue(
+                'progress.rebuild_activity', program_ids=options['programs'],
+                since=since.isoformat() if since else None, batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(f'Job #{job.pk} {job.status}.'))
+            return
+        count = activity.rebuild(
+            options['programs'], since=since, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily activity rows.'))
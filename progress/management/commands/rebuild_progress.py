@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import enqueue
+from progress import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user, per-program progress rollup from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--program', type=int, action='append', dest='programs',
+            help='Only rebuild the given program id (can be repeated)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the rebuild for run_jobs instead of running it now')
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = enqueue(
+                'progress.rebuild', program_ids=options['programs'], batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(f'Job #{job.pk} {job.status}.'))
+            return
+        count = rollup.rebuild(options['programs'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} progress rows.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from progress import cube
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the department x program analytics cells from the progress rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--program', type=int, action='append', dest='programs',
+            help='Only rebuild the given program id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        count = cube.rebuild(options['programs'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} department x program cells.'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from progress.migrations._backfill import rebuild_program_progress
+
+
+def backfill(apps, schema_editor):
+    # 已有的报名在这里生成汇总行，之后由 signals 增量维护
+    rebuild_program_progress(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_remove_quiz_created_by_and_more'),
+        ('progress', '0002_alter_lessonprogress_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrolled_at', models.DateTimeField(blank=True, null=True)),
+                ('lessons_completed', models.PositiveIntegerField(default=0)),
+                ('lessons_total', models.PositiveIntegerField(default=0)),
+                ('quizzes_answered', models.PositiveIntegerField(default=0)),
+                ('quizzes_total', models.PositiveIntegerField(default=0)),
+                ('points_earned', models.PositiveIntegerField(default=0)),
+                ('points_graded', models.PositiveIntegerField(default=0, help_text='Maximum points of the graded responses')),
+                ('points_possible', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_rollups', to='courses.program')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='program_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'program')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_remove_quiz_created_by_and_more'),
+        ('progress', '0003_programprogress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='programprogress',
+            index=models.Index(fields=['program', 'user'], name='progress_program_user_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_hot_path_indexes'),
+        ('progress', '0004_programprogress_program_user_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['user', 'completed_at'], name='progress_lp_user_done_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+"""
+把 progress.ProgramEnrollment / progress.LessonProgress 的数据合并到
+courses.Enrollment / courses.LessonProgress，按主键分批处理。
+
+只使用历史模型；批量写入不会触发 signals，合并后在这里重建涉及的项目的进度汇总。
+"""
+from django.db import migrations
+
+from progress.migrations._backfill import rebuild_program_progress
+
+BATCH_SIZE = 1000
+
+
+def _chunks(queryset, batch_size=BATCH_SIZE):
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+        if not rows:
+            return
+        last_id = rows[-1].pk
+        yield rows
+
+
+def merge_legacy_rows(apps, schema_editor):
+    LegacyEnrollment = apps.get_model('progress', 'ProgramEnrollment')
+    LegacyLessonProgress = apps.get_model('progress', 'LessonProgress')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    Lesson = apps.get_model('courses', 'Lesson')
+
+    program_ids = set()
+
+    # 报名：已存在的 (user, program) 保留原记录，报名时间取两者中较早的一个
+    for rows in _chunks(LegacyEnrollment.objects.all()):
+        Enrollment.objects.bulk_create(
+            [Enrollment(user_id=row.user_id, program_id=row.program_id) for row in rows],
+            ignore_conflicts=True
+        )
+        # enrolled_at 是 auto_now_add，bulk_create 会写入当前时间，这里改回旧表的时间
+        legacy_dates = {(row.user_id, row.program_id): row.enrolled_at for row in rows}
+        updated = []
+        for enrollment in Enrollment.objects.filter(
+                user_id__in={row.user_id for row in rows},
+                program_id__in={row.program_id for row in rows}):
+            enrolled_at = legacy_dates.get((enrollment.user_id, enrollment.program_id))
+            if enrolled_at and enrolled_at < enrollment.enrolled_at:
+                enrollment.enrolled_at = enrolled_at
+                updated.append(enrollment)
+        Enrollment.objects.bulk_update(updated, ['enrolled_at'])
+        program_ids.update(row.program_id for row in rows)
+
+    # 课程完成情况：新记录直接插入；已存在但未完成的，以旧表的完成状态为准
+    for rows in _chunks(LegacyLessonProgress.objects.all()):
+        existing = {
+            (progress.user_id, progress.lesson_id): progress
+            for progress in LessonProgress.objects.filter(
+                user_id__in={row.user_id for row in rows},
+                lesson_id__in={row.lesson_id for row in rows},
+            )
+        }
+        new, updated = [], []
+        for row in rows:
+            progress = existing.get((row.user_id, row.lesson_id))
+            if progress is None:
+                new.append(LessonProgress(
+                    user_id=row.user_id, lesson_id=row.lesson_id,
+                    completed=row.completed, completed_at=row.completed_at
+                ))
+            elif row.completed and not progress.completed:
+                progress.completed = True
+                progress.completed_at = row.completed_at
+                updated.append(progress)
+        LessonProgress.objects.bulk_create(new, ignore_conflicts=True)
+        LessonProgress.objects.bulk_update(updated, ['completed', 'completed_at'])
+        program_ids.update(
+            Lesson.objects.filter(id__in={row.lesson_id for row in rows})
+            .values_list('topic__program_id', flat=True)
+        )
+
+    if program_ids:
+        rebuild_program_progress(apps, program_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_hot_path_indexes'),
+        ('progress', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_legacy_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0006_merge_legacy_progress'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='programenrollment',
+            unique_together=None,
+        ),
+        migrations.RemoveField(
+            model_name='programenrollment',
+            name='program',
+        ),
+        migrations.RemoveField(
+            model_name='programenrollment',
+            name='user',
+        ),
+        migrations.DeleteModel(
+            name='LessonProgress',
+        ),
+        migrations.DeleteModel(
+            name='ProgramEnrollment',
+        ),
+    ]
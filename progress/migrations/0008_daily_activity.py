@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from progress.migrations._backfill import rebuild_daily_activity
+
+
+def backfill(apps, schema_editor):
+    rebuild_daily_activity(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_department'),
+        ('courses', '0005_programsearchdocument'),
+        ('progress', '0007_delete_legacy_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('completions', models.PositiveIntegerField(default=0)),
+                ('quiz_submissions', models.PositiveIntegerField(default=0)),
+                ('graded_responses', models.PositiveIntegerField(default=0)),
+                ('points_earned', models.PositiveIntegerField(default=0)),
+                ('points_graded', models.PositiveIntegerField(default=0, help_text='Maximum points of the graded responses')),
+                ('active_learners', models.PositiveIntegerField(default=0, help_text='Learners who completed the lesson or answered one of its quizzes that day')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_activity', to='accounts.department')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='courses.lesson')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='courses.program')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['program', 'day'], name='daily_activity_program_idx')],
+                'constraints': [models.UniqueConstraint(fields=('lesson', 'department', 'day'), name='daily_activity_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from progress.migrations._backfill import rebuild_department_stats, rebuild_program_progress
+
+
+def backfill(apps, schema_editor):
+    # 重建汇总行以填入 quizzes_pending，再按部门合计
+    rebuild_program_progress(apps)
+    rebuild_department_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_department'),
+        ('courses', '0005_programsearchdocument'),
+        ('progress', '0008_daily_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programprogress',
+            name='quizzes_pending',
+            field=models.PositiveIntegerField(default=0, help_text='Responses waiting for manual grading'),
+        ),
+        migrations.CreateModel(
+            name='DepartmentProgramStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrolled_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('points_earned', models.PositiveIntegerField(default=0)),
+                ('points_graded', models.PositiveIntegerField(default=0, help_text='Maximum points of the graded responses')),
+                ('pending_grading', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='program_stats', to='accounts.department')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='department_stats', to='courses.program')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('program', 'department'), name='department_program_stats_unique')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from progress.migrations._backfill import rebuild_department_stats
+
+
+def remove_duplicate_cells(apps, schema_editor):
+    """
+    并发创建可能留下多个“无部门”单元格，之后的增量会同时加到每一行上，
+    计数已经不可信：删除多余的行后重新计算这些项目的单元格
+    """
+    DepartmentProgramStats = apps.get_model('progress', 'DepartmentProgramStats')
+    duplicates = DepartmentProgramStats.objects.filter(department__isnull=True).values(
+        'program_id'
+    ).annotate(rows=Count('id'), keep=Min('id')).filter(rows__gt=1)
+    program_ids = []
+    for row in duplicates:
+        DepartmentProgramStats.objects.filter(
+            program_id=row['program_id'], department__isnull=True
+        ).exclude(pk=row['keep']).delete()
+        program_ids.append(row['program_id'])
+    if program_ids:
+        rebuild_department_stats(apps, program_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_department'),
+        ('courses', '0005_programsearchdocument'),
+        ('progress', '0010_progress_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_cells, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='departmentprogramstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('department__isnull', True)), fields=('program',), name='department_program_stats_no_department_unique'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from progress.migrations._backfill import rebuild_daily_activity
+
+
+def remove_duplicate_buckets(apps, schema_editor):
+    """
+    并发创建可能留下多个“无部门”的桶，之后的增量会同时加到每一行上，
+    计数已经不可信：删除多余的行后重新计算这些项目的汇总
+    """
+    DailyActivity = apps.get_model('progress', 'DailyActivity')
+    duplicates = DailyActivity.objects.filter(department__isnull=True).values(
+        'lesson_id', 'day'
+    ).annotate(rows=Count('id'), keep=Min('id'), program=Min('program_id')).filter(rows__gt=1)
+    program_ids = set()
+    for row in duplicates:
+        DailyActivity.objects.filter(
+            lesson_id=row['lesson_id'], day=row['day'], department__isnull=True
+        ).exclude(pk=row['keep']).delete()
+        program_ids.add(row['program'])
+    if program_ids:
+        rebuild_daily_activity(apps, program_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_department'),
+        ('courses', '0005_programsearchdocument'),
+        ('progress', '0011_department_program_stats_no_department_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(condition=models.Q(('department__isnull', True)), fields=('lesson', 'day'), name='daily_activity_no_department_unique'),
+        ),
+    ]
@@ -0,0 +1,211 @@
+"""
+迁移中回填汇总表。
+
+只使用调用方传入的历史模型（apps），不导入当前的 progress.rollup / progress.activity /
+progress.cube（之后的迁移还会修改相关模型），计算规则与它们的 compute_rows / rebuild 相同。
+rebuild_progress、backfill_activity、refresh_analytics_cube 命令只用于之后的修复。
+以下划线开头的模块不会被当作迁移加载。
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+ACTIVITY_COUNTERS = (
+    'completions', 'quiz_submissions', 'graded_responses',
+    'points_earned', 'points_graded', 'active_learners',
+)
+
+
+def _has_field(model, name):
+    return any(field.name == name for field in model._meta.get_fields())
+
+
+def rebuild_program_progress(apps, program_ids=None):
+    """重建 ProgramProgress，program_ids 为 None 时重建全部；quizzes_pending 字段存在时一并计算"""
+    ProgramProgress = apps.get_model('progress', 'ProgramProgress')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    Quiz = apps.get_model('courses', 'Quiz')
+    QuizResponse = apps.get_model('courses', 'QuizResponse')
+
+    stale = ProgramProgress.objects.all()
+    enrollments = Enrollment.objects.all()
+    lessons = Lesson.objects.all()
+    quizzes = Quiz.objects.all()
+    completed = LessonProgress.objects.filter(completed=True)
+    responses = QuizResponse.objects.all()
+    if program_ids is not None:
+        program_ids = list(program_ids)
+        stale = stale.filter(program_id__in=program_ids)
+        enrollments = enrollments.filter(program_id__in=program_ids)
+        lessons = lessons.filter(topic__program_id__in=program_ids)
+        quizzes = quizzes.filter(lesson__topic__program_id__in=program_ids)
+        completed = completed.filter(lesson__topic__program_id__in=program_ids)
+        responses = responses.filter(quiz__lesson__topic__program_id__in=program_ids)
+
+    lesson_totals = dict(
+        lessons.values('topic__program_id').annotate(total=Count('id'))
+        .order_by().values_list('topic__program_id', 'total')
+    )
+    quiz_totals = {
+        row['lesson__topic__program_id']: row
+        for row in quizzes.values('lesson__topic__program_id')
+        .annotate(total=Count('id'), points=Sum('points')).order_by()
+    }
+    lesson_stats = {
+        (row['user_id'], row['lesson__topic__program_id']): row
+        for row in completed.values('user_id', 'lesson__topic__program_id').annotate(
+            total=Count('id'), last=Max('completed_at')
+        ).order_by()
+    }
+    response_stats = {
+        (row['user_id'], row['quiz__lesson__topic__program_id']): row
+        for row in responses.values('user_id', 'quiz__lesson__topic__program_id').annotate(
+            total=Count('id'),
+            earned=Sum('points_earned'),
+            graded=Sum('quiz__points', filter=Q(grading_status='GRADED')),
+            pending=Count('id', filter=Q(grading_status='PENDING')),
+            last=Max('submitted_at'),
+        ).order_by()
+    }
+    with_pending = _has_field(ProgramProgress, 'quizzes_pending')
+
+    rows = []
+    for user_id, program_id, enrolled_at in enrollments.values_list(
+            'user_id', 'program_id', 'enrolled_at').iterator():
+        totals = quiz_totals.get(program_id, {})
+        done = lesson_stats.get((user_id, program_id), {})
+        answers = response_stats.get((user_id, program_id), {})
+        activity = [ts for ts in (done.get('last'), answers.get('last')) if ts]
+        row = ProgramProgress(
+            user_id=user_id,
+            program_id=program_id,
+            enrolled_at=enrolled_at,
+            lessons_completed=done.get('total', 0),
+            lessons_total=lesson_totals.get(program_id, 0),
+            quizzes_answered=answers.get('total', 0),
+            quizzes_total=totals.get('total', 0),
+            points_earned=answers.get('earned') or 0,
+            points_graded=answers.get('graded') or 0,
+            points_possible=totals.get('points') or 0,
+            last_activity=max(activity) if activity else None,
+        )
+        if with_pending:
+            row.quizzes_pending = answers.get('pending', 0)
+        rows.append(row)
+
+    stale.delete()
+    ProgramProgress.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_department_stats(apps, program_ids=None):
+    """用 ProgramProgress 的分组合计重建部门 × 项目单元格"""
+    ProgramProgress = apps.get_model('progress', 'ProgramProgress')
+    DepartmentProgramStats = apps.get_model('progress', 'DepartmentProgramStats')
+
+    progress = ProgramProgress.objects.all()
+    stale = DepartmentProgramStats.objects.all()
+    if program_ids is not None:
+        program_ids = list(program_ids)
+        progress = progress.filter(program_id__in=program_ids)
+        stale = stale.filter(program_id__in=program_ids)
+
+    completed = Q(lessons_total__gt=0, lessons_completed__gte=F('lessons_total'))
+    now = timezone.now()
+    cells = [
+        DepartmentProgramStats(
+            program_id=row['program_id'],
+            department_id=row['user__department_id'],
+            enrolled_count=row['enrolled'],
+            completed_count=row['completed'],
+            points_earned=row['earned'] or 0,
+            points_graded=row['graded'] or 0,
+            pending_grading=row['pending'] or 0,
+            updated_at=now,
+        )
+        for row in progress.values('program_id', 'user__department_id').annotate(
+            enrolled=Count('id'),
+            completed=Count('id', filter=completed),
+            earned=Sum('points_earned'),
+            graded=Sum('points_graded'),
+            pending=Sum('quizzes_pending'),
+        ).order_by()
+    ]
+    stale.delete()
+    DepartmentProgramStats.objects.bulk_create(cells, batch_size=BATCH_SIZE)
+    return len(cells)
+
+
+def rebuild_daily_activity(apps, program_ids=None):
+    """按 (课程, 用户当前部门, 日期) 重建 DailyActivity"""
+    DailyActivity = apps.get_model('progress', 'DailyActivity')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    QuizResponse = apps.get_model('courses', 'QuizResponse')
+
+    stale = DailyActivity.objects.all()
+    completed = LessonProgress.objects.filter(completed=True, completed_at__isnull=False)
+    submitted = QuizResponse.objects.all()
+    if program_ids is not None:
+        program_ids = list(program_ids)
+        stale = stale.filter(program_id__in=program_ids)
+        completed = completed.filter(lesson__topic__program_id__in=program_ids)
+        submitted = submitted.filter(quiz__lesson__topic__program_id__in=program_ids)
+    graded = submitted.filter(grading_status='GRADED').annotate(
+        graded_day=TruncDate(Coalesce('graded_at', 'submitted_at'))
+    )
+
+    buckets = defaultdict(lambda: dict.fromkeys(ACTIVITY_COUNTERS, 0))
+    programs = {}
+    active = defaultdict(set)
+
+    for row in completed.annotate(day=TruncDate('completed_at')).values(
+            'lesson_id', 'lesson__topic__program_id', 'user__department_id', 'day', 'user_id'
+    ).order_by().iterator(chunk_size=2000):
+        key = (row['lesson_id'], row['user__department_id'], row['day'])
+        programs[key] = row['lesson__topic__program_id']
+        buckets[key]['completions'] += 1
+        active[key].add(row['user_id'])
+
+    for row in submitted.annotate(day=TruncDate('submitted_at')).values(
+            'quiz__lesson_id', 'quiz__lesson__topic__program_id', 'user__department_id', 'day'
+    ).annotate(total=Count('id')).order_by():
+        key = (row['quiz__lesson_id'], row['user__department_id'], row['day'])
+        programs[key] = row['quiz__lesson__topic__program_id']
+        buckets[key]['quiz_submissions'] += row['total']
+
+    for lesson_id, department_id, day, user_id in submitted.annotate(
+            day=TruncDate('submitted_at')).values_list(
+            'quiz__lesson_id', 'user__department_id', 'day', 'user_id'
+    ).distinct().order_by().iterator(chunk_size=2000):
+        active[(lesson_id, department_id, day)].add(user_id)
+
+    for row in graded.values(
+            'quiz__lesson_id', 'quiz__lesson__topic__program_id', 'user__department_id',
+            'graded_day'
+    ).annotate(
+        total=Count('id'), earned=Sum('points_earned'), possible=Sum('quiz__points')
+    ).order_by():
+        key = (row['quiz__lesson_id'], row['user__department_id'], row['graded_day'])
+        programs[key] = row['quiz__lesson__topic__program_id']
+        buckets[key]['graded_responses'] += row['total']
+        buckets[key]['points_earned'] += row['earned'] or 0
+        buckets[key]['points_graded'] += row['possible'] or 0
+
+    for key, users in active.items():
+        buckets[key]['active_learners'] = len(users)
+
+    stale.delete()
+    DailyActivity.objects.bulk_create([
+        DailyActivity(
+            lesson_id=lesson_id, department_id=department_id, day=day,
+            program_id=programs[(lesson_id, department_id, day)], **counters
+        )
+        for (lesson_id, department_id, day), counters in buckets.items()
+    ], batch_size=BATCH_SIZE)
+    return len(buckets)
@@ -2,24 +2,186 @@ from django.db import models
 from django.conf import settings
 from courses.models import Program, Lesson
 
-class ProgramEnrollment(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    program = models.ForeignKey('courses.Program', on_delete=models.CASCADE)
-    enrolled_at = models.DateTimeField(auto_now_add=True)
-    completed = models.BooleanField(default=False)
-    
+class ProgramProgress(models.Model):
+    """每个用户在每个项目上的进度汇总，由 signals 增量维护"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='program_progress'
+    )
+    program = models.ForeignKey(
+        'courses.Program',
+        on_delete=models.CASCADE,
+        related_name='progress_rollups'
+    )
+    enrolled_at = models.DateTimeField(null=True, blank=True)
+    lessons_completed = models.PositiveIntegerField(default=0)
+    lessons_total = models.PositiveIntegerField(default=0)
+    quizzes_answered = models.PositiveIntegerField(default=0)
+    quizzes_total = models.PositiveIntegerField(default=0)
+    quizzes_pending = models.PositiveIntegerField(
+        default=0,
+        help_text="Responses waiting for manual grading"
+    )
+    points_earned = models.PositiveIntegerField(default=0)
+    points_graded = models.PositiveIntegerField(
+        default=0,
+        help_text="Maximum points of the graded responses"
+    )
+    points_possible = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         unique_together = ['user', 'program']
+        indexes = [
+            # 管理员进度列表按 (program, user) 做键集分页
+            models.Index(fields=['program', 'user'], name='progress_program_user_idx'),
+        ]
 
-class LessonProgress(models.Model):
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, 
+    @property
+    def progress_percentage(self):
+        if self.lessons_total == 0:
+            return 0
+        return self.lessons_completed / self.lessons_total * 100
+
+    @property
+    def quiz_score(self):
+        if self.points_graded == 0:
+            return 0
+        return self.points_earned / self.points_graded * 100
+
+    @property
+    def completed(self):
+        return self.lessons_total > 0 and self.lessons_completed >= self.lessons_total
+
+    def __str__(self):
+        return f"{self.user} - {self.program}: {self.lessons_completed}/{self.lessons_total}"
+
+
+class DailyActivity(models.Model):
+    """
+    每个 (课程, 部门, 日期) 的学习活动汇总，由 signals 增量维护，backfill_activity 重建。
+    部门取用户当前所在的部门：用户换部门时历史随之移动，删除用户时扣除其活动。
+    """
+    day = models.DateField()
+    program = models.ForeignKey(
+        'courses.Program',
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    lesson = models.ForeignKey(
+        'courses.Lesson',
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    department = models.ForeignKey(
+        'accounts.Department',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_activity'
+    )
+    completions = models.PositiveIntegerField(default=0)
+    quiz_submissions = models.PositiveIntegerField(default=0)
+    # 按评分日期统计
+    graded_responses = models.PositiveIntegerField(default=0)
+    points_earned = models.PositiveIntegerField(default=0)
+    points_graded = models.PositiveIntegerField(
+        default=0,
+        help_text="Maximum points of the graded responses"
+    )
+    active_learners = models.PositiveIntegerField(
+        default=0,
+        help_text="Learners who completed the lesson or answered one of its quizzes that day"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lesson', 'department', 'day'], name='daily_activity_bucket_unique'
+            ),
+            # NULL 之间互不相等，上面的约束不限制“无部门”的桶
+            models.UniqueConstraint(
+                fields=['lesson', 'day'], condition=models.Q(department__isnull=True),
+                name='daily_activity_no_department_unique'
+            ),
+        ]
+        indexes = [
+            # 仪表板按项目和时间范围读取
+            models.Index(fields=['program', 'day'], name='daily_activity_program_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.lesson_id} / {self.department_id} @ {self.day}"
+
+
+class DepartmentProgramStats(models.Model):
+    """
+    部门 × 项目的汇总（progress.cube 维护），即 ProgramProgress 按 (program, 用户部门) 的分组结果。
+    没有部门的用户计入 department 为空的行。
+    """
+    program = models.ForeignKey(
+        'courses.Program',
         on_delete=models.CASCADE,
-        related_name='progress_lesson_progress'
+        related_name='department_stats'
+    )
+    department = models.ForeignKey(
+        'accounts.Department',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='program_stats'
+    )
+    enrolled_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    points_earned = models.PositiveIntegerField(default=0)
+    points_graded = models.PositiveIntegerField(
+        default=0,
+        help_text="Maximum points of the graded responses"
     )
-    lesson = models.ForeignKey('courses.Lesson', on_delete=models.CASCADE)
-    completed = models.BooleanField(default=False)
-    completed_at = models.DateTimeField(null=True, blank=True)
-    
+    pending_grading = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
-        unique_together = ['user', 'lesson']
\ No newline at end of file
+        constraints = [
+            models.UniqueConstraint(
+                fields=['program', 'department'], name='department_program_stats_unique'
+            ),
+            # NULL 之间互不相等，上面的约束不限制“无部门”的单元格
+            models.UniqueConstraint(
+                fields=['program'], condition=models.Q(department__isnull=True),
+                name='department_program_stats_no_department_unique'
+            ),
+        ]
+
+    @property
+    def completion_rate(self):
+        if self.enrolled_count == 0:
+            return 0
+        return self.completed_count / self.enrolled_count * 100
+
+    @property
+    def quiz_score(self):
+        if self.points_graded == 0:
+            return 0
+        return self.points_earned / self.points_graded * 100
+
+    def __str__(self):
+        return f"{self.program_id} / {self.department_id}: {self.enrolled_count}"
+
+
+class ProgressVersion(models.Model):
+    """
+    用户学习数据的版本号（progress.versions），报名、学习记录或答卷（含评分）变化时
+    在同一事务中递增；课程页面的 ETag / Last-Modified 由它和课程结构版本号组成。
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='progress_version'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+
+from courses.models import Enrollment, Lesson, LessonProgress, Quiz, QuizResponse
+from . import cube
+from .models import ProgramProgress
+
+# 影响部门 × 项目汇总的字段
+CUBE_FIELDS = ('lessons_completed', 'points_earned', 'points_graded', 'quizzes_pending')
+
+
+def compute_rows(program_ids, user_ids=None):
+    """
+    用分组查询重新计算进度汇总行（未保存）。
+    只为已报名的 (user, program) 生成记录。
+    """
+    program_ids = list(program_ids)
+    enrollments = Enrollment.objects.filter(program_id__in=program_ids)
+    completed = LessonProgress.objects.filter(
+        lesson__topic__program_id__in=program_ids,
+        completed=True
+    )
+    responses = QuizResponse.objects.filter(quiz__lesson__topic__program_id__in=program_ids)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        enrollments = enrollments.filter(user_id__in=user_ids)
+        completed = completed.filter(user_id__in=user_ids)
+        responses = responses.filter(user_id__in=user_ids)
+
+    lesson_totals = dict(
+        Lesson.objects.filter(topic__program_id__in=program_ids)
+        .values('topic__program_id').annotate(total=Count('id'))
+        .order_by().values_list('topic__program_id', 'total')
+    )
+    quiz_totals = {
+        row['lesson__topic__program_id']: row
+        for row in Quiz.objects.filter(lesson__topic__program_id__in=program_ids)
+        .values('lesson__topic__program_id')
+        .annotate(total=Count('id'), points=Sum('points')).order_by()
+    }
+    lesson_stats = {
+        (row['user_id'], row['lesson__topic__program_id']): row
+        for row in completed.values('user_id', 'lesson__topic__program_id').annotate(
+            total=Count('id'), last=Max('completed_at')
+        ).order_by()
+    }
+    response_stats = {
+        (row['user_id'], row['quiz__lesson__topic__program_id']): row
+        for row in responses.values('user_id', 'quiz__lesson__topic__program_id').annotate(
+            total=Count('id'),
+            earned=Sum('points_earned'),
+            graded=Sum('quiz__points', filter=Q(grading_status='GRADED')),
+            pending=Count('id', filter=Q(grading_status='PENDING')),
+            last=Max('submitted_at'),
+        ).order_by()
+    }
+
+    rows = []
+    for user_id, program_id, enrolled_at in enrollments.values_list(
+            'user_id', 'program_id', 'enrolled_at'):
+        quizzes = quiz_totals.get(program_id, {})
+        lessons = lesson_stats.get((user_id, program_id), {})
+        answers = response_stats.get((user_id, program_id), {})
+        activity = [ts for ts in (lessons.get('last'), answers.get('last')) if ts]
+        rows.append(ProgramProgress(
+            user_id=user_id,
+            program_id=program_id,
+            enrolled_at=enrolled_at,
+            lessons_completed=lessons.get('total', 0),
+            lessons_total=lesson_totals.get(program_id, 0),
+            quizzes_answered=answers.get('total', 0),
+            quizzes_total=quizzes.get('total', 0),
+            quizzes_pending=answers.get('pending', 0),
+            points_earned=answers.get('earned') or 0,
+            points_graded=answers.get('graded') or 0,
+            points_possible=quizzes.get('points') or 0,
+            last_activity=max(activity) if activity else None,
+        ))
+    return rows
+
+
+def rebuild(program_ids=None, batch_size=1000):
+    """从头重建汇总表，program_ids 为 None 时重建全部"""
+    stale = ProgramProgress.objects.all()
+    full = program_ids is None
+    if full:
+        program_ids = Enrollment.objects.values_list('program_id', flat=True).distinct()
+    else:
+        stale = stale.filter(program_id__in=program_ids)
+    program_ids = list(program_ids)
+
+    with transaction.atomic():
+        stale.delete()
+        rows = compute_rows(program_ids) if program_ids else []
+        ProgramProgress.objects.bulk_create(rows, batch_size=batch_size)
+        cube.rebuild(None if full else program_ids)
+    return len(rows)
+
+
+def refresh_program(program_id):
+    if program_id is not None:
+        rebuild([program_id])
+
+
+def refresh_pairs(pairs):
+    """重新计算指定的 (user_id, program_id) 行"""
+    users_by_program = defaultdict(set)
+    for user_id, program_id in pairs:
+        users_by_program[program_id].add(user_id)
+
+    with transaction.atomic():
+        for program_id, user_ids in users_by_program.items():
+            stale = ProgramProgress.objects.filter(program_id=program_id, user_id__in=user_ids)
+            removed = cube.row_contributions(stale, sign=-1)
+            stale.delete()
+            rows = compute_rows([program_id], user_ids)
+            ProgramProgress.objects.bulk_create(rows)
+            cube.apply(cube.merge(removed, cube.instance_contributions(rows)))
+
+
+def remove_pairs(program_id, user_ids):
+    """取消报名后删除汇总行，并从部门 × 项目汇总中扣除"""
+    with transaction.atomic():
+        rows = ProgramProgress.objects.filter(program_id=program_id, user_id__in=user_ids)
+        cube.apply(cube.row_contributions(rows, sign=-1))
+        rows.delete()
+
+
+def _deltas(fields):
+    return {
+        name: F(name) + value
+        for name, value in fields.items()
+        if value
+    }
+
+
+def adjust(user_id, program_id, last_activity=None, **deltas):
+    """
+    对单行汇总做 O(1) 增量更新。已报名但还没有汇总行时（如汇总表建立之前的报名）
+    按原始记录重新计算这一行，而不是跳过；未报名的用户没有汇总行。
+    """
+    changes = _deltas(deltas)
+    if last_activity:
+        changes['last_activity'] = last_activity
+    if not changes:
+        return
+    updated = ProgramProgress.objects.filter(
+        user_id=user_id, program_id=program_id
+    ).update(**changes)
+    if not updated:
+        if Enrollment.objects.filter(user_id=user_id, program_id=program_id).exists():
+            refresh_pairs([(user_id, program_id)])
+    elif any(deltas.get(name) for name in CUBE_FIELDS):
+        cube.row_changed(program_id, user_id, deltas)
+
+
+def adjust_program(program_id, **deltas):
+    """对一个项目的全部汇总行做增量更新（课程或测验增删时）"""
+    changes = _deltas(deltas)
+    if changes:
+        ProgramProgress.objects.filter(program_id=program_id).update(**changes)
+        if deltas.get('lessons_total'):
+            # 课程总数变化会改变每行是否已完成
+            cube.rebuild([program_id])
@@ -0,0 +1,409 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import Department
+from courses.models import (
+    Enrollment, Lesson, LessonProgress, Quiz, QuizChoice, QuizResponse, Topic
+)
+from courses.signals import enrollments_changed, is_bulk_delete, quiz_responses_changed
+from . import activity, cube, rollup, versions
+from .models import ProgressVersion
+
+User = get_user_model()
+
+
+def _is_direct_delete(origin, model):
+    """
+    级联删除时由发起删除的对象负责更新汇总，批量删除（mark_bulk_delete）时由随后的
+    enrollments_changed 等信号负责，避免每个被删除的行各自触发一次查询。
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is model and not is_bulk_delete(origin)
+    return isinstance(origin, model)
+
+
+def _lesson_program_id(lesson_id):
+    return Lesson.objects.filter(pk=lesson_id).values_list(
+        'topic__program_id', flat=True
+    ).first()
+
+
+def _quiz_program(response):
+    """答卷所属项目 id、课程 id 和测验分值；视图已经 select_related 时不再查询"""
+    quiz = response.quiz if QuizResponse.quiz.is_cached(response) else None
+    if quiz and Quiz.lesson.is_cached(quiz) and Lesson.topic.is_cached(quiz.lesson):
+        return quiz.lesson.topic.program_id, quiz.lesson_id, quiz.points
+    return Quiz.objects.filter(pk=response.quiz_id).values_list(
+        'lesson__topic__program_id', 'lesson_id', 'points'
+    ).first()
+
+
+# 报名
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    if created:
+        rollup.refresh_pairs([(instance.user_id, instance.program_id)])
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Enrollment):
+        rollup.remove_pairs(instance.program_id, [instance.user_id])
+
+
+@receiver(enrollments_changed)
+def enrollments_bulk_changed(sender, program, user_ids, action, **kwargs):
+    if action == 'enroll':
+        rollup.refresh_pairs((user_id, program.pk) for user_id in user_ids)
+    else:
+        rollup.remove_pairs(program.pk, user_ids)
+
+
+# 课程完成情况
+@receiver(pre_save, sender=LessonProgress)
+def remember_lesson_progress(sender, instance, **kwargs):
+    # 保存前已完成时记录完成时间，取消完成时从对应日期的活动中扣除
+    instance._previous_completed_at = None
+    if instance.pk:
+        instance._previous_completed_at = sender.objects.filter(
+            pk=instance.pk, completed=True
+        ).values_list('completed_at', flat=True).first()
+    instance._was_completed = instance._previous_completed_at is not None
+
+
+@receiver(post_save, sender=LessonProgress)
+def lesson_progress_saved(sender, instance, **kwargs):
+    delta = int(instance.completed) - int(getattr(instance, '_was_completed', False))
+    if not delta:
+        return
+    program_id = _lesson_program_id(instance.lesson_id)
+    rollup.adjust(
+        instance.user_id,
+        program_id,
+        last_activity=instance.completed_at or timezone.now(),
+        lessons_completed=delta,
+    )
+    activity.record_activity(
+        instance.user_id,
+        instance.lesson_id,
+        instance.completed_at if delta > 0 else instance._previous_completed_at,
+        program_id=program_id,
+        added=delta > 0,
+        exclude_progress=instance.pk,
+        completions=delta,
+    )
+
+
+@receiver(post_delete, sender=LessonProgress)
+def lesson_progress_deleted(sender, instance, origin=None, **kwargs):
+    if instance.completed and _is_direct_delete(origin, LessonProgress):
+        program_id = _lesson_program_id(instance.lesson_id)
+        rollup.adjust(
+            instance.user_id,
+            program_id,
+            lessons_completed=-1,
+        )
+        activity.record_activity(
+            instance.user_id,
+            instance.lesson_id,
+            instance.completed_at,
+            program_id=program_id,
+            added=False,
+            exclude_progress=instance.pk,
+            completions=-1,
+        )
+
+
+# 测验答卷
+@receiver(pre_save, sender=QuizResponse)
+def remember_quiz_response(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = sender.objects.filter(pk=instance.pk).values(
+            'points_earned', 'grading_status', 'graded_at'
+        ).first()
+
+
+@receiver(post_save, sender=QuizResponse)
+def quiz_response_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None) or {}
+    program_id, lesson_id, points = _quiz_program(instance)
+    was_graded = previous.get('grading_status') == 'GRADED'
+    is_graded = instance.grading_status == 'GRADED'
+    was_pending = previous.get('grading_status') == 'PENDING'
+    is_pending = instance.grading_status == 'PENDING'
+
+    rollup.adjust(
+        instance.user_id,
+        program_id,
+        last_activity=timezone.now(),
+        quizzes_answered=1 if created else 0,
+        quizzes_pending=int(is_pending) - int(was_pending),
+        points_earned=(instance.points_earned or 0) - (previous.get('points_earned') or 0),
+        points_graded=(int(is_graded) - int(was_graded)) * points,
+    )
+
+    if created:
+        activity.record_activity(
+            instance.user_id, lesson_id, instance.submitted_at, program_id=program_id,
+            exclude_response=instance.pk, quiz_submissions=1,
+        )
+    # 评分按评分日期统计：从原来的日期扣除，再计入新的日期
+    before = (
+        activity.graded_contribution(
+            previous.get('grading_status'), previous.get('points_earned'), points
+        ),
+        previous.get('graded_at') or instance.submitted_at,
+    )
+    after = (
+        activity.graded_contribution(instance.grading_status, instance.points_earned, points),
+        instance.graded_at or instance.submitted_at,
+    )
+    if before != after:
+        activity.record_grading(
+            instance.user_id, lesson_id, before[1], before[0], program_id=program_id, sign=-1
+        )
+        activity.record_grading(
+            instance.user_id, lesson_id, after[1], after[0], program_id=program_id
+        )
+
+
+@receiver(post_delete, sender=QuizResponse)
+def quiz_response_deleted(sender, instance, origin=None, **kwargs):
+    if not _is_direct_delete(origin, QuizResponse):
+        return
+    program_id, lesson_id, points = _quiz_program(instance)
+    rollup.adjust(
+        instance.user_id,
+        program_id,
+        quizzes_answered=-1,
+        quizzes_pending=-1 if instance.grading_status == 'PENDING' else 0,
+        points_earned=-(instance.points_earned or 0),
+        points_graded=-points if instance.grading_status == 'GRADED' else 0,
+    )
+    activity.record_activity(
+        instance.user_id, lesson_id, instance.submitted_at, program_id=program_id,
+        added=False, exclude_response=instance.pk, quiz_submissions=-1,
+    )
+    activity.record_grading(
+        instance.user_id, lesson_id, instance.graded_at or instance.submitted_at,
+        activity.graded_contribution(instance.grading_status, instance.points_earned, points),
+        program_id=program_id, sign=-1,
+    )
+
+
+@receiver(quiz_responses_changed)
+def quiz_responses_bulk_changed(sender, responses, previous=None, **kwargs):
+    quiz_ids = {response.quiz_id for response in responses}
+    programs = dict(
+        Quiz.objects.filter(pk__in=quiz_ids).values_list('id', 'lesson__topic__program_id')
+    )
+    rollup.refresh_pairs(
+        {(response.user_id, programs[response.quiz_id]) for response in responses}
+    )
+    activity.responses_changed(responses, previous)
+
+
+# 课程结构变化
+# 查询集删除（Lesson.objects.filter(...).delete()）会逐行发送 post_delete：
+# pre_delete 时一次查出涉及的项目记在 origin 上，第一个 post_delete（此时所有行都已删除）
+# 刷新这些项目，其余行不再处理，每个项目只刷新一次
+DELETED_PROGRAM_LOOKUPS = {
+    Topic: 'program_id',
+    Lesson: 'topic__program_id',
+    Quiz: 'lesson__topic__program_id',
+}
+
+
+@receiver(pre_delete, sender=Topic)
+@receiver(pre_delete, sender=Lesson)
+@receiver(pre_delete, sender=Quiz)
+def remember_deleted_programs(sender, instance, origin=None, **kwargs):
+    if (isinstance(origin, QuerySet) and _is_direct_delete(origin, sender)
+            and not hasattr(origin, '_deleted_program_ids')):
+        origin._deleted_program_ids = set(
+            origin.values_list(DELETED_PROGRAM_LOOKUPS[sender], flat=True)
+        )
+
+
+def _deleted_program_ids(origin, get_program_id):
+    """post_delete 中需要刷新的项目；单个对象删除时调用 get_program_id()"""
+    if isinstance(origin, QuerySet):
+        return origin.__dict__.pop('_deleted_program_ids', set())
+    return {get_program_id()}
+
+
+@receiver(pre_save, sender=Topic)
+def remember_topic_program(sender, instance, **kwargs):
+    instance._previous_program_id = None
+    if instance.pk:
+        instance._previous_program_id = sender.objects.filter(pk=instance.pk).values_list(
+            'program_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Topic)
+def topic_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_program_id', None)
+    if previous and previous != instance.program_id:
+        rollup.refresh_program(previous)
+        rollup.refresh_program(instance.program_id)
+        activity.move_lessons(
+            Lesson.objects.filter(topic=instance).values('id'), instance.program_id
+        )
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Topic):
+        for program_id in _deleted_program_ids(origin, lambda: instance.program_id):
+            rollup.refresh_program(program_id)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_program(sender, instance, **kwargs):
+    instance._previous_program_id = None
+    if instance.pk:
+        instance._previous_program_id = _lesson_program_id(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    program_id = instance.topic.program_id
+    if created:
+        rollup.adjust_program(program_id, lessons_total=1)
+        return
+    previous = getattr(instance, '_previous_program_id', None)
+    if previous and previous != program_id:
+        rollup.refresh_program(previous)
+        rollup.refresh_program(program_id)
+        activity.move_lessons([instance.pk], program_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Lesson):
+        for program_id in _deleted_program_ids(origin, lambda: instance.topic.program_id):
+            rollup.refresh_program(program_id)
+
+
+@receiver(pre_save, sender=Quiz)
+def remember_quiz(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = sender.objects.filter(pk=instance.pk).values(
+            'points', 'lesson_id'
+        ).first()
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, created, **kwargs):
+    program_id = _lesson_program_id(instance.lesson_id)
+    if created:
+        rollup.adjust_program(program_id, quizzes_total=1, points_possible=instance.points)
+        return
+    previous = getattr(instance, '_previous', None)
+    if not previous:
+        return
+    if previous['lesson_id'] != instance.lesson_id:
+        previous_program_id = _lesson_program_id(previous['lesson_id'])
+        rollup.refresh_program(previous_program_id)
+        rollup.refresh_program(program_id)
+        activity.refresh_program(previous_program_id)
+        if previous_program_id != program_id:
+            activity.refresh_program(program_id)
+    elif previous['points'] != instance.points:
+        # 分值变化会影响已评分答卷的满分，直接重算该项目
+        rollup.refresh_program(program_id)
+        activity.refresh_program(program_id)
+
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(origin, Quiz):
+        for program_id in _deleted_program_ids(origin, lambda: _lesson_program_id(instance.lesson_id)):
+            rollup.refresh_program(program_id)
+            activity.refresh_program(program_id)
+
+
+@receiver(post_delete, sender=QuizChoice)
+def quiz_choice_deleted(sender, instance, origin=None, **kwargs):
+    # 删除选项会级联删除选择了它的答卷
+    if _is_direct_delete(origin, QuizChoice):
+        program_id = Quiz.objects.filter(pk=instance.quiz_id).values_list(
+            'lesson__topic__program_id', flat=True
+        ).first()
+        rollup.refresh_program(program_id)
+        activity.refresh_program(program_id)
+
+
+# 用户和部门
+@receiver(post_save, sender=User)
+def user_department_changed(sender, instance, created, **kwargs):
+    # _previous_department_id 由 accounts.signals 的 pre_save 记录
+    if created or not hasattr(instance, '_previous_department_id'):
+        return
+    previous = instance._previous_department_id
+    if previous != instance.department_id:
+        cube.move_user(instance.pk, previous, instance.department_id)
+        activity.move_user(instance.pk, previous, instance.department_id)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    cube.remove_user(instance.pk)
+    activity.remove_user(instance.pk)
+
+
+@receiver(pre_delete, sender=Department)
+def department_deleting(sender, instance, **kwargs):
+    # 历史活动并入“无部门”
+    activity.merge_department(instance.pk)
+
+
+@receiver(post_delete, sender=Department)
+def department_deleted(sender, instance, **kwargs):
+    # 成员已被置为无部门，单元格随部门级联删除，重新分组
+    cube.rebuild()
+
+
+# 用户学习数据的版本号（progress.versions），与写入在同一事务中递增。
+# 随课程结构级联删除的行不单独处理，结构版本号已经变化
+@receiver(post_save, sender=User)
+def create_progress_version(sender, instance, created, **kwargs):
+    if created:
+        ProgressVersion.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def enrollment_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, Enrollment):
+        versions.bump([instance.user_id])
+
+
+@receiver(enrollments_changed)
+def enrollments_bulk_version(sender, user_ids, **kwargs):
+    versions.bump(user_ids)
+
+
+@receiver(post_save, sender=LessonProgress)
+@receiver(post_delete, sender=LessonProgress)
+def lesson_progress_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, LessonProgress):
+        versions.bump([instance.user_id])
+
+
+@receiver(post_save, sender=QuizResponse)
+@receiver(post_delete, sender=QuizResponse)
+def quiz_response_version(sender, instance, origin=None, **kwargs):
+    if origin is None or _is_direct_delete(origin, QuizResponse):
+        versions.bump([instance.user_id])
+
+
+@receiver(quiz_responses_changed)
+def quiz_responses_bulk_version(sender, responses, **kwargs):
+    versions.bump({response.user_id for response in responses})
@@ -0,0 +1,26 @@
+"""后台任务（jobs.queue）：重建进度汇总和每日活动汇总"""
+from datetime import date
+
+from jobs.queue import task
+
+from . import activity, rollup
+
+
+@task('progress.rebuild')
+def rebuild_progress_job(job, program_ids=None, batch_size=1000):
+    """重建进度汇总（及部门 × 项目汇总），在一个事务中完成"""
+    job.report_progress(0, 1, 'Rebuilding progress rollup')
+    count = rollup.rebuild(program_ids, batch_size=batch_size)
+    return {'rows': count}
+
+
+@task('progress.rebuild_activity')
+def rebuild_activity_job(job, program_ids=None, since=None, batch_size=1000):
+    """按项目重建每日活动汇总，since 为 ISO 日期"""
+    count = activity.rebuild(
+        program_ids,
+        since=date.fromisoformat(since) if since else None,
+        batch_size=batch_size,
+        progress=lambda done, total: job.report_progress(done, total, 'Programs rebuilt'),
+    )
+    return {'rows': count}
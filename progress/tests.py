@@ -1,3 +1,312 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Department, User
+from courses import services
+from courses.grading import bulk_grade, reset_system_grader
+from courses.models import (
+    CurriculumVersion, Enrollment, Lesson, LessonProgress, Program, Quiz, QuizChoice, QuizResponse,
+    Topic,
+)
+from micro_training.testing import MigrationTestCase
+from . import activity, cube, rollup
+from .models import DailyActivity, DepartmentProgramStats, ProgramProgress
+
+ROLLUP_FIELDS = (
+    'lessons_completed', 'lessons_total', 'quizzes_answered', 'quizzes_total', 'quizzes_pending',
+    'points_earned', 'points_graded', 'points_possible',
+)
+CUBE_FIELDS = ('enrolled_count', 'completed_count', 'points_earned', 'points_graded', 'pending_grading')
+
+
+class IncrementalRollupTests(TestCase):
+    """signals 增量维护的汇总表必须与从原始记录全量重建的结果一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.eng = Department.objects.create(name='Eng')
+        cls.ops = Department.objects.create(name='Ops')
+        cls.manager = User.objects.create_user('manager', is_manager=True)
+        cls.program = Program.objects.create(title='Safety', description='', created_by=cls.manager)
+        cls.other_program = Program.objects.create(title='Fire', description='', created_by=cls.manager)
+        topic = Topic.objects.create(program=cls.program, title='Basics', description='')
+        cls.lessons = [
+            Lesson.objects.create(topic=topic, title=f'Lesson {n}', content='', order=n) for n in range(3)
+        ]
+        other_topic = Topic.objects.create(program=cls.other_program, title='Drills', description='')
+        cls.other_lesson = Lesson.objects.create(topic=other_topic, title='Exits', content='')
+        cls.open_quiz = Quiz.objects.create(
+            lesson=cls.lessons[0], title='Explain', question='Why?', quiz_type='OPEN', points=10
+        )
+        cls.mcq = Quiz.objects.create(
+            lesson=cls.lessons[1], title='Pick', question='Which?', quiz_type='MCQ', points=5
+        )
+        cls.right = QuizChoice.objects.create(quiz=cls.mcq, choice_text='A', is_correct=True)
+        cls.wrong = QuizChoice.objects.create(quiz=cls.mcq, choice_text='B')
+        cls.learners = [
+            User.objects.create_user(f'learner{n}', department=department)
+            for n, department in enumerate([cls.eng, cls.eng, cls.ops, None])
+        ]
+
+    def setUp(self):
+        # 系统评分者的 id 缓存在进程中，每个测试回滚后重新创建
+        self.addCleanup(reset_system_grader)
+
+    def assertMatchesRebuild(self):
+        rollups = {
+            (row.user_id, row.program_id): tuple(getattr(row, name) for name in ROLLUP_FIELDS)
+            for row in ProgramProgress.objects.all()
+        }
+        expected = {
+            (row.user_id, row.program_id): tuple(getattr(row, name) for name in ROLLUP_FIELDS)
+            for row in rollup.compute_rows(Program.objects.values_list('pk', flat=True))
+        }
+        self.assertEqual(rollups, expected)
+
+        def cells():
+            return {
+                (cell.program_id, cell.department_id): tuple(getattr(cell, name) for name in CUBE_FIELDS)
+                for cell in DepartmentProgramStats.objects.all()
+                if any(getattr(cell, name) for name in CUBE_FIELDS)
+            }
+        incremental = cells()
+        cube.rebuild()
+        self.assertEqual(incremental, cells())
+
+        def buckets(rows):
+            return {
+                (row.lesson_id, row.department_id, row.day): tuple(getattr(row, name) for name in activity.COUNTERS)
+                for row in rows if any(getattr(row, name) for name in activity.COUNTERS)
+            }
+        self.assertEqual(buckets(DailyActivity.objects.all()), buckets(activity.compute_rows(None)))
+
+    def learn(self):
+        """报名、完成课程、提交测验"""
+        services.bulk_enroll(self.program, [user.pk for user in self.learners], enrolled_by=self.manager)
+        services.enroll(self.learners[0], self.other_program)
+        yesterday = timezone.now() - timedelta(days=1)
+        for lesson in self.lessons:
+            services.complete_lesson(self.learners[0], lesson, completed_at=yesterday)
+        services.complete_lesson(self.learners[1], self.lessons[0])
+        services.complete_lesson(self.learners[2], self.lessons[1])
+        services.complete_lesson(self.learners[0], self.other_lesson)
+        QuizResponse.objects.create(quiz=self.mcq, user=self.learners[0], selected_choice=self.right)
+        QuizResponse.objects.create(quiz=self.mcq, user=self.learners[2], selected_choice=self.wrong)
+        return [
+            QuizResponse.objects.create(quiz=self.open_quiz, user=user, text_response='Because')
+            for user in self.learners[:3]
+        ]
+
+    def test_learning_activity(self):
+        self.learn()
+        self.assertMatchesRebuild()
+        row = ProgramProgress.objects.get(user=self.learners[0], program=self.program)
+        self.assertEqual((row.lessons_completed, row.points_earned, row.quizzes_pending), (3, 5, 1))
+
+    def test_grading(self):
+        responses = self.learn()
+        result = bulk_grade(self.manager, [
+            {'id': response.pk, 'points': points} for response, points in zip(responses[:2], (7, 3))
+        ])
+        self.assertEqual(result.errors, {})
+        self.assertMatchesRebuild()
+
+        response = responses[2]
+        response.points_earned = 10
+        response.grading_status = 'GRADED'
+        response.graded_at = timezone.now()
+        response.save()
+        self.assertMatchesRebuild()
+
+    def test_structure_changes(self):
+        self.learn()
+        Lesson.objects.create(topic=self.lessons[0].topic, title='Extra', content='', order=9)
+        self.assertMatchesRebuild()
+        self.mcq.points = 8
+        self.mcq.save()
+        self.assertMatchesRebuild()
+        Lesson.objects.filter(pk__in=[self.lessons[1].pk, self.lessons[2].pk]).delete()
+        self.assertMatchesRebuild()
+        self.open_quiz.delete()
+        self.assertMatchesRebuild()
+
+    def test_lesson_queryset_delete_refreshes_program_once(self):
+        self.learn()
+        with mock.patch.object(rollup, 'refresh_program', wraps=rollup.refresh_program) as refresh:
+            Lesson.objects.filter(pk__in=[lesson.pk for lesson in self.lessons[1:]]).delete()
+        refresh.assert_called_once_with(self.program.pk)
+        self.assertMatchesRebuild()
+
+    def test_missing_row_is_recomputed(self):
+        self.learn()
+        # 汇总表建立之前的报名没有汇总行，增量更新时按原始记录补上
+        ProgramProgress.objects.filter(user=self.learners[1], program=self.program).delete()
+        cube.rebuild()
+        services.complete_lesson(self.learners[1], self.lessons[2])
+        self.assertEqual(
+            ProgramProgress.objects.get(user=self.learners[1], program=self.program).lessons_completed, 2
+        )
+        self.assertMatchesRebuild()
+
+    def test_unenroll(self):
+        self.learn()
+        services.bulk_unenroll(self.program, [user.pk for user in self.learners[1:3]])
+        self.assertMatchesRebuild()
+        services.unenroll(self.learners[0], self.other_program)
+        self.assertMatchesRebuild()
+
+    def test_department_changes(self):
+        self.learn()
+        user = self.learners[0]
+        user.department = self.ops
+        user.save()
+        self.assertMatchesRebuild()
+        user.department = None
+        user.save()
+        self.assertMatchesRebuild()
+        self.eng.delete()
+        self.assertMatchesRebuild()
+
+    def test_user_deleted(self):
+        self.learn()
+        self.learners[2].delete()
+        self.assertMatchesRebuild()
+
+
+BASELINE = [
+    ('accounts', '0003_alter_user_options_alter_user_department_and_more'),
+    ('courses', '0003_remove_quiz_created_by_and_more'),
+    ('progress', '0002_alter_lessonprogress_user'),
+]
+
+
+class RollupBackfillMigrationTests(MigrationTestCase):
+    """汇总表建立之前就有学习记录的数据库：只执行 migrate 后汇总表就与全量重建一致"""
+
+    migrate_from = BASELINE
+
+    def test_rollups_are_backfilled(self):
+        apps = self.old_apps
+        OldUser = apps.get_model('accounts', 'User')
+        OldProgram = apps.get_model('courses', 'Program')
+        OldTopic = apps.get_model('courses', 'Topic')
+        OldLesson = apps.get_model('courses', 'Lesson')
+        OldQuiz = apps.get_model('courses', 'Quiz')
+        OldEnrollment = apps.get_model('courses', 'Enrollment')
+        OldLessonProgress = apps.get_model('courses', 'LessonProgress')
+        OldQuizResponse = apps.get_model('courses', 'QuizResponse')
+
+        manager = OldUser.objects.create(username='manager', is_manager=True)
+        ann = OldUser.objects.create(username='ann', department='Eng')
+        bob = OldUser.objects.create(username='bob', department='Ops')
+        program = OldProgram.objects.create(title='Safety', description='', created_by=manager)
+        topic = OldTopic.objects.create(program=program, title='Basics', description='')
+        lessons = [OldLesson.objects.create(topic=topic, title=f'L{n}', content='') for n in range(2)]
+        open_quiz = OldQuiz.objects.create(lesson=lessons[0], title='Q', question='?', quiz_type='OPEN', points=10)
+        long_ago = timezone.now() - timedelta(days=10)
+        for user in (ann, bob):
+            OldEnrollment.objects.create(user=user, program=program)
+        for lesson in lessons:
+            OldLessonProgress.objects.create(user=ann, lesson=lesson, completed=True, completed_at=long_ago)
+        OldQuizResponse.objects.create(
+            quiz=open_quiz, user=ann, text_response='a', grading_status='GRADED', points_earned=6,
+            graded_at=long_ago
+        )
+        OldQuizResponse.objects.create(quiz=open_quiz, user=bob, text_response='b')
+
+        self.migrate(self.latest)
+
+        self.assertEqual(
+            {(row.user_id, row.program_id): tuple(getattr(row, name) for name in ROLLUP_FIELDS)
+             for row in ProgramProgress.objects.all()},
+            {(ann.pk, program.pk): (2, 2, 1, 1, 0, 6, 10, 10),
+             (bob.pk, program.pk): (0, 2, 1, 1, 1, 0, 0, 10)}
+        )
+        eng, ops = Department.objects.get(name='Eng'), Department.objects.get(name='Ops')
+        self.assertEqual(
+            {cell.department_id: tuple(getattr(cell, name) for name in CUBE_FIELDS)
+             for cell in DepartmentProgramStats.objects.all()},
+            {eng.pk: (1, 1, 6, 10, 0), ops.pk: (1, 0, 0, 0, 1)}
+        )
+        counters = ('lesson_id', 'department_id', *activity.COUNTERS)
+        self.assertCountEqual(
+            DailyActivity.objects.values_list(*counters),
+            [(row.lesson_id, row.department_id, *(getattr(row, name) for name in activity.COUNTERS))
+             for row in activity.compute_rows(None)]
+        )
+        self.assertEqual(sum(DailyActivity.objects.values_list('completions', flat=True)), 2)
+
+        # 之后的写入在回填的汇总行上增量更新
+        services.complete_lesson(User.objects.get(pk=bob.pk), Lesson.objects.get(pk=lessons[0].pk))
+        self.assertEqual(ProgramProgress.objects.get(user_id=bob.pk).lessons_completed, 1)
+
+
+class LegacyProgressMigrationTests(MigrationTestCase):
+    """从合并旧进度表之前的状态迁移到最新"""
+
+    migrate_from = [
+        ('accounts', '0004_user_search_index'),
+        ('courses', '0004_hot_path_indexes'),
+        ('progress', '0005_hot_path_indexes'),
+    ]
+
+    def test_populated_database(self):
+        apps = self.old_apps
+        OldUser = apps.get_model('accounts', 'User')
+        OldProgram = apps.get_model('courses', 'Program')
+        OldEnrollment = apps.get_model('courses', 'Enrollment')
+        OldLessonProgress = apps.get_model('courses', 'LessonProgress')
+        LegacyEnrollment = apps.get_model('progress', 'ProgramEnrollment')
+        LegacyLessonProgress = apps.get_model('progress', 'LessonProgress')
+
+        ann = OldUser.objects.create(username='ann', department='Eng')
+        bob = OldUser.objects.create(username='bob', department=' Eng ')
+        cid = OldUser.objects.create(username='cid', department='')
+        program = OldProgram.objects.create(title='Safety', description='')
+        topic = apps.get_model('courses', 'Topic').objects.create(program=program, title='T', description='')
+        Lesson = apps.get_model('courses', 'Lesson')
+        first, second = (Lesson.objects.create(topic=topic, title=f'L{n}', content='') for n in range(2))
+
+        long_ago = timezone.now() - timedelta(days=30)
+        LegacyEnrollment.objects.create(user=ann, program=program)
+        LegacyEnrollment.objects.filter(user=ann).update(enrolled_at=long_ago)
+        LegacyEnrollment.objects.create(user=bob, program=program)
+        OldEnrollment.objects.create(user=ann, program=program)
+        OldLessonProgress.objects.create(user=ann, lesson=first, completed=False)
+        LegacyLessonProgress.objects.create(user=ann, lesson=first, completed=True, completed_at=long_ago)
+        LegacyLessonProgress.objects.create(user=bob, lesson=second, completed=True, completed_at=long_ago)
+
+        self.migrate(self.latest)
+
+        # 部门：去掉首尾空格后合并，外键和成员数已回填
+        department = Department.objects.get()
+        self.assertEqual((department.name, department.member_count), ('Eng', 2))
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'department_id')),
+            {'ann': department.pk, 'bob': department.pk, 'cid': None}
+        )
+
+        # 旧进度表已合并：重复的报名保留一行并取较早的报名时间，未完成的记录以旧表为准
+        self.assertEqual(Enrollment.objects.count(), 2)
+        self.assertEqual(Enrollment.objects.get(user_id=ann.pk).enrolled_at, long_ago)
+        self.assertEqual(
+            set(LessonProgress.objects.filter(completed=True).values_list('user_id', 'lesson_id')),
+            {(ann.pk, first.pk), (bob.pk, second.pk)}
+        )
+        self.assertEqual(
+            CurriculumVersion.objects.get(program_id=program.pk).version,
+            int(Program.objects.get(pk=program.pk).updated_at.timestamp() * 1000)
+        )
 
-# Create your tests here.
+        # 合并后的记录已计入汇总表，不需要再执行重建命令
+        self.assertEqual(
+            set(ProgramProgress.objects.values_list('user_id', 'lessons_completed', 'lessons_total')),
+            {(ann.pk, 1, 2), (bob.pk, 1, 2)}
+        )
+        self.assertEqual(
+            DepartmentProgramStats.objects.get(program_id=program.pk, department=department).enrolled_count, 2
+        )
+        self.assertEqual(sum(DailyActivity.objects.values_list('completions', flat=True)), 2)
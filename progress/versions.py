@@ -0,0 +1,26 @@
+"""
+用户学习数据的版本号。
+
+课程页面的条件 GET（ETag / Last-Modified）需要在执行视图前廉价地判断当前用户的
+数据是否变化：progress.signals 在报名、学习记录和答卷写入的同一事务中递增版本号，
+读取只需一次按主键的查询。版本行在创建用户时建立，没有版本行的用户不做条件判断。
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProgressVersion
+
+
+def get_version(user_id):
+    """返回 (version, updated_at)，没有版本行时返回 None"""
+    return ProgressVersion.objects.filter(user_id=user_id).values_list(
+        'version', 'updated_at'
+    ).first()
+
+
+def bump(user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        ProgressVersion.objects.filter(user_id__in=user_ids).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
@@ -4,82 +4,65 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView
 from django.contrib import messages
 from django.utils import timezone
-from .models import ProgramEnrollment, LessonProgress
+from .models import ProgramProgress
 from courses.models import Program, Lesson
+from courses import services
 from django.db.models import Count, Avg
+from accounts.models import Department
+from micro_training.pagination import KeysetPaginationMixin
 
 @login_required
 def enroll_program(request, program_id):
     program = get_object_or_404(Program, id=program_id)
-    if not ProgramEnrollment.objects.filter(user=request.user, program=program).exists():
-        ProgramEnrollment.objects.create(user=request.user, program=program)
+    enrollment, created = services.enroll(request.user, program, enrolled_by=request.user)
+    if created:
         messages.success(request, f'您已成功加入 {program.title} 培训项目')
-    return redirect('program_detail', pk=program_id)
+    return redirect('courses:program_detail', pk=program_id)
 
 @login_required
 def complete_lesson(request, lesson_id):
     lesson = get_object_or_404(Lesson, id=lesson_id)
-    progress, created = LessonProgress.objects.get_or_create(
-        user=request.user,
-        lesson=lesson
-    )
-    if not progress.completed:
-        progress.completed = True
-        progress.completed_at = timezone.now()
-        progress.save()
+    progress, changed = services.complete_lesson(request.user, lesson)
+    if changed:
         messages.success(request, f'课程 {lesson.title} 已标记为完成！')
-    return redirect('lesson_detail', pk=lesson_id)
+    return redirect('courses:lesson_detail', pk=lesson_id)
 
 class UserProgressListView(LoginRequiredMixin, ListView):
-    model = ProgramEnrollment
+    model = ProgramProgress
     template_name = 'progress/user_progress.html'
     context_object_name = 'enrollments'
 
     def get_queryset(self):
-        return ProgramEnrollment.objects.filter(user=self.request.user)
+        # 进度百分比直接来自汇总行
+        return ProgramProgress.objects.filter(
+            user=self.request.user
+        ).select_related('program')
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        for enrollment in context['enrollments']:
-            total_lessons = Lesson.objects.filter(
-                topic__program=enrollment.program
-            ).count()
-            completed_lessons = LessonProgress.objects.filter(
-                user=self.request.user,
-                lesson__topic__program=enrollment.program,
-                completed=True
-            ).count()
-            if total_lessons > 0:
-                enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
-            else:
-                enrollment.progress_percentage = 0
-        return context
-
-class ManagerProgressView(LoginRequiredMixin, UserPassesTestMixin, ListView):
-    model = ProgramEnrollment
+class ManagerProgressView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
+    model = ProgramProgress
     template_name = 'progress/manager_progress.html'
     context_object_name = 'enrollments'
+    # 按 (program_id, user_id) 翻页，由 progress_program_user_idx 支持
+    keyset = ('program_id', 'user_id')
 
     def test_func(self):
         return self.request.user.is_manager
 
     def get_queryset(self):
-        return ProgramEnrollment.objects.all().select_related('user', 'program')
+        # 进度百分比来自汇总行，当前页不需要额外的统计查询
+        queryset = ProgramProgress.objects.select_related('user__department', 'program')
+        program = self.request.GET.get('program', '')
+        if program.isdigit():
+            queryset = queryset.filter(program_id=program)
+        department = self.request.GET.get('department', '')
+        if department.isdigit():
+            queryset = queryset.filter(user__department_id=department)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        enrollments = context['enrollments']
-        for enrollment in enrollments:
-            total_lessons = Lesson.objects.filter(
-                topic__program=enrollment.program
-            ).count()
-            completed_lessons = LessonProgress.objects.filter(
-                user=enrollment.user,
-                lesson__topic__program=enrollment.program,
-                completed=True
-            ).count()
-            if total_lessons > 0:
-                enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
-            else:
-                enrollment.progress_percentage = 0
-        return context
\ No newline at end of file
+        context['programs'] = Program.objects.order_by('title').values('id', 'title')
+        context['departments'] = Department.objects.all()
+        context['selected_program'] = self.request.GET.get('program', '')
+        context['selected_department'] = self.request.GET.get('department', '')
+        return context